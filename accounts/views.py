@@ -197,10 +197,12 @@ class StudentDetailView(LoginRequiredMixin, TeacherRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        student = self.get_object()
+        student = self.object
         
         # Ajouter les informations sur les exercices et les soumissions
-        context['submissions'] = student.submissions.all().order_by('-submitted_at')
-        context['assignments'] = student.assigned_exercises.all()
+        context['submissions'] = student.submissions.select_related(
+            'exercise', 'evaluation'
+        ).with_lateness().order_by('-submitted_at', '-id')
+        context['assignments'] = student.assigned_exercises.select_related('exercise')
         
         return context
\ No newline at end of file
@@ -1,3 +1,95 @@
 from django.contrib import admin
+from django.utils.translation import gettext_lazy as _
+from django.utils.html import format_html, format_html_join
+from .models import AIModel, AIEvaluationJob
+from .metrics import job_timing_summary
 
-# Register your models here.
+
+def _seconds(value):
+    """Durée formatée pour l'affichage (ou '-')."""
+    if value is None:
+        return '-'
+    if value < 1:
+        return f"{value * 1000:.0f} ms"
+    return f"{value:.2f} s"
+
+
+@admin.register(AIModel)
+class AIModelAdmin(admin.ModelAdmin):
+    """Administration des modèles d'IA, avec le détail des temps d'évaluation."""
+
+    list_display = ('name', 'model_id', 'endpoint_url', 'context_window', 'fallback_rate_display', 'is_active')
+    list_filter = ('is_active', 'model_id')
+    search_fields = ('name', 'model_id', 'endpoint_url')
+    readonly_fields = ('parsed_response_count', 'fallback_parse_count', 'timing_summary', 'created_at', 'updated_at')
+
+    fieldsets = (
+        (None, {'fields': ('name', 'description', 'is_active')}),
+        (_('Configuration'), {'fields': ('model_id', 'endpoint_url', 'context_window')}),
+        (_('Paramètres'), {'fields': ('default_temperature', 'default_max_tokens')}),
+        (_('Performances'), {'fields': ('accuracy_score', 'parsed_response_count', 'fallback_parse_count', 'timing_summary')}),
+        (_('Métadonnées'), {'fields': ('created_at', 'updated_at'), 'classes': ('collapse',)}),
+    )
+
+    def fallback_rate_display(self, obj):
+        """Affiche la part des réponses non conformes au schéma."""
+        if not obj.parsed_response_count:
+            return '-'
+        rate = obj.fallback_parse_rate * 100
+        color = '#dc3545' if rate >= 5 else '#28a745'
+        return format_html('<span style="color: {};">{}%</span>', color, f"{rate:.1f}")
+
+    def timing_summary(self, obj):
+        """Affiche p50/p95/p99 de chaque étape sur les derniers jobs terminés."""
+        if not obj.pk:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>',
+            (
+                (line['label'], line['count'], _seconds(line['p50']), _seconds(line['p95']), _seconds(line['p99']))
+                for line in job_timing_summary(obj)
+            ),
+        )
+        return format_html(
+            '<table><thead><tr><th>Étape</th><th>Jobs</th><th>p50</th><th>p95</th><th>p99</th></tr></thead>'
+            '<tbody>{}</tbody></table>',
+            rows,
+        )
+
+    fallback_rate_display.short_description = _('Lecture de secours')
+    timing_summary.short_description = _('Temps par étape')
+
+
+@admin.register(AIEvaluationJob)
+class AIEvaluationJobAdmin(admin.ModelAdmin):
+    """Administration des jobs d'évaluation par l'IA."""
+
+    list_display = ('id', 'submission', 'model', 'status', 'attempts', 'processing_time',
+                    'time_to_first_token', 'eval_count', 'created_at')
+    list_filter = ('status', 'model')
+    raw_id_fields = ('submission',)
+    date_hierarchy = 'created_at'
+    readonly_fields = (
+        'queue_wait_time', 'db_read_time', 'prompt_build_time', 'time_to_first_token',
+        'generation_time', 'parse_time', 'db_write_time', 'processing_time',
+        'prompt_eval_count', 'eval_count', 'load_duration', 'prompt_eval_duration', 'eval_duration',
+        'token_usage', 'tokens_generated', 'created_at', 'completed_at',
+    )
+
+    fieldsets = (
+        (None, {'fields': ('submission', 'model', 'prompt_template', 'status', 'attempts', 'requeued_at')}),
+        (_('Temps par étape'), {'fields': (
+            'queue_wait_time', 'db_read_time', 'prompt_build_time', 'time_to_first_token',
+            'generation_time', 'parse_time', 'db_write_time', 'processing_time',
+        )}),
+        (_('Statistiques Ollama'), {'fields': (
+            'prompt_eval_count', 'eval_count', 'load_duration', 'prompt_eval_duration',
+            'eval_duration', 'token_usage', 'tokens_generated',
+        )}),
+        (_('Cache'), {'fields': ('cache_key', 'cache_hits', 'cache_misses'), 'classes': ('collapse',)}),
+        (_('Contenu'), {'fields': ('prompt_used', 'response_json', 'error_message'), 'classes': ('collapse',)}),
+        (_('Métadonnées'), {'fields': ('created_at', 'completed_at'), 'classes': ('collapse',)}),
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('model', 'submission')
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AiEngineConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_engine'
+
+    def ready(self):
+        # Invalidation du cache des templates de prompt
+        from . import signals  # noqa: F401
@@ -0,0 +1,221 @@
+import time
+import logging
+import threading
+from contextlib import asynccontextmanager
+from django.conf import settings
+from .models import AIModel
+from .clients import get_client, ollama_api_url
+
+logger = logging.getLogger(__name__)
+
+
+class BackendSaturatedError(Exception):
+    """Aucune place ne s'est libérée à temps sur l'endpoint choisi (backend saturé)."""
+
+
+class EndpointState:
+    """État d'un endpoint Ollama (un AIModel) vu par le répartiteur."""
+
+    # Poids des nouvelles mesures dans la moyenne mobile exponentielle
+    EWMA_ALPHA = 0.3
+    # Nombre de mesures avant de pouvoir juger un endpoint trop lent
+    MIN_SAMPLES = 5
+
+    def __init__(self, model_id):
+        self.model_id = model_id
+        self.outstanding = 0
+        self.latency = None
+        self.samples = 0
+        self.consecutive_failures = 0
+        self.ejection_count = 0
+        self.ejected_until = 0.0
+
+    @property
+    def is_ejected(self):
+        return self.ejected_until > time.monotonic()
+
+    def score(self, default_latency):
+        """Coût estimé d'une nouvelle requête : latence x (requêtes en cours + 1)."""
+        latency = self.latency if self.latency is not None else default_latency
+        return latency * (self.outstanding + 1)
+
+    def record_latency(self, latency):
+        self.samples += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency = self.EWMA_ALPHA * latency + (1 - self.EWMA_ALPHA) * self.latency
+
+
+class OllamaLoadBalancer:
+    """
+    Répartition des évaluations entre les AIModel actifs d'un même modèle.
+
+    Plusieurs lignes AIModel peuvent servir le même `model_id` sur des hôtes
+    Ollama différents. Chaque requête est envoyée à l'endpoint dont le coût
+    estimé (latence moyenne x requêtes en cours) est le plus faible. Un
+    endpoint est écarté temporairement après plusieurs échecs consécutifs ou
+    s'il devient nettement plus lent que les autres ; à l'expiration de son
+    éviction, il n'est réintégré qu'après un contrôle de santé (/api/tags).
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._candidates = {}
+        self._lock = threading.Lock()
+
+    def _state(self, ai_model):
+        with self._lock:
+            state = self._states.get(ai_model.pk)
+            if state is None:
+                state = self._states[ai_model.pk] = EndpointState(ai_model.model_id)
+            return state
+
+    async def get_candidates(self, ai_model):
+        """
+        Retourner les AIModel actifs servant le même modèle que `ai_model`.
+
+        La liste est relue au plus une fois par OLLAMA_BALANCER_REFRESH_INTERVAL
+        secondes, pour prendre en compte les hôtes ajoutés ou désactivés.
+        """
+        refresh_interval = getattr(settings, 'OLLAMA_BALANCER_REFRESH_INTERVAL', 30)
+        cached = self._candidates.get(ai_model.model_id)
+        if cached and time.monotonic() - cached[0] < refresh_interval:
+            return cached[1]
+
+        candidates = [
+            model async for model in AIModel.objects.filter(
+                model_id=ai_model.model_id, is_active=True
+            ).order_by('id')
+        ] or [ai_model]
+        self._candidates[ai_model.model_id] = (time.monotonic(), candidates)
+        return candidates
+
+    async def choose(self, ai_model):
+        """
+        Choisir l'endpoint à utiliser pour une requête.
+
+        Args:
+            ai_model: AIModel de référence (détermine le model_id)
+
+        Returns:
+            AIModel: Endpoint le moins chargé parmi les endpoints disponibles
+        """
+        candidates = await self.get_candidates(ai_model)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        available = []
+        for candidate in candidates:
+            state = self._state(candidate)
+            if state.is_ejected:
+                continue
+            if state.ejection_count and state.consecutive_failures:
+                # Éviction expirée : vérifier l'hôte avant de le réintégrer
+                if not await self.check_health(candidate):
+                    continue
+            available.append((candidate, state))
+
+        if not available:
+            # Tous les hôtes sont écartés : tenter celui qui revient le plus tôt
+            logger.warning(f"Aucun endpoint disponible pour {ai_model.model_id}, utilisation du moins récemment écarté.")
+            return min(candidates, key=lambda model: self._state(model).ejected_until)
+
+        known = [state.latency for _, state in available if state.latency is not None]
+        default_latency = min(known) if known else 1.0
+        return min(available, key=lambda item: item[1].score(default_latency))[0]
+
+    @asynccontextmanager
+    async def lease(self, ai_model):
+        """
+        Choisir un endpoint et comptabiliser la requête qui lui est envoyée.
+
+        Le choix et la réservation sont faits sans point d'attente entre eux :
+        des évaluations lancées en même temps se répartissent donc sur les
+        différents hôtes au lieu de choisir toutes le même.
+
+        Usage:
+            async with load_balancer.lease(ai_model) as endpoint:
+                ...  # requête vers endpoint.endpoint_url
+        """
+        endpoint = await self.choose(ai_model)
+        state = self._state(endpoint)
+        state.outstanding += 1
+        started_at = time.monotonic()
+        try:
+            yield endpoint
+        except BackendSaturatedError:
+            # Aucune requête n'a été envoyée : ni échec ni latence à enregistrer
+            raise
+        except Exception:
+            self.record_failure(endpoint)
+            raise
+        else:
+            self.record_success(endpoint, time.monotonic() - started_at)
+        finally:
+            state.outstanding -= 1
+
+    def record_success(self, ai_model, latency):
+        """Enregistrer une requête réussie et écarter l'endpoint s'il est trop lent."""
+        state = self._state(ai_model)
+        state.consecutive_failures = 0
+        state.ejection_count = 0
+        state.record_latency(latency)
+
+        if state.samples < EndpointState.MIN_SAMPLES:
+            return
+
+        with self._lock:
+            others = [
+                other.latency for pk, other in self._states.items()
+                if pk != ai_model.pk and other.model_id == state.model_id
+                and other.latency is not None and not other.is_ejected
+            ]
+        slow_factor = getattr(settings, 'OLLAMA_BALANCER_SLOW_FACTOR', 3)
+        if others and state.latency > slow_factor * min(others):
+            self._eject(ai_model, state, f"latence moyenne de {state.latency:.1f}s")
+
+    def record_failure(self, ai_model):
+        """Enregistrer un échec et écarter l'endpoint après trop d'échecs consécutifs."""
+        state = self._state(ai_model)
+        state.consecutive_failures += 1
+        if state.consecutive_failures >= getattr(settings, 'OLLAMA_BALANCER_FAILURE_THRESHOLD', 3):
+            self._eject(ai_model, state, f"{state.consecutive_failures} échecs consécutifs")
+
+    def _eject(self, ai_model, state, reason):
+        """Écarter un endpoint, pour une durée qui double à chaque éviction successive."""
+        base = getattr(settings, 'OLLAMA_BALANCER_EJECTION_TIME', 30)
+        maximum = getattr(settings, 'OLLAMA_BALANCER_MAX_EJECTION_TIME', 300)
+        duration = min(base * (2 ** state.ejection_count), maximum)
+        state.ejection_count += 1
+        state.ejected_until = time.monotonic() + duration
+        # Les mesures de latence repartent de zéro à la réintégration
+        state.latency = None
+        state.samples = 0
+        logger.warning(f"Endpoint {ai_model.endpoint_url} écarté pour {duration:.0f}s ({reason}).")
+
+    async def check_health(self, ai_model):
+        """
+        Contrôler un endpoint via /api/tags et le réintégrer s'il répond.
+
+        Returns:
+            bool: True si l'endpoint est disponible
+        """
+        state = self._state(ai_model)
+        try:
+            response = await get_client(ai_model.endpoint_url).get(
+                ollama_api_url(ai_model.endpoint_url, '/api/tags'),
+                timeout=getattr(settings, 'OLLAMA_HEALTH_CHECK_TIMEOUT', 5),
+            )
+            response.raise_for_status()
+        except Exception as e:
+            self._eject(ai_model, state, f"contrôle de santé en échec: {str(e)}")
+            return False
+
+        state.consecutive_failures = 0
+        state.ejected_until = 0.0
+        logger.info(f"Endpoint {ai_model.endpoint_url} réintégré.")
+        return True
+
+
+load_balancer = OllamaLoadBalancer()
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import threading
+import weakref
+import httpx
+from urllib.parse import urlsplit, urlunsplit
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaClientPool:
+    """
+    Pool de clients httpx partagés pour les appels à Ollama.
+
+    Un client (et donc un pool de connexions keep-alive) est conservé par
+    endpoint, avec ses propres limites de connexions. Les clients httpx étant
+    liés à la boucle asyncio qui les a créés, le pool est indexé par boucle :
+    un worker ou l'application ASGI, qui gardent une seule boucle ouverte,
+    réutilisent donc toujours les mêmes connexions.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get_client(self, endpoint_url):
+        """
+        Retourner le client partagé pour un endpoint sur la boucle courante.
+
+        Args:
+            endpoint_url: URL de l'API Ollama (AIModel.endpoint_url)
+
+        Returns:
+            httpx.AsyncClient: Client réutilisable pour cet endpoint
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.setdefault(loop, {})
+            client = clients.get(endpoint_url)
+            if client is None or client.is_closed:
+                client = self._create_client()
+                clients[endpoint_url] = client
+        return client
+
+    def _create_client(self):
+        """Créer un client httpx avec les limites de connexions configurées."""
+        max_connections = getattr(settings, 'OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT', 8)
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=getattr(settings, 'OLLAMA_MAX_KEEPALIVE_CONNECTIONS', max_connections),
+            keepalive_expiry=getattr(settings, 'OLLAMA_KEEPALIVE_EXPIRY', 60),
+        )
+        timeout = httpx.Timeout(
+            getattr(settings, 'OLLAMA_TIMEOUT', 120),
+            connect=getattr(settings, 'OLLAMA_CONNECT_TIMEOUT', 10),
+            pool=None,  # Attendre une connexion libre plutôt qu'échouer sous charge
+        )
+        # HTTP/1.1 avec keep-alive : les requêtes successives réutilisent
+        # les connexions ouvertes au lieu d'en rétablir une à chaque appel.
+        return httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http1=True,
+            http2=False,
+            headers={'Connection': 'keep-alive'},
+        )
+
+    async def aclose(self):
+        """Fermer les clients ouverts sur la boucle courante."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._clients.pop(loop, {})
+
+        for endpoint_url, client in clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Erreur lors de la fermeture du client {endpoint_url}: {str(e)}")
+
+
+client_pool = OllamaClientPool()
+
+
+def ollama_api_url(endpoint_url, path):
+    """
+    Construire l'URL d'une autre route de l'API Ollama du même serveur.
+    
+    Args:
+        endpoint_url: URL configurée sur l'AIModel (ex: http://hote:11434/api/generate)
+        path: Route voulue (ex: '/api/chat')
+    """
+    parts = urlsplit(endpoint_url)
+    return urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+
+
+def get_client(endpoint_url):
+    """Raccourci vers le client partagé du pool global."""
+    return client_pool.get_client(endpoint_url)
+
+
+async def close_clients():
+    """Fermer les clients du pool global (arrêt du worker ou de l'application ASGI)."""
+    await client_pool.aclose()
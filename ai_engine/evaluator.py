@@ -1,12 +1,49 @@
 import logging
 import asyncio
+import time
+import threading
+from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction, IntegrityError
+from django.db.models import F, Q
+from asgiref.sync import async_to_sync, sync_to_async
 from .services import AIEvaluationService
+from .balancer import BackendSaturatedError
+from .models import AIEvaluationJob
+from .clients import close_clients
+from .scheduler import effective_priority, fair_share, in_flight_counts
+from . import events, metrics
 from submissions.models import Submission, Evaluation, FeedbackItem, FeedbackCategory
+from exercises.models import Exercise
 
 logger = logging.getLogger(__name__)
 
+# Catégorie de feedback par défaut, résolue une fois par processus
+_default_category_id = None
+_default_category_lock = threading.Lock()
+
+
+def get_default_feedback_category_id(refresh=False):
+    """
+    Retourner l'ID de la catégorie de feedback "Général", en la créant si besoin.
+    
+    Args:
+        refresh: Ignorer la valeur en cache (catégorie supprimée entre-temps)
+        
+    Returns:
+        int: ID de la catégorie
+    """
+    global _default_category_id
+    with _default_category_lock:
+        if _default_category_id is None or refresh:
+            category, _ = FeedbackCategory.objects.get_or_create(
+                name="Général",
+                defaults={"description": "Commentaires généraux sur la soumission"}
+            )
+            _default_category_id = category.id
+        return _default_category_id
+
 
 class SubmissionEvaluator:
     """
@@ -18,70 +55,135 @@ class SubmissionEvaluator:
     def __init__(self):
         """Initialisation de l'évaluateur."""
         self.ai_service = AIEvaluationService()
+        # Temps cumulé des transactions d'enregistrement (bilan des lots)
+        self.save_count = 0
+        self.save_time = 0.0
     
-    async def evaluate_submission(self, submission_id):
+    async def evaluate_submission(self, submission_id, force_refresh=False):
         """
         Évaluer une soumission spécifique et enregistrer les résultats.
         
         Args:
             submission_id: ID de la soumission à évaluer
+            force_refresh: Ignorer le cache de résultats (nouvelle notation forcée)
             
         Returns:
             Evaluation: Instance de l'évaluation créée ou None en cas d'échec
         """
+        read_started_at = time.perf_counter()
         try:
-            submission = Submission.objects.get(id=submission_id)
+            submission = await Submission.objects.select_related('exercise', 'student').aget(id=submission_id)
         except Submission.DoesNotExist:
             logger.error(f"Soumission {submission_id} introuvable.")
             return None
         
-        # Vérifier si la soumission est prête à être évaluée
-        if submission.status != 'pending':
+        # Réserver la soumission si elle est prête à être évaluée (une seule requête,
+        # sans risque qu'un worker la réserve en même temps)
+        claimed = await Submission.objects.filter(
+            id=submission_id, status='pending'
+        ).aupdate(status='processing', claimed_at=timezone.now())
+        if not claimed:
             logger.warning(f"Soumission {submission_id} non prête pour évaluation (statut: {submission.status}).")
             return None
-        
-        # Mettre à jour le statut de la soumission
         submission.status = 'processing'
-        submission.save()
+        events.publish_status(submission_id, 'processing')
+        timings = {'db_read_time': time.perf_counter() - read_started_at}
+        
+        renewal = asyncio.create_task(keep_claims(lambda: [submission_id]))
+        try:
+            return await self.evaluate_claimed_submission(submission, force_refresh=force_refresh, timings=timings)
+        finally:
+            renewal.cancel()
+    
+    async def evaluate_claimed_submission(self, submission, force_refresh=False, context=None, timings=None):
+        """
+        Évaluer une soumission déjà réservée (statut 'processing').
+        
+        Utilisé par le worker, qui réserve les soumissions en lot avec
+        claim_pending_submissions avant de les évaluer.
+        
+        Args:
+            submission: Instance de la soumission, avec exercise et student chargés
+            force_refresh: Ignorer le cache de résultats (nouvelle notation forcée)
+            context: Données de l'exercice déjà chargées (évaluation en lot)
+            timings: Durées déjà mesurées (lectures en base), complétées et
+                enregistrées sur le job d'évaluation
+            
+        Returns:
+            Evaluation: Instance de l'évaluation créée ou None en cas d'échec
+        """
+        timings = {} if timings is None else timings
+        queued_at = submission.queued_at or submission.submitted_at
+        if queued_at:
+            timings['queue_wait_time'] = (timezone.now() - queued_at).total_seconds()
         
         try:
             # Envoyer à l'IA pour évaluation
-            evaluation_result = await self.ai_service.evaluate_submission(submission)
+            evaluation_result = await self.ai_service.evaluate_submission(
+                submission, force_refresh=force_refresh, context=context, timings=timings
+            )
             
             if not evaluation_result:
                 submission.status = 'error'
-                submission.save()
-                logger.error(f"Échec de l'évaluation pour la soumission {submission_id}.")
+                await submission.asave(update_fields=['status'])
+                events.publish_status(submission.id, 'error')
+                logger.error(f"Échec de l'évaluation pour la soumission {submission.id}.")
                 return None
             
-            # Enregistrer les résultats de l'évaluation
-            evaluation = self._save_evaluation_results(submission, evaluation_result)
-            
-            # Mettre à jour le statut de la soumission
-            submission.status = 'completed'
-            submission.processed_at = timezone.now()
-            submission.save()
-            
-            return evaluation
+            # Enregistrer les résultats et le statut de la soumission (un seul passage
+            # par le thread de l'ORM, une seule transaction)
+            return await sync_to_async(self._save_evaluation_results)(
+                submission, evaluation_result, timings.get('job')
+            )
             
+        except BackendSaturatedError:
+            # Contre-pression : la soumission retourne dans la file au lieu d'échouer
+            submission.status = 'pending'
+            await submission.asave(update_fields=['status'])
+            events.publish_status(submission.id, 'pending')
+            return None
         except Exception as e:
-            logger.exception(f"Erreur lors de l'évaluation de la soumission {submission_id}: {str(e)}")
+            logger.exception(f"Erreur lors de l'évaluation de la soumission {submission.id}: {str(e)}")
             submission.status = 'error'
-            submission.save()
+            await submission.asave(update_fields=['status'])
+            events.publish_status(submission.id, 'error')
             return None
     
-    @transaction.atomic
-    def _save_evaluation_results(self, submission, evaluation_result):
+    def _save_evaluation_results(self, submission, evaluation_result, job=None):
         """
         Enregistrer les résultats de l'évaluation dans la base de données.
         
         Args:
             submission: Instance de la soumission évaluée
             evaluation_result: Résultats de l'évaluation par l'IA
+            job: Job d'évaluation, sur lequel la durée d'écriture est enregistrée
             
         Returns:
             Evaluation: Instance de l'évaluation créée
         """
+        started_at = time.perf_counter()
+        with transaction.atomic():
+            evaluation, item_count = self._write_evaluation_results(submission, evaluation_result)
+            if job is not None and job.pk:
+                # Dans la même transaction (hors validation) : pas d'aller-retour supplémentaire
+                AIEvaluationJob.objects.filter(pk=job.pk).update(
+                    db_write_time=time.perf_counter() - started_at
+                )
+        events.publish_status(submission.id, 'completed')
+        duration = time.perf_counter() - started_at
+        if job is not None:
+            metrics.record_stage(job.model, 'db_write_time', duration)
+        
+        self.save_count += 1
+        self.save_time += duration
+        logger.debug(
+            f"Résultats de la soumission {submission.id} enregistrés en {duration * 1000:.1f} ms "
+            f"({item_count} éléments de feedback)."
+        )
+        return evaluation
+    
+    def _write_evaluation_results(self, submission, evaluation_result):
+        """Écrire l'évaluation, ses éléments de feedback et les statistiques (dans la transaction)."""
         # Créer ou mettre à jour l'évaluation
         try:
             evaluation = Evaluation.objects.get(submission=submission)
@@ -129,101 +231,101 @@ class SubmissionEvaluator:
         evaluation.save()
         
         # Créer les éléments de feedback détaillés
-        self._create_feedback_items(evaluation, evaluation_result)
+        item_count = self._create_feedback_items(evaluation, evaluation_result)
         
         # Mettre à jour les statistiques de l'étudiant
         self._update_student_statistics(submission.student, evaluation)
         
-        return evaluation
+        # Marquer la soumission comme évaluée
+        submission.status = 'completed'
+        submission.processed_at = timezone.now()
+        submission.save(update_fields=['status', 'processed_at'])
+        
+        return evaluation, item_count
     
     def _create_feedback_items(self, evaluation, evaluation_result):
         """
         Créer des éléments de feedback détaillés à partir des résultats de l'IA.
         
+        Les éléments sont construits en mémoire puis insérés en une seule
+        requête, quelle que soit la longueur de la réponse du modèle.
+        
         Args:
             evaluation: Instance de l'évaluation
             evaluation_result: Résultats de l'évaluation par l'IA
+            
+        Returns:
+            int: Nombre d'éléments créés
         """
         # Supprimer les anciens éléments de feedback
         FeedbackItem.objects.filter(evaluation=evaluation).delete()
         
         if not isinstance(evaluation_result, dict):
-            return
-        
-        # Catégorie par défaut pour les feedbacks
-        default_category, _ = FeedbackCategory.objects.get_or_create(
-            name="Général",
-            defaults={"description": "Commentaires généraux sur la soumission"}
-        )
+            return 0
         
         # Chercher les éléments de feedback dans la structure de résultats
-        order = 0
+        items = []
+        
+        def add_item(title, content, feedback_type):
+            items.append(FeedbackItem(
+                evaluation=evaluation,
+                title=title,
+                content=content,
+                feedback_type=feedback_type,
+                order=len(items)
+            ))
         
         # Cas 1: Liste de points forts/faibles
         if 'strengths' in evaluation_result and isinstance(evaluation_result['strengths'], list):
             for item in evaluation_result['strengths']:
-                FeedbackItem.objects.create(
-                    evaluation=evaluation,
-                    category=default_category,
-                    title="Point fort",
-                    content=item,
-                    feedback_type="positive",
-                    order=order
-                )
-                order += 1
+                add_item("Point fort", item, "positive")
         
         if 'weaknesses' in evaluation_result and isinstance(evaluation_result['weaknesses'], list):
             for item in evaluation_result['weaknesses']:
-                FeedbackItem.objects.create(
-                    evaluation=evaluation,
-                    category=default_category,
-                    title="Point à améliorer",
-                    content=item,
-                    feedback_type="improvement",
-                    order=order
-                )
-                order += 1
+                add_item("Point à améliorer", item, "improvement")
         
         # Cas 2: Liste de commentaires détaillés
         if 'detailed_feedback' in evaluation_result and isinstance(evaluation_result['detailed_feedback'], list):
             for item in evaluation_result['detailed_feedback']:
                 if isinstance(item, dict):
                     # S'il y a une structure avec type et contenu
-                    title = item.get('title', 'Commentaire')
-                    content = item.get('content', '')
-                    feedback_type = item.get('type', 'suggestion')
-                    
-                    FeedbackItem.objects.create(
-                        evaluation=evaluation,
-                        category=default_category,
-                        title=title,
-                        content=content,
-                        feedback_type=feedback_type,
-                        order=order
+                    add_item(
+                        item.get('title', 'Commentaire'),
+                        item.get('content', ''),
+                        item.get('type', 'suggestion')
                     )
-                    order += 1
                 elif isinstance(item, str):
                     # Si c'est juste une chaîne de caractères
-                    FeedbackItem.objects.create(
-                        evaluation=evaluation,
-                        category=default_category,
-                        title="Commentaire",
-                        content=item,
-                        feedback_type="suggestion",
-                        order=order
-                    )
-                    order += 1
+                    add_item("Commentaire", item, "suggestion")
         
         # Cas 3: Si pas de structure spécifique mais qu'il y a un feedback général
-        if order == 0 and evaluation.general_feedback:
-            FeedbackItem.objects.create(
-                evaluation=evaluation,
-                category=default_category,
-                title="Évaluation globale",
-                content=evaluation.general_feedback,
-                feedback_type="suggestion",
-                order=0
-            )
+        if not items and evaluation.general_feedback:
+            add_item("Évaluation globale", evaluation.general_feedback, "suggestion")
+        
+        if not items:
+            return 0
+        
+        # Catégorie par défaut pour les feedbacks (résolue une fois par processus)
+        category_id = get_default_feedback_category_id()
+        for item in items:
+            item.category_id = category_id
+        
+        try:
+            with transaction.atomic():
+                FeedbackItem.objects.bulk_create(items)
+                if connection.features.can_defer_constraint_checks:
+                    # Clés étrangères vérifiées à la validation (PostgreSQL, SQLite) :
+                    # les vérifier ici, pour que l'erreur survienne dans ce bloc
+                    connection.check_constraints(table_names=[FeedbackItem._meta.db_table])
+        except IntegrityError:
+            # La catégorie en cache a été supprimée entre-temps : la recréer
+            category_id = get_default_feedback_category_id(refresh=True)
+            for item in items:
+                item.pk = None
+                item.category_id = category_id
+            FeedbackItem.objects.bulk_create(items)
+        
+        return len(items)
     
     def _update_student_statistics(self, student, evaluation):
         """
@@ -259,48 +361,272 @@ class SubmissionEvaluator:
 
 
 # Fonction utilitaire pour évaluer une soumission de manière asynchrone
-async def evaluate_submission_async(submission_id):
+async def evaluate_submission_async(submission_id, force_refresh=False):
     """
     Fonction utilitaire pour évaluer une soumission de manière asynchrone.
     
     Args:
         submission_id: ID de la soumission à évaluer
+        force_refresh: Ignorer le cache de résultats
             
     Returns:
         Evaluation: Instance de l'évaluation créée ou None en cas d'échec
     """
     evaluator = SubmissionEvaluator()
-    return await evaluator.evaluate_submission(submission_id)
+    return await evaluator.evaluate_submission(submission_id, force_refresh=force_refresh)
+
+
+async def _evaluate_submission_and_close(submission_id, force_refresh=False):
+    """Évaluer une soumission puis fermer les connexions ouvertes sur cette boucle."""
+    try:
+        return await evaluate_submission_async(submission_id, force_refresh)
+    finally:
+        await close_clients()
 
 
 # Fonction synchrone pour lancer l'évaluation (à utiliser dans les vues)
-# Remplacer la fonction existante
-def evaluate_submission(submission_id):
+def evaluate_submission(submission_id, force_refresh=False):
     """
     Fonction synchrone pour lancer l'évaluation (à utiliser dans les vues).
     
+    La soumission est d'abord remise dans la file avec la priorité
+    "évaluation individuelle" (voir enqueue_submission), puis réservée et
+    évaluée aussitôt ; si un worker l'a réservée entre-temps, c'est lui qui
+    l'évalue, avant les lots et les échéances.
+    
+    Depuis du code asynchrone, utiliser directement evaluate_submission_async.
+    
     Args:
         submission_id: ID de la soumission à évaluer
+        force_refresh: Ignorer le cache de résultats
             
     Returns:
         Evaluation: Instance de l'évaluation créée ou None en cas d'échec
     """
-    # Créer un nouvel event loop au lieu d'utiliser asyncio.run
-    import asyncio
+    if not enqueue_submission(submission_id):
+        logger.warning(f"Soumission {submission_id} déjà en cours d'évaluation ou introuvable.")
+        return None
+    return async_to_sync(_evaluate_submission_and_close)(submission_id, force_refresh)
+
+
+def claim_pending_submissions(limit=None, exercise_id=None):
+    """
+    Réserver des soumissions en attente pour un worker.
+    
+    Les lignes sont verrouillées avec SELECT ... FOR UPDATE SKIP LOCKED puis
+    passées au statut 'processing' dans la même transaction, de sorte que
+    plusieurs workers peuvent tourner en parallèle sans se partager une
+    soumission.
+    
+    Les soumissions sont servies par priorité (évaluation individuelle, puis
+    échéance proche, puis normale, puis réévaluation en lot) ; à priorité
+    égale, les professeurs et exercices se partagent les places (voir
+    ai_engine.scheduler.fair_share).
+    
+    Args:
+        limit: Nombre maximum de soumissions à réserver (toutes si None)
+        exercise_id: Ne réserver que les soumissions de cet exercice (facultatif)
+        
+    Returns:
+        list: Soumissions réservées, avec exercise et student chargés, dans l'ordre de traitement
+    """
+    if limit is not None and limit <= 0:
+        return []
+    
+    with transaction.atomic():
+        queryset = (
+            Submission.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(status='pending')
+            .annotate(effective_priority=effective_priority())
+        )
+        if exercise_id is not None:
+            queryset = queryset.filter(exercise_id=exercise_id)
+        queryset = queryset.order_by('effective_priority', 'submitted_at')
+        
+        if limit is None:
+            submission_ids = list(queryset.values_list('id', flat=True))
+        else:
+            # Examiner plus de candidats que de places, pour pouvoir les répartir
+            scan = max(limit, getattr(settings, 'EVALUATION_SCHEDULER_SCAN', 200))
+            candidates = list(
+                queryset.values(
+                    'id', 'exercise_id', 'submitted_at', 'effective_priority',
+                    teacher_id=F('exercise__author_id'),
+                )[:scan]
+            )
+            submission_ids = fair_share(candidates, limit, *in_flight_counts())
+        if not submission_ids:
+            return []
+        Submission.objects.filter(id__in=submission_ids).update(status='processing', claimed_at=timezone.now())
+    
+    for submission_id in submission_ids:
+        events.publish_status(submission_id, 'processing')
+    submissions = Submission.objects.filter(id__in=submission_ids).select_related('exercise', 'student')
+    order = {submission_id: index for index, submission_id in enumerate(submission_ids)}
+    return sorted(submissions, key=lambda submission: order[submission.id])
+
+
+def release_submissions(submission_ids):
+    """Remettre en attente des soumissions réservées mais non évaluées."""
+    return Submission.objects.filter(
+        id__in=submission_ids, status='processing'
+    ).update(status='pending', claimed_at=None)
+
+
+def claim_lease():
+    """Durée du bail d'une soumission réservée, en secondes (EVALUATION_CLAIM_LEASE)."""
+    return getattr(settings, 'EVALUATION_CLAIM_LEASE', 300)
+
+
+def renew_claims(submission_ids):
+    """
+    Prolonger le bail des soumissions encore en cours d'évaluation.
+    
+    Returns:
+        int: Nombre de soumissions dont le bail a été renouvelé
+    """
+    if not submission_ids:
+        return 0
+    return Submission.objects.filter(
+        id__in=submission_ids, status='processing'
+    ).update(claimed_at=timezone.now())
+
+
+async def keep_claims(get_submission_ids):
+    """
+    Renouveler le bail des soumissions réservées, jusqu'à annulation de la tâche.
+    
+    Une requête par tiers de bail pour toutes les soumissions détenues, qu'elles
+    soient en cours d'évaluation ou en attente d'une place.
+    
+    Args:
+        get_submission_ids: Fonction retournant les IDs des soumissions encore détenues
+    """
+    interval = claim_lease() / 3
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sync_to_async(renew_claims)(list(get_submission_ids()))
+        except Exception as e:
+            logger.warning(f"Renouvellement du bail des soumissions impossible: {str(e)}")
+
+
+def reclaim_expired_claims():
+    """
+    Remettre en attente les soumissions dont le bail a expiré.
+    
+    Le bail n'est plus renouvelé quand le processus qui détenait la soumission
+    s'est arrêté sans la libérer (SIGKILL, manque de mémoire, redémarrage).
+    Les soumissions 'processing' sans bail (réservées avant l'ajout de
+    claimed_at) sont reprises de la même façon ; leurs jobs restés en cours
+    sont marqués en échec.
+    
+    Returns:
+        int: Nombre de soumissions remises en attente
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=claim_lease())
+    with transaction.atomic():
+        submission_ids = list(
+            Submission.objects.select_for_update(skip_locked=True)
+            .filter(status='processing')
+            .filter(Q(claimed_at__lt=expired) | Q(claimed_at__isnull=True))
+            .values_list('id', flat=True)
+        )
+        if not submission_ids:
+            return 0
+        Submission.objects.filter(id__in=submission_ids).update(status='pending', claimed_at=None)
+        AIEvaluationJob.objects.filter(submission_id__in=submission_ids, status='processing').update(
+            status='failed',
+            error_message="Évaluation interrompue : bail de réservation expiré",
+            completed_at=now,
+        )
+    
+    for submission_id in submission_ids:
+        events.publish_status(submission_id, 'pending')
+    logger.warning(f"{len(submission_ids)} soumission(s) au bail expiré remise(s) en attente.")
+    return len(submission_ids)
+
+
+def requeue_dead_letters(exercise_id=None, limit=None):
+    """
+    Remettre en attente les soumissions dont l'évaluation a été abandonnée.
+    
+    Les jobs au statut 'dead_letter' non encore traités sont marqués
+    (requeued_at) et leurs soumissions en erreur repassent à 'pending', pour
+    être reprises par le worker.
+    
+    Args:
+        exercise_id: Ne traiter que les soumissions de cet exercice (facultatif)
+        limit: Nombre maximum de soumissions à remettre en attente (toutes si None)
+        
+    Returns:
+        int: Nombre de soumissions remises en attente
+    """
+    jobs = AIEvaluationJob.objects.filter(status='dead_letter', requeued_at__isnull=True)
+    if exercise_id is not None:
+        jobs = jobs.filter(submission__exercise_id=exercise_id)
+    
+    with transaction.atomic():
+        submission_ids = list(
+            jobs.order_by('submission_id').values_list('submission_id', flat=True).distinct()
+        )
+        if limit is not None:
+            submission_ids = submission_ids[:limit]
+        
+        now = timezone.now()
+        requeued = Submission.objects.filter(
+            id__in=submission_ids, status='error'
+        ).update(status='pending', queued_at=now)
+        jobs.filter(submission_id__in=submission_ids).update(requeued_at=now)
+    
+    logger.info(f"{requeued} soumission(s) abandonnée(s) remise(s) en attente.")
+    return requeued
+
+
+async def evaluate_submissions_concurrently(submissions, concurrency, evaluator=None,
+                                            force_refresh=False, context=None):
+    """
+    Évaluer des soumissions réservées sur la boucle courante, avec au plus
+    `concurrency` évaluations simultanées.
+    
+    Args:
+        submissions: Soumissions réservées (statut 'processing')
+        concurrency: Nombre maximum d'évaluations simultanées
+        evaluator: SubmissionEvaluator à réutiliser (facultatif)
+        force_refresh: Ignorer le cache de résultats
+        context: Données de l'exercice partagées par toutes les soumissions (facultatif)
+        
+    Returns:
+        list: Évaluations créées (None pour les échecs), dans l'ordre d'entrée
+    """
+    evaluator = evaluator or SubmissionEvaluator()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    held_ids = {submission.id for submission in submissions}
+    
+    async def _evaluate(submission):
+        try:
+            async with semaphore:
+                return await evaluator.evaluate_claimed_submission(
+                    submission, force_refresh=force_refresh, context=context
+                )
+        finally:
+            held_ids.discard(submission.id)
+    
+    # Les soumissions en attente d'une place gardent leur bail
+    renewal = asyncio.create_task(keep_claims(lambda: held_ids))
+    try:
+        return await asyncio.gather(*(_evaluate(s) for s in submissions))
+    finally:
+        renewal.cancel()
+
+
+async def _evaluate_pending_batch(submissions, concurrency, evaluator):
+    """Évaluer un lot puis fermer les connexions ouvertes sur cette boucle."""
     try:
-        # Pour les contextes où il n'y a pas déjà de loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(evaluate_submission_async(submission_id))
-    except RuntimeError:
-        # Si nous sommes déjà dans un contexte asynchrone
-        import nest_asyncio
-        nest_asyncio.apply()
-        loop = asyncio.get_event_loop()
-        return loop.run_until_complete(evaluate_submission_async(submission_id))
+        return await evaluate_submissions_concurrently(submissions, concurrency, evaluator)
     finally:
-        if 'loop' in locals() and loop is not asyncio.get_event_loop():
-            loop.close()
+        await close_clients()
 
 
 # Fonction pour évaluer les soumissions en attente (à utiliser dans des tâches planifiées)
@@ -308,23 +634,112 @@ def evaluate_pending_submissions(limit=10):
     """
     Évaluer les soumissions en attente.
     
+    Les soumissions sont réservées comme par le worker (voir
+    run_evaluation_worker) puis évaluées en parallèle sur une seule boucle.
+    
     Args:
         limit: Nombre maximum de soumissions à évaluer
             
     Returns:
         int: Nombre de soumissions traitées avec succès
     """
-    pending_submissions = Submission.objects.filter(
-        status='pending'
-    ).order_by('submitted_at')[:limit]
+    submissions = claim_pending_submissions(limit)
+    if not submissions:
+        return 0
     
-    success_count = 0
-    for submission in pending_submissions:
-        try:
-            result = evaluate_submission(submission.id)
-            if result:
-                success_count += 1
-        except Exception as e:
-            logger.exception(f"Erreur lors de l'évaluation de la soumission {submission.id}: {str(e)}")
+    concurrency = getattr(settings, 'EVALUATION_WORKER_CONCURRENCY', 4)
+    evaluator = SubmissionEvaluator()
+    results = asyncio.run(_evaluate_pending_batch(submissions, concurrency, evaluator))
+    return sum(1 for result in results if result)
+
+
+def enqueue_exercise_submissions(exercise_id, priority=Submission.PRIORITY_BULK):
+    """
+    Mettre en attente toutes les soumissions non notées d'un exercice.
+    
+    Args:
+        exercise_id: ID de l'exercice
+        priority: Priorité des soumissions (par défaut, réévaluation en lot)
+        
+    Returns:
+        int: Nombre de soumissions mises en attente
+    """
+    return Submission.objects.filter(
+        exercise_id=exercise_id,
+        evaluation__isnull=True,
+    ).exclude(status='processing').update(status='pending', priority=priority, queued_at=timezone.now())
+
+
+def enqueue_submission(submission_id, priority=Submission.PRIORITY_INTERACTIVE):
+    """
+    Mettre une soumission en attente, avant les lots (un étudiant attend son retour).
+    
+    Args:
+        submission_id: ID de la soumission
+        priority: Priorité de la soumission (par défaut, évaluation individuelle)
+        
+    Returns:
+        bool: True si la soumission a été mise en attente (False si elle est en cours)
+    """
+    return bool(
+        Submission.objects.filter(id=submission_id)
+        .exclude(status='processing')
+        .update(status='pending', priority=priority, queued_at=timezone.now())
+    )
+
+
+async def _evaluate_exercise_batch(worker, exercise_id, prompt_template_id):
+    """Charger le contexte de l'exercice puis faire tourner le worker jusqu'à épuisement de la file."""
+    try:
+        # Exercice, correction et template chargés une seule fois pour tout le lot
+        exercise = await Exercise.objects.aget(pk=exercise_id)
+        worker.context = await worker.evaluator.ai_service.load_exercise_context(exercise, prompt_template_id)
+        return await worker.run(once=True)
+    finally:
+        await close_clients()
+
+
+def run_exercise_batch(exercise_id, concurrency=None, force_refresh=False, prompt_template_id=None):
+    """
+    Évaluer en lot les soumissions en attente d'un exercice.
+    
+    Le lot passe par un EvaluationWorker limité à l'exercice : les
+    soumissions sont réservées au fil des places libres, dans l'ordre du
+    planificateur (effective_priority, fair_share) et selon la capacité des
+    backends, sous bail. Le lot ne monopolise donc pas la file.
+    
+    Args:
+        exercise_id: ID de l'exercice
+        concurrency: Nombre maximum d'évaluations simultanées (défaut: EVALUATION_WORKER_CONCURRENCY)
+        force_refresh: Ignorer le cache de résultats
+        prompt_template_id: ID du template de prompt à utiliser (facultatif)
+        
+    Returns:
+        dict: Bilan du lot (total, réussites, échecs, durée, débit)
+    """
+    from .worker import EvaluationWorker
+    
+    worker = EvaluationWorker(concurrency=concurrency, exercise_id=exercise_id, force_refresh=force_refresh)
+    evaluator = worker.evaluator
+    
+    started_at = time.monotonic()
+    asyncio.run(_evaluate_exercise_batch(worker, exercise_id, prompt_template_id))
+    elapsed = time.monotonic() - started_at
     
-    return success_count
\ No newline at end of file
+    total = worker.processed_count
+    succeeded = worker.success_count
+    report = {
+        'exercise_id': exercise_id,
+        'total': total,
+        'succeeded': succeeded,
+        'failed': total - succeeded,
+        'elapsed': round(elapsed, 2),
+        'throughput': round(total / elapsed, 2) if elapsed > 0 else 0,
+        'avg_save_ms': round(evaluator.save_time / evaluator.save_count * 1000, 1) if evaluator.save_count else 0,
+    }
+    logger.info(
+        f"Lot de l'exercice {exercise_id}: {report['succeeded']}/{report['total']} réussies, "
+        f"{report['failed']} échecs en {report['elapsed']}s ({report['throughput']} soumissions/s, "
+        f"enregistrement moyen: {report['avg_save_ms']} ms)."
+    )
+    return report
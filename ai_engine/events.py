@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Statuts d'une soumission pour lesquels une évaluation est attendue
+ACTIVE_STATUSES = frozenset({'pending', 'processing'})
+
+
+class Subscription:
+    """File des événements d'une soumission pour un client, sur sa boucle asyncio."""
+
+    def __init__(self, submission_id, loop):
+        self.submission_id = submission_id
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, event):
+        """Déposer un événement, depuis n'importe quel thread ou boucle."""
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self.loop:
+            self.queue.put_nowait(event)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+        except RuntimeError:
+            # Boucle fermée : le client est parti
+            pass
+
+    async def get(self, timeout=None):
+        """
+        Attendre le prochain événement.
+
+        Raises:
+            asyncio.TimeoutError: Aucun événement pendant `timeout` secondes
+        """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    """
+    Diffusion des événements d'évaluation aux clients du même processus.
+
+    Suffit quand les évaluations sont lancées par le processus web (évaluation
+    en lot depuis l'interface, déploiement sur un seul processus).
+    """
+
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, submission_id, event):
+        """Transmettre un événement aux clients abonnés à une soumission."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(submission_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    @asynccontextmanager
+    async def subscribe(self, submission_id):
+        """
+        S'abonner aux événements d'une soumission.
+
+        Usage:
+            async with broker.subscribe(submission_id) as subscription:
+                event = await subscription.get(timeout=15)
+        """
+        subscription = Subscription(submission_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.setdefault(submission_id, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                subscriptions = self._subscriptions.get(submission_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[submission_id]
+
+    def watched_ids(self):
+        with self._lock:
+            return list(self._subscriptions)
+
+
+class DatabasePollingBroker(InProcessBroker):
+    """
+    Diffusion locale, complétée par une lecture périodique de la base.
+
+    Quand les évaluations tournent dans un autre processus (run_evaluation_worker),
+    une seule tâche par processus web relit toutes les
+    EVALUATION_EVENT_POLL_INTERVAL secondes le statut des soumissions suivies
+    (deux requêtes, quel que soit le nombre de clients) et publie les
+    changements. Les événements publiés dans le processus arrivent sans délai.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._pollers = weakref.WeakKeyDictionary()
+        self._last_status = {}
+
+    @asynccontextmanager
+    async def subscribe(self, submission_id):
+        async with super().subscribe(submission_id) as subscription:
+            self._ensure_poller(asyncio.get_running_loop())
+            yield subscription
+
+    def _ensure_poller(self, loop):
+        task = self._pollers.get(loop)
+        if task is None or task.done():
+            self._pollers[loop] = loop.create_task(self._poll())
+
+    async def _poll(self):
+        """Relire le statut des soumissions suivies tant qu'il reste des abonnés."""
+        interval = getattr(settings, 'EVALUATION_EVENT_POLL_INTERVAL', 2)
+        while True:
+            await asyncio.sleep(interval)
+            submission_ids = self.watched_ids()
+            for submission_id in set(self._last_status) - set(submission_ids):
+                self._last_status.pop(submission_id, None)
+            if not submission_ids:
+                return
+            try:
+                await self._publish_changes(submission_ids)
+            except Exception as e:
+                logger.warning(f"Lecture du statut des soumissions suivies impossible: {str(e)}")
+
+    async def _publish_changes(self, submission_ids):
+        from submissions.models import Submission
+        from .models import AIEvaluationJob
+
+        statuses = {
+            submission_id: status
+            async for submission_id, status in Submission.objects.filter(
+                id__in=submission_ids
+            ).values_list('id', 'status')
+        }
+        for submission_id, status in statuses.items():
+            if self._last_status.get(submission_id) != status:
+                self._last_status[submission_id] = status
+                InProcessBroker.publish(self, submission_id, status_event(status))
+
+        processing = [submission_id for submission_id, status in statuses.items() if status == 'processing']
+        if not processing:
+            return
+        jobs = AIEvaluationJob.objects.filter(
+            submission_id__in=processing, status='processing', tokens_generated__gt=0
+        ).values('submission_id', 'tokens_generated', 'time_to_first_token', 'created_at', 'model__default_max_tokens')
+        async for job in jobs:
+            InProcessBroker.publish(self, job['submission_id'], progress_event(
+                tokens_generated=job['tokens_generated'],
+                max_tokens=job['model__default_max_tokens'],
+                time_to_first_token=job['time_to_first_token'],
+                elapsed=round((timezone.now() - job['created_at']).total_seconds(), 1),
+            ))
+
+    def publish(self, submission_id, event):
+        # Statut mémorisé seulement pour les soumissions suivies dans ce
+        # processus : le worker d'évaluation, sans abonné, n'accumule rien
+        if event['type'] == 'status':
+            with self._lock:
+                if submission_id in self._subscriptions:
+                    self._last_status[submission_id] = event['data']['status']
+        super().publish(submission_id, event)
+
+
+def status_event(status):
+    return {'type': 'status', 'data': {'status': status}}
+
+
+def progress_event(**progress):
+    return {'type': 'progress', 'data': progress}
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Retourner le broker d'événements configuré (EVALUATION_EVENT_BROKER)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'EVALUATION_EVENT_BROKER', 'ai_engine.events.DatabasePollingBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def publish_status(submission_id, status):
+    """Publier le nouveau statut d'une soumission (appelable depuis du code synchrone ou asynchrone)."""
+    get_broker().publish(submission_id, status_event(status))
+
+
+def publish_progress(submission_id, **progress):
+    """Publier la progression de la génération d'une évaluation."""
+    get_broker().publish(submission_id, progress_event(**progress))
@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from django.apps import apps
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Le parsing PDF est fait dans des processus séparés (CPU, GIL) ; la
+# coordination (empreinte, base de données) dans un petit pool de threads,
+# pour que les requêtes d'upload rendent la main immédiatement.
+_process_pool = None
+_dispatcher = None
+_pool_lock = threading.Lock()
+
+# Extractions en cours, par empreinte, pour ne jamais parser deux fois le même fichier
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def extract_pdf_text(path, max_pages=None):
+    """
+    Extraire le texte d'un PDF page par page (exécuté dans un processus enfant).
+
+    Le document n'est pas chargé en entier : pypdf lit les pages à la demande
+    depuis le fichier et seul le texte extrait est conservé.
+
+    Args:
+        path: Chemin du fichier PDF
+        max_pages: Nombre maximum de pages à lire (facultatif)
+
+    Returns:
+        tuple: (texte extrait, nombre de pages lues)
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    parts = []
+    page_count = 0
+    for page in reader.pages:
+        if max_pages and page_count >= max_pages:
+            break
+        parts.append((page.extract_text() or '').strip())
+        page_count += 1
+    return '\n\n'.join(part for part in parts if part), page_count
+
+
+def compute_file_hash(field_file):
+    """Calculer l'empreinte SHA-256 d'un fichier en le lisant par morceaux."""
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def _get_process_pool():
+    global _process_pool
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PDF_EXTRACTION_PROCESSES', 2),
+                # spawn : pas de fork d'un processus serveur multi-threadé
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _process_pool
+
+
+def _get_dispatcher():
+    global _dispatcher
+    with _pool_lock:
+        if _dispatcher is None:
+            _dispatcher = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PDF_EXTRACTION_THREADS', 2),
+                thread_name_prefix='pdf-extraction',
+            )
+        return _dispatcher
+
+
+@contextmanager
+def _local_path(field_file):
+    """Fournir un chemin local pour le fichier, en le copiant si le stockage est distant."""
+    try:
+        yield field_file.path
+        return
+    except NotImplementedError:
+        pass
+
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            field_file.open('rb')
+            try:
+                for chunk in field_file.chunks():
+                    tmp.write(chunk)
+            finally:
+                field_file.close()
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def extract_text_for_file(field_file):
+    """
+    Retourner le texte d'un fichier PDF, en réutilisant une extraction existante.
+
+    Les résultats sont stockés dans ExtractedDocument, indexés par l'empreinte
+    du fichier : un même PDF (par exemple une soumission renvoyée à
+    l'identique) n'est parsé qu'une seule fois.
+
+    Args:
+        field_file: FieldFile du fichier PDF
+
+    Returns:
+        str: Texte extrait
+    """
+    ExtractedDocument = apps.get_model('ai_engine', 'ExtractedDocument')
+    digest = compute_file_hash(field_file)
+
+    document = ExtractedDocument.objects.filter(sha256=digest).only('text').first()
+    if document:
+        return document.text
+
+    with _in_flight_lock:
+        event = _in_flight.get(digest)
+        owner = event is None
+        if owner:
+            event = _in_flight[digest] = threading.Event()
+
+    if not owner:
+        # Une autre extraction du même fichier est en cours dans ce processus
+        event.wait(getattr(settings, 'PDF_EXTRACTION_TIMEOUT', 120))
+        document = ExtractedDocument.objects.filter(sha256=digest).only('text').first()
+        return document.text if document else ''
+
+    try:
+        with _local_path(field_file) as path:
+            future = _get_process_pool().submit(
+                extract_pdf_text, path, getattr(settings, 'PDF_EXTRACTION_MAX_PAGES', None)
+            )
+            text, page_count = future.result(timeout=getattr(settings, 'PDF_EXTRACTION_TIMEOUT', 120))
+
+        document, _ = ExtractedDocument.objects.get_or_create(
+            sha256=digest,
+            defaults={'text': text, 'page_count': page_count},
+        )
+        return document.text
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(digest, None)
+        event.set()
+
+
+def ensure_extracted_text(instance, text_field, file_field='file'):
+    """
+    Retourner le texte d'une instance, en l'extrayant du PDF s'il est vide.
+
+    Utilisé en dernier recours par l'évaluation quand l'extraction en
+    arrière-plan n'est pas encore terminée.
+    """
+    text = getattr(instance, text_field)
+    field_file = getattr(instance, file_field)
+    if text or not field_file:
+        return text
+
+    try:
+        text = extract_text_for_file(field_file)
+    except Exception as e:
+        logger.error(f"Extraction du texte impossible pour {instance._meta.label} {instance.pk}: {str(e)}")
+        return ''
+
+    type(instance).objects.filter(pk=instance.pk).update(**{text_field: text})
+    setattr(instance, text_field, text)
+    return text
+
+
+def ensure_extracted_text_in_thread(instance, text_field, file_field='file'):
+    """
+    ensure_extracted_text pour un thread quelconque (sync_to_async(thread_sensitive=False)).
+
+    Hors des requêtes, rien ne ferme les connexions ouvertes par un thread :
+    elles le sont ici, comme pour les tâches d'arrière-plan.
+    """
+    close_old_connections()
+    try:
+        return ensure_extracted_text(instance, text_field, file_field)
+    finally:
+        close_old_connections()
+
+
+def _extract_for_instance(model_label, pk, text_field, file_field, overwrite):
+    """Tâche d'arrière-plan : extraire le texte et l'enregistrer sur l'instance."""
+    close_old_connections()
+    try:
+        model = apps.get_model(model_label)
+        instance = model.objects.filter(pk=pk).first()
+        if instance is None or not getattr(instance, file_field):
+            return
+
+        text = extract_text_for_file(getattr(instance, file_field))
+
+        queryset = model.objects.filter(pk=pk)
+        if not overwrite:
+            # Ne pas écraser un texte saisi manuellement (ex: correction)
+            queryset = queryset.filter(**{text_field: ''})
+        queryset.update(**{text_field: text})
+        logger.info(f"Texte extrait pour {model_label} {pk} ({len(text)} caractères).")
+    except Exception as e:
+        logger.exception(f"Erreur lors de l'extraction du texte pour {model_label} {pk}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_text_extraction(instance, text_field, file_field='file', overwrite=True):
+    """
+    Planifier l'extraction du texte du PDF d'une instance, hors du thread de requête.
+
+    L'extraction démarre après la validation de la transaction courante.
+
+    Args:
+        instance: Instance enregistrée (Submission, Exercise, ExerciseCorrection)
+        text_field: Champ texte à remplir
+        file_field: Champ fichier contenant le PDF
+        overwrite: Remplacer un texte déjà présent
+    """
+    if not getattr(instance, file_field):
+        return
+
+    args = (instance._meta.label, instance.pk, text_field, file_field, overwrite)
+    transaction.on_commit(lambda: _get_dispatcher().submit(_extract_for_instance, *args))
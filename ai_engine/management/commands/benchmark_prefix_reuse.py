@@ -0,0 +1,119 @@
+import asyncio
+import statistics
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from exercises.models import Exercise
+from submissions.models import Submission
+from ai_engine.clients import get_client, close_clients
+from ai_engine.prompts import prompt_template_cache
+from ai_engine.services import AIEvaluationService
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la latence par soumission avec et sans réutilisation du préfixe "
+        "commun du prompt (message système /api/chat et keep_alive)."
+    )
+
+    # Mode témoin : chaque prompt commence par un identifiant unique, pour
+    # qu'Ollama ne puisse réutiliser aucun préfixe déjà évalué. Les deux modes
+    # sont alternés soumission par soumission (ordre inversé une fois sur
+    # deux), pour que la charge de l'hôte ou la température du GPU ne
+    # favorisent pas l'un d'eux. Avec un seul emplacement de cache
+    # (OLLAMA_NUM_PARALLEL=1), la requête témoin évince le préfixe en cache :
+    # le gain mesuré est alors un minimum.
+    MODES = (("Sans réutilisation", False), ("Avec réutilisation", True))
+
+    def add_arguments(self, parser):
+        parser.add_argument('exercise_id', type=int, help="ID de l'exercice")
+        parser.add_argument(
+            '--samples', type=int, default=5,
+            help="Nombre de soumissions envoyées dans chaque mode (défaut: 5)"
+        )
+        parser.add_argument(
+            '--template', type=int, default=None, dest='prompt_template_id',
+            help="ID du template de prompt à utiliser"
+        )
+
+    def handle(self, *args, **options):
+        exercise = Exercise.objects.filter(pk=options['exercise_id']).first()
+        if exercise is None:
+            raise CommandError(f"Exercice {options['exercise_id']} introuvable.")
+
+        submissions = list(
+            Submission.objects.filter(exercise=exercise)
+            .select_related('student')
+            .order_by('id')[:options['samples']]
+        )
+        if not submissions:
+            raise CommandError("Aucune soumission pour cet exercice.")
+
+        # Requêtes non diffusées en flux : on mesure la latence complète
+        service = AIEvaluationService(stream=False)
+        if service.ai_model is None:
+            raise CommandError("Aucun modèle d'IA actif n'est disponible.")
+
+        results = asyncio.run(self._benchmark(service, exercise, submissions, options['prompt_template_id']))
+
+        self.stdout.write(f"Modèle: {service.ai_model.model_id} ({service.ai_model.endpoint_url})")
+        self.stdout.write(f"{len(submissions)} soumission(s) par mode\n")
+        for label, samples in results:
+            latencies = [sample['latency'] for sample in samples]
+            prompt_tokens = [sample['prompt_eval_count'] for sample in samples if sample['prompt_eval_count'] is not None]
+            prompt_durations = [sample['prompt_eval_duration'] for sample in samples if sample['prompt_eval_duration'] is not None]
+            line = (
+                f"{label:<20} latence moyenne: {statistics.mean(latencies):.2f}s, "
+                f"médiane: {statistics.median(latencies):.2f}s"
+            )
+            if prompt_tokens:
+                line += f", tokens de prompt évalués: {statistics.mean(prompt_tokens):.0f}"
+            if prompt_durations:
+                line += f", évaluation du prompt: {statistics.mean(prompt_durations) / 1e9:.2f}s"
+            self.stdout.write(line)
+
+    async def _benchmark(self, service, exercise, submissions, prompt_template_id):
+        context = await service.load_exercise_context(exercise, prompt_template_id)
+        if context['prompt_template'] is None:
+            raise CommandError("Aucun template de prompt disponible.")
+
+        template = prompt_template_cache.compile(context['prompt_template'])
+        prompts = [
+            template.render(service.build_prompt_variables(context, submission))
+            for submission in submissions
+        ]
+
+        client = get_client(service.ai_model.endpoint_url)
+        try:
+            # Charger le modèle avant les mesures, pour ne pas pénaliser le premier mode
+            await self._send(service, client, prompts[0], prefix_reuse=False)
+
+            results = {label: [] for label, _ in self.MODES}
+            for index, prompt in enumerate(prompts):
+                modes = self.MODES if index % 2 == 0 else self.MODES[::-1]
+                for label, prefix_reuse in modes:
+                    results[label].append(await self._send(service, client, prompt, prefix_reuse))
+            return list(results.items())
+        finally:
+            await close_clients()
+
+    async def _send(self, service, client, prompt, prefix_reuse):
+        """Envoyer une requête et retourner sa latence et les statistiques d'Ollama."""
+        prefix, suffix = prompt
+        if not prefix_reuse:
+            # Préfixe inédit : aucun cache ne peut servir (mode témoin)
+            prefix = f"[{uuid.uuid4().hex}]\n{prefix}"
+        request_data = service.build_request_data(prefix, suffix, prefix_reuse=prefix_reuse)
+        url = service.request_url(service.ai_model, request_data)
+
+        started_at = time.perf_counter()
+        response = await client.post(url, json=request_data)
+        latency = time.perf_counter() - started_at
+        response.raise_for_status()
+        result = response.json()
+
+        return {
+            'latency': latency,
+            'prompt_eval_count': result.get('prompt_eval_count'),
+            'prompt_eval_duration': result.get('prompt_eval_duration'),
+        }
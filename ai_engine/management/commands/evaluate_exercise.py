@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from exercises.models import Exercise
+from ai_engine.evaluator import enqueue_exercise_submissions, run_exercise_batch
+
+
+class Command(BaseCommand):
+    help = "Évalue en lot toutes les soumissions non notées d'un exercice."
+
+    def add_arguments(self, parser):
+        parser.add_argument('exercise_id', type=int, help="ID de l'exercice")
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help="Nombre maximum d'évaluations simultanées (défaut: EVALUATION_WORKER_CONCURRENCY)"
+        )
+        parser.add_argument(
+            '--template', type=int, default=None, dest='prompt_template_id',
+            help="ID du template de prompt à utiliser"
+        )
+        parser.add_argument(
+            '--force-refresh', action='store_true',
+            help="Ignorer le cache de résultats et interroger le modèle"
+        )
+
+    def handle(self, *args, **options):
+        exercise_id = options['exercise_id']
+        if not Exercise.objects.filter(pk=exercise_id).exists():
+            raise CommandError(f"Exercice {exercise_id} introuvable.")
+
+        queued = enqueue_exercise_submissions(exercise_id)
+        self.stdout.write(f"{queued} soumission(s) mise(s) en attente.")
+
+        report = run_exercise_batch(
+            exercise_id,
+            concurrency=options['concurrency'],
+            force_refresh=options['force_refresh'],
+            prompt_template_id=options['prompt_template_id'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['succeeded']}/{report['total']} soumission(s) évaluée(s), "
+            f"{report['failed']} échec(s) en {report['elapsed']}s "
+            f"({report['throughput']} soumissions/s, enregistrement moyen: {report['avg_save_ms']} ms)."
+        ))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from ai_engine.evaluator import requeue_dead_letters
+
+
+class Command(BaseCommand):
+    help = "Remet en attente les soumissions dont l'évaluation a été abandonnée après plusieurs tentatives."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--exercise', type=int, default=None, dest='exercise_id',
+            help="Ne traiter que les soumissions de cet exercice"
+        )
+        parser.add_argument(
+            '--limit', type=int, default=None,
+            help="Nombre maximum de soumissions à remettre en attente"
+        )
+
+    def handle(self, *args, **options):
+        requeued = requeue_dead_letters(
+            exercise_id=options['exercise_id'],
+            limit=options['limit'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{requeued} soumission(s) remise(s) en attente."))
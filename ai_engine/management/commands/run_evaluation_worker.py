@@ -0,0 +1,36 @@
+import asyncio
+from django.core.management.base import BaseCommand
+from ai_engine.worker import EvaluationWorker
+
+
+class Command(BaseCommand):
+    help = "Lance un worker qui évalue en continu les soumissions en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help="Nombre maximum d'évaluations simultanées (défaut: EVALUATION_WORKER_CONCURRENCY)"
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help="Nombre maximum de soumissions réservées à chaque requête (défaut: EVALUATION_WORKER_BATCH_SIZE)"
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help="Délai en secondes entre deux recherches de soumissions (défaut: EVALUATION_WORKER_POLL_INTERVAL)"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="S'arrêter dès qu'il n'y a plus de soumission en attente"
+        )
+
+    def handle(self, *args, **options):
+        worker = EvaluationWorker(
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+        )
+        success_count = asyncio.run(worker.run(once=options['once']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{success_count}/{worker.processed_count} soumission(s) évaluée(s) avec succès."
+        ))
@@ -0,0 +1,201 @@
+import os
+from django.conf import settings
+from django.db.models import Count
+from .models import AIEvaluationJob
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # Export Prometheus désactivé
+    prometheus_client = None
+
+# Étapes d'une évaluation, dans l'ordre du pipeline (champs de AIEvaluationJob)
+JOB_TIMING_FIELDS = (
+    ('queue_wait_time', "Attente en file"),
+    ('db_read_time', "Lectures en base"),
+    ('prompt_build_time', "Construction du prompt"),
+    ('time_to_first_token', "Premier token"),
+    ('generation_time', "Génération"),
+    ('parse_time', "Lecture de la réponse"),
+    ('db_write_time', "Écriture en base"),
+    ('processing_time', "Appel au modèle (total)"),
+    ('prompt_eval_duration', "Ollama : évaluation du prompt"),
+    ('eval_duration', "Ollama : génération"),
+    ('load_duration', "Ollama : chargement du modèle"),
+)
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, percent):
+    """Percentile d'une liste triée, par interpolation linéaire entre les rangs."""
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def job_timing_summary(ai_model, sample_size=None):
+    """
+    Calculer p50/p95/p99 de chaque étape sur les derniers jobs terminés d'un modèle.
+
+    Les valeurs sont lues en une requête et les percentiles calculés en
+    Python, quelle que soit la base de données.
+
+    Args:
+        ai_model: Instance de AIModel
+        sample_size: Nombre de jobs pris en compte (défaut: AI_METRICS_SAMPLE_SIZE)
+
+    Returns:
+        list: Dicts (field, label, count, p50, p95, p99) dans l'ordre de JOB_TIMING_FIELDS
+    """
+    sample_size = sample_size or getattr(settings, 'AI_METRICS_SAMPLE_SIZE', 1000)
+    fields = [field for field, _ in JOB_TIMING_FIELDS]
+    rows = list(
+        AIEvaluationJob.objects.filter(model=ai_model, status='completed')
+        .order_by('-created_at')
+        .values_list(*fields)[:sample_size]
+    )
+
+    summary = []
+    for index, (field, label) in enumerate(JOB_TIMING_FIELDS):
+        values = sorted(row[index] for row in rows if row[index] is not None)
+        line = {'field': field, 'label': label, 'count': len(values)}
+        for percent in PERCENTILES:
+            line[f'p{percent}'] = percentile(values, percent)
+        summary.append(line)
+    return summary
+
+
+# Export Prometheus
+#
+# Les métriques sont tenues en mémoire dans chaque processus, sans requête
+# ni entrée-sortie sur le chemin de l'évaluation. Sous gunicorn, définir
+# PROMETHEUS_MULTIPROC_DIR (répertoire vide au démarrage) : chaque worker y
+# écrit ses valeurs et la vue metrics_view les agrège. Les effectifs par
+# statut sont lus en base au moment de la collecte.
+
+# Bornes des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250, 500)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+if prometheus_client is not None:
+    EVALUATION_JOBS = Counter(
+        'smartdb_evaluation_jobs', "Jobs d'évaluation terminés, par modèle et statut",
+        ['model', 'status'],
+    )
+    EVALUATION_STAGE_SECONDS = Histogram(
+        'smartdb_evaluation_stage_seconds', "Durée de chaque étape d'une évaluation",
+        ['model', 'stage'], buckets=DURATION_BUCKETS,
+    )
+    LLM_TOKENS_PER_SECOND = Histogram(
+        'smartdb_llm_tokens_per_second', "Vitesse de génération du modèle",
+        ['model'], buckets=TOKEN_RATE_BUCKETS,
+    )
+    LLM_TOKENS = Counter(
+        'smartdb_llm_tokens', "Tokens traités par le modèle",
+        ['model', 'kind'],
+    )
+    EVALUATION_CACHE_REQUESTS = Counter(
+        'smartdb_evaluation_cache_requests', "Recherches dans le cache de résultats",
+        ['result'],
+    )
+    VIEW_DB_QUERIES = Histogram(
+        'smartdb_view_db_queries', "Requêtes SQL par requête HTTP, par vue",
+        ['view'], buckets=QUERY_COUNT_BUCKETS,
+    )
+    VIEW_DB_SECONDS = Histogram(
+        'smartdb_view_db_seconds', "Temps passé en base par requête HTTP, par vue",
+        ['view'], buckets=DURATION_BUCKETS,
+    )
+
+
+def _model_label(ai_model):
+    return ai_model.name if ai_model is not None else 'inconnu'
+
+
+def record_job(job):
+    """Comptabiliser un job d'évaluation terminé (succès, échec ou résultat en cache)."""
+    if prometheus_client is None:
+        return
+    model = _model_label(job.model)
+    EVALUATION_JOBS.labels(model=model, status=job.status).inc()
+    for field, _ in JOB_TIMING_FIELDS:
+        value = getattr(job, field)
+        if value is not None and field != 'db_write_time':
+            EVALUATION_STAGE_SECONDS.labels(model=model, stage=field).observe(value)
+
+    if job.prompt_eval_count:
+        LLM_TOKENS.labels(model=model, kind='prompt').inc(job.prompt_eval_count)
+    if job.eval_count:
+        LLM_TOKENS.labels(model=model, kind='generated').inc(job.eval_count)
+        if job.eval_duration:
+            LLM_TOKENS_PER_SECOND.labels(model=model).observe(job.eval_count / job.eval_duration)
+
+
+def record_stage(ai_model, stage, seconds):
+    """Comptabiliser une étape mesurée après l'enregistrement du job (écriture des résultats)."""
+    if prometheus_client is not None:
+        EVALUATION_STAGE_SECONDS.labels(model=_model_label(ai_model), stage=stage).observe(seconds)
+
+
+def record_cache_lookup(hit):
+    """Comptabiliser une recherche dans le cache de résultats."""
+    if prometheus_client is not None:
+        EVALUATION_CACHE_REQUESTS.labels(result='hit' if hit else 'miss').inc()
+
+
+def record_view_queries(view, count, seconds):
+    """Comptabiliser les requêtes SQL d'une requête HTTP (voir QueryCountMiddleware)."""
+    if prometheus_client is not None:
+        VIEW_DB_QUERIES.labels(view=view).observe(count)
+        VIEW_DB_SECONDS.labels(view=view).observe(seconds)
+
+
+class DatabaseStateCollector:
+    """Effectifs lus en base à chaque collecte : soumissions et jobs par statut."""
+
+    def collect(self):
+        from submissions.models import Submission
+
+        submissions = GaugeMetricFamily(
+            'smartdb_submissions', "Soumissions par statut (file d'attente, en cours...)",
+            labels=['status'],
+        )
+        counts = dict(Submission.objects.values_list('status').annotate(count=Count('id')).order_by())
+        for status, _ in Submission.STATUS_CHOICES:
+            submissions.add_metric([status], counts.get(status, 0))
+        yield submissions
+
+        dead_letters = GaugeMetricFamily(
+            'smartdb_evaluation_dead_letters', "Jobs abandonnés non encore remis en file",
+        )
+        dead_letters.add_metric([], AIEvaluationJob.objects.filter(
+            status='dead_letter', requeued_at__isnull=True
+        ).count())
+        yield dead_letters
+
+
+def generate_metrics():
+    """
+    Produire le texte d'exposition Prometheus.
+
+    Returns:
+        tuple: (contenu, type MIME)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+
+    database_registry = prometheus_client.CollectorRegistry()
+    database_registry.register(DatabaseStateCollector())
+    content = prometheus_client.generate_latest(registry) + prometheus_client.generate_latest(database_registry)
+    return content, prometheus_client.CONTENT_TYPE_LATEST
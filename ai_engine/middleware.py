@@ -0,0 +1,81 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from .metrics import prometheus_client, record_view_queries
+
+
+class QueryCounter:
+    """Wrapper d'exécution comptant les requêtes SQL et leur durée (voir connection.execute_wrapper)."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started_at
+
+
+class QueryCountMiddleware:
+    """
+    Mesurer le nombre de requêtes SQL et le temps passé en base par vue.
+
+    Fonctionne sans DEBUG (pas de connection.queries) ; les mesures sont
+    exportées par la vue des métriques Prometheus, et le middleware est
+    désactivé si prometheus_client n'est pas installé. Compatible avec les
+    chaînes synchrone (WSGI) et asynchrone (ASGI), sans adaptation de Django.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if prometheus_client is None:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        self._record(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        # Sous ASGI, l'ORM s'exécute dans le thread de sync_to_async propre à la
+        # requête, qui a sa propre connexion : le compteur y est installé
+        counter = QueryCounter()
+        await sync_to_async(self._install, thread_sensitive=True)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(self._uninstall, thread_sensitive=True)(counter)
+
+        self._record(request, counter)
+        return response
+
+    @staticmethod
+    def _install(counter):
+        connection.execute_wrappers.append(counter)
+
+    @staticmethod
+    def _uninstall(counter):
+        connection.execute_wrappers.remove(counter)
+
+    @staticmethod
+    def _record(request, counter):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'non_resolue'
+        record_view_queries(view, counter.count, counter.duration)
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='cache_hits',
+            field=models.PositiveIntegerField(default=0, help_text='Nombre de résultats servis depuis le cache'),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, help_text='Empreinte du prompt et des paramètres du modèle', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='cache_misses',
+            field=models.PositiveIntegerField(default=0, help_text="Nombre d'appels au modèle faute de résultat en cache"),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0002_aievaluationjob_cache_hits_aievaluationjob_cache_key_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='time_to_first_token',
+            field=models.FloatField(blank=True, help_text='Délai avant le premier token généré, en secondes', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='tokens_generated',
+            field=models.PositiveIntegerField(default=0, help_text='Nombre de tokens générés (mis à jour pendant la génération en flux)'),
+        ),
+    ]
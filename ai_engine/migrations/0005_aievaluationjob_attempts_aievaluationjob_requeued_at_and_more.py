@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0004_extracteddocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, help_text="Nombre d'appels au modèle (tentatives comprises)"),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='requeued_at',
+            field=models.DateTimeField(blank=True, help_text='Date de remise en file de la soumission après abandon', null=True),
+        ),
+        migrations.AlterField(
+            model_name='aievaluationjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('processing', 'En cours'), ('completed', 'Terminé'), ('failed', 'Échoué'), ('dead_letter', 'Abandonné après plusieurs tentatives')], default='pending', max_length=20),
+        ),
+    ]
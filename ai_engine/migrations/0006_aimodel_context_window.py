@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0005_aievaluationjob_attempts_aievaluationjob_requeued_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimodel',
+            name='context_window',
+            field=models.PositiveIntegerField(default=8192, help_text='Taille de la fenêtre de contexte du modèle, en tokens (prompt et réponse)'),
+        ),
+    ]
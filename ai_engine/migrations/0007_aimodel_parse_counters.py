@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0006_aimodel_context_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimodel',
+            name='fallback_parse_count',
+            field=models.PositiveIntegerField(default=0, help_text='Nombre de réponses non conformes au schéma JSON (lecture de secours)'),
+        ),
+        migrations.AddField(
+            model_name='aimodel',
+            name='parsed_response_count',
+            field=models.PositiveIntegerField(default=0, help_text='Nombre de réponses du modèle lues'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_engine', '0007_aimodel_parse_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='db_read_time',
+            field=models.FloatField(blank=True, help_text="Lecture de la soumission et des données de l'exercice", null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='db_write_time',
+            field=models.FloatField(blank=True, help_text="Écriture de l'évaluation et de ses éléments de feedback", null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='eval_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Nombre de tokens générés', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='eval_duration',
+            field=models.FloatField(blank=True, help_text='Génération des tokens', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='generation_time',
+            field=models.FloatField(blank=True, help_text='Génération de la réponse, après le premier token', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='load_duration',
+            field=models.FloatField(blank=True, help_text='Chargement du modèle', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='parse_time',
+            field=models.FloatField(blank=True, help_text='Lecture et validation de la réponse du modèle', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='prompt_build_time',
+            field=models.FloatField(blank=True, help_text='Extraction du texte et construction du prompt', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='prompt_eval_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Nombre de tokens du prompt évalués', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='prompt_eval_duration',
+            field=models.FloatField(blank=True, help_text='Évaluation du prompt', null=True),
+        ),
+        migrations.AddField(
+            model_name='aievaluationjob',
+            name='queue_wait_time',
+            field=models.FloatField(blank=True, help_text='Attente de la soumission dans la file avant son évaluation', null=True),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.exceptions import ValidationError
 from django.conf import settings
 
 
@@ -21,12 +22,24 @@ class AIModel(models.Model):
     # Paramètres par défaut
     default_temperature = models.FloatField(default=0.7)
     default_max_tokens = models.IntegerField(default=2048)
+    context_window = models.PositiveIntegerField(
+        default=8192,
+        help_text="Taille de la fenêtre de contexte du modèle, en tokens (prompt et réponse)"
+    )
     
     # Métriques de performance
     accuracy_score = models.FloatField(
         default=0.0,
         help_text="Score de précision (0-1) basé sur les évaluations manuelles"
     )
+    parsed_response_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre de réponses du modèle lues"
+    )
+    fallback_parse_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre de réponses non conformes au schéma JSON (lecture de secours)"
+    )
     
     # Statut
     is_active = models.BooleanField(default=True)
@@ -37,6 +50,13 @@ class AIModel(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @property
+    def fallback_parse_rate(self):
+        """Part des réponses lues par la lecture de secours (0-1)."""
+        if not self.parsed_response_count:
+            return 0.0
+        return self.fallback_parse_count / self.parsed_response_count
 
 
 class AIPromptTemplate(models.Model):
@@ -83,6 +103,14 @@ class AIPromptTemplate(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.task_type})"
+    
+    def clean(self):
+        from .prompts import validate_template
+        
+        try:
+            validate_template(self.prompt_text, self.available_variables)
+        except ValidationError as e:
+            raise ValidationError({'prompt_text': e.messages})
 
 
 class AIEvaluationJob(models.Model):
@@ -118,12 +146,22 @@ class AIEvaluationJob(models.Model):
         ('processing', 'En cours'),
         ('completed', 'Terminé'),
         ('failed', 'Échoué'),
+        ('dead_letter', 'Abandonné après plusieurs tentatives'),
     )
     status = models.CharField(
         max_length=20,
         choices=STATUS_CHOICES,
         default='pending'
     )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre d'appels au modèle (tentatives comprises)"
+    )
+    requeued_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Date de remise en file de la soumission après abandon"
+    )
     
     # Résultats
     response_json = models.JSONField(
@@ -142,6 +180,78 @@ class AIEvaluationJob(models.Model):
         default=0,
         help_text="Nombre de tokens utilisés"
     )
+    tokens_generated = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre de tokens générés (mis à jour pendant la génération en flux)"
+    )
+    time_to_first_token = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Délai avant le premier token généré, en secondes"
+    )
+    
+    # Détail du temps passé par étape (secondes)
+    queue_wait_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Attente de la soumission dans la file avant son évaluation"
+    )
+    db_read_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Lecture de la soumission et des données de l'exercice"
+    )
+    prompt_build_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Extraction du texte et construction du prompt"
+    )
+    generation_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Génération de la réponse, après le premier token"
+    )
+    parse_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Lecture et validation de la réponse du modèle"
+    )
+    db_write_time = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Écriture de l'évaluation et de ses éléments de feedback"
+    )
+    
+    # Statistiques renvoyées par Ollama (durées en secondes)
+    prompt_eval_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Nombre de tokens du prompt évalués"
+    )
+    eval_count = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Nombre de tokens générés"
+    )
+    load_duration = models.FloatField(null=True, blank=True, help_text="Chargement du modèle")
+    prompt_eval_duration = models.FloatField(null=True, blank=True, help_text="Évaluation du prompt")
+    eval_duration = models.FloatField(null=True, blank=True, help_text="Génération des tokens")
+    
+    # Cache de résultats
+    cache_key = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text="Empreinte du prompt et des paramètres du modèle"
+    )
+    cache_hits = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre de résultats servis depuis le cache"
+    )
+    cache_misses = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre d'appels au modèle faute de résultat en cache"
+    )
     
     # Erreurs
     error_message = models.TextField(blank=True)
@@ -197,4 +307,22 @@ class AIFeedback(models.Model):
         return f"Feedback de {self.user.email} - Note: {self.rating}/5"
     
     class Meta:
-        unique_together = ('evaluation_job', 'user')
\ No newline at end of file
+        unique_together = ('evaluation_job', 'user')
+
+
+class ExtractedDocument(models.Model):
+    """Texte extrait d'un fichier PDF, indexé par l'empreinte de son contenu."""
+    
+    sha256 = models.CharField(
+        max_length=64,
+        unique=True,
+        help_text="Empreinte SHA-256 du fichier"
+    )
+    text = models.TextField(blank=True)
+    page_count = models.PositiveIntegerField(default=0)
+    
+    # Métadonnées
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Document {self.sha256[:12]} ({self.page_count} pages)"
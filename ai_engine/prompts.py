@@ -0,0 +1,348 @@
+import math
+import time
+import threading
+from string import Formatter
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+# Variables fournies par AIEvaluationService.build_prompt_variables
+PROMPT_VARIABLES = frozenset({
+    'exercise_title', 'exercise_description', 'exercise_content',
+    'correction_content', 'submission_content', 'student_name', 'total_points',
+})
+
+# Variables propres à chaque soumission : tout ce qui les précède dans le
+# template est commun aux soumissions d'un même exercice.
+SUBMISSION_VARIABLES = frozenset({'submission_content', 'student_name'})
+
+
+def _field_root(field_name):
+    """Nom de la variable d'un champ de format ('a.b[0]' -> 'a')."""
+    for index, char in enumerate(field_name):
+        if char in '.[':
+            return field_name[:index]
+    return field_name
+
+
+def _rebuild(literal, field_name, format_spec, conversion):
+    """Reconstruire le texte d'un morceau de template analysé par Formatter.parse."""
+    text = literal.replace('{', '{{').replace('}', '}}')
+    if field_name is not None:
+        text += '{' + field_name
+        if conversion:
+            text += '!' + conversion
+        if format_spec:
+            text += ':' + format_spec
+        text += '}'
+    return text
+
+
+def split_template(template_text):
+    """
+    Séparer un template en une partie commune et une partie propre à la soumission.
+
+    La coupure se fait juste avant la première variable de SUBMISSION_VARIABLES.
+
+    Args:
+        template_text: Texte du template (syntaxe str.format)
+
+    Returns:
+        tuple: (template du préfixe commun, template de la suite)
+    """
+    prefix, suffix = [], []
+    target = prefix
+    for literal, field_name, format_spec, conversion in Formatter().parse(template_text):
+        if target is prefix and field_name is not None and _field_root(field_name) in SUBMISSION_VARIABLES:
+            prefix.append(_rebuild(literal, None, None, None))
+            target = suffix
+            target.append(_rebuild('', field_name, format_spec, conversion))
+            continue
+        target.append(_rebuild(literal, field_name, format_spec, conversion))
+    return ''.join(prefix), ''.join(suffix)
+
+
+def render_prompt(template_text, variables):
+    """
+    Formater un template en deux parties : préfixe commun et suite.
+
+    Le préfixe est identique pour toutes les soumissions d'un exercice ; envoyé
+    comme message système, il permet à Ollama de réutiliser son cache KV au
+    lieu de réévaluer l'énoncé et la correction à chaque soumission.
+
+    Args:
+        template_text: Texte du template (syntaxe str.format)
+        variables: Variables du prompt
+
+    Returns:
+        tuple: (préfixe commun, suite propre à la soumission)
+
+    Raises:
+        KeyError: Variable du template absente de `variables`
+    """
+    prefix_template, suffix_template = split_template(template_text)
+    return prefix_template.format(**variables), suffix_template.format(**variables)
+
+
+def template_variables(template_text):
+    """
+    Retourner les variables utilisées par un template.
+
+    Raises:
+        ValueError: Syntaxe de template invalide (accolade non fermée...)
+    """
+    return {
+        _field_root(field_name)
+        for _, field_name, _, _ in Formatter().parse(template_text)
+        if field_name is not None
+    }
+
+
+def validate_template(template_text, available_variables=None):
+    """
+    Vérifier qu'un template ne contient que des variables connues.
+
+    Args:
+        template_text: Texte du template
+        available_variables: Variables autorisées par le template (toutes celles
+            fournies par le service si la liste est vide)
+
+    Raises:
+        ValidationError: Syntaxe invalide, variable positionnelle ou inconnue
+    """
+    try:
+        used = template_variables(template_text)
+    except ValueError as e:
+        raise ValidationError(f"Syntaxe de template invalide: {str(e)}")
+
+    if '' in used or any(name.isdigit() for name in used):
+        raise ValidationError("Les variables du template doivent être nommées (ex: {submission_content}).")
+
+    allowed = set(available_variables or PROMPT_VARIABLES) & PROMPT_VARIABLES
+    unknown = sorted(used - allowed)
+    if unknown:
+        raise ValidationError(
+            f"Variables inconnues dans le template: {', '.join(unknown)}. "
+            f"Variables disponibles: {', '.join(sorted(allowed))}."
+        )
+
+
+# Variables communes à l'exercice, de la moins utile à l'évaluation à la plus
+# utile : la première est raccourcie en premier quand le prompt est trop long.
+TRIMMABLE_VARIABLES = ('exercise_content', 'exercise_description', 'correction_content')
+
+TRUNCATION_MARKER = "\n[... contenu tronqué ...]"
+
+# En-tête de chaque partie d'une soumission découpée (voir AIEvaluationService.fit_prompts)
+# La note d'une partie est la somme des points des seules questions qu'elle
+# contient : les notes des parties s'additionnent (voir merge_chunk_results).
+CHUNK_HEADER = (
+    "[Partie {index}/{count} de la soumission : évaluer uniquement les réponses "
+    "présentes dans cette partie. La note est la somme des points obtenus aux "
+    "questions traitées ici, sur le barème de l'exercice, sans compter les "
+    "questions des autres parties]\n"
+)
+
+# Taille minimale d'une partie de soumission, en tokens
+MIN_CHUNK_TOKENS = 256
+
+
+def estimate_tokens(text):
+    """
+    Estimer le nombre de tokens d'un texte.
+
+    Estimation par le nombre de caractères (PROMPT_CHARS_PER_TOKEN), sans
+    tokenizer : suffisante pour rester sous la fenêtre de contexte du modèle.
+    """
+    if not text:
+        return 0
+    chars_per_token = getattr(settings, 'PROMPT_CHARS_PER_TOKEN', 4)
+    return math.ceil(len(text) / chars_per_token)
+
+
+def compact_text(text):
+    """Supprimer les espaces en fin de ligne et les lignes vides répétées."""
+    if not text:
+        return text
+    lines = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return '\n'.join(lines).strip('\n')
+
+
+def truncate_text(text, max_tokens):
+    """
+    Tronquer un texte à environ `max_tokens` tokens, à la fin d'une ligne si possible.
+
+    Returns:
+        str: Texte inchangé s'il tient dans le budget, sinon tronqué et suivi de TRUNCATION_MARKER
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(0, int(max_tokens * getattr(settings, 'PROMPT_CHARS_PER_TOKEN', 4)) - len(TRUNCATION_MARKER))
+    cut = text.rfind('\n', 0, max_chars)
+    if cut < max_chars // 2:
+        cut = max_chars
+    return text[:cut].rstrip() + TRUNCATION_MARKER
+
+
+def trim_variables(variables, max_tokens):
+    """
+    Raccourcir les variables communes à l'exercice pour tenir dans un budget.
+
+    Les variables de TRIMMABLE_VARIABLES sont raccourcies dans l'ordre, chacune
+    juste assez pour résorber le dépassement restant. Le résultat ne dépend
+    pas de la soumission : le préfixe commun du prompt reste identique d'une
+    soumission à l'autre.
+
+    Args:
+        variables: Variables du prompt (non modifiées)
+        max_tokens: Budget des variables de TRIMMABLE_VARIABLES
+
+    Returns:
+        dict: Copie des variables, raccourcies si nécessaire
+    """
+    trimmed = dict(variables)
+    for name in TRIMMABLE_VARIABLES:
+        if isinstance(trimmed.get(name), str):
+            trimmed[name] = compact_text(trimmed[name])
+
+    excess = sum(estimate_tokens(trimmed.get(name)) for name in TRIMMABLE_VARIABLES) - max_tokens
+    for name in TRIMMABLE_VARIABLES:
+        if excess <= 0:
+            break
+        tokens = estimate_tokens(trimmed.get(name))
+        if not tokens:
+            continue
+        keep = max(0, tokens - excess)
+        trimmed[name] = truncate_text(trimmed[name], keep) if keep else ''
+        excess -= tokens - estimate_tokens(trimmed[name])
+    return trimmed
+
+
+def split_into_chunks(text, max_tokens):
+    """
+    Découper un texte en morceaux d'au plus `max_tokens` tokens.
+
+    Les coupures se font entre deux paragraphes, sinon entre deux lignes ;
+    une ligne plus longue que le budget est coupée au milieu.
+
+    Returns:
+        list: Morceaux du texte, dans l'ordre
+    """
+    max_chars = max(1, int(max_tokens * getattr(settings, 'PROMPT_CHARS_PER_TOKEN', 4)))
+    chunks = []
+    current = ''
+    for paragraph in text.split('\n\n'):
+        pieces = [paragraph] if len(paragraph) <= max_chars else paragraph.split('\n')
+        for piece in pieces:
+            separator = '\n\n' if piece is paragraph else '\n'
+            while len(piece) > max_chars:
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(piece[:max_chars])
+                piece = piece[max_chars:]
+            if current and len(current) + len(separator) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ''
+            current = current + separator + piece if current else piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+class CompiledTemplate:
+    """Template analysé une fois : préfixe commun et suite prêts à être formatés."""
+
+    def __init__(self, template):
+        self.template_id = template.pk
+        self.updated_at = template.updated_at
+        self.prefix_template, self.suffix_template = split_template(template.prompt_text)
+        self.variables = frozenset(template_variables(template.prompt_text))
+        # Tokens du texte fixe du template, hors variables
+        self.literal_tokens = estimate_tokens(''.join(
+            literal for literal, _, _, _ in Formatter().parse(template.prompt_text)
+        ))
+
+    def render(self, variables):
+        """
+        Formater le template (voir render_prompt).
+
+        Raises:
+            KeyError: Variable du template absente de `variables`
+        """
+        return self.prefix_template.format(**variables), self.suffix_template.format(**variables)
+
+
+class PromptTemplateCache:
+    """
+    Cache en mémoire des templates de prompt et de leur version compilée.
+
+    Les templates compilés sont indexés par (id, updated_at) : une
+    modification produit une nouvelle entrée. Les templates eux-mêmes sont
+    conservés PROMPT_TEMPLATE_CACHE_TTL secondes, pour que l'évaluation n'ait
+    pas à interroger la base à chaque soumission ; l'enregistrement ou la
+    suppression d'un template vide le cache du processus (voir
+    ai_engine.signals), les autres processus le voient à l'expiration.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self, template):
+        """Retourner la version compilée d'un template."""
+        key = (template.pk, template.updated_at)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            compiled = CompiledTemplate(template)
+            with self._lock:
+                # Une seule version par template : l'ancienne est remplacée
+                for old_key in [k for k in self._compiled if k[0] == template.pk]:
+                    del self._compiled[old_key]
+                self._compiled[key] = compiled
+        return compiled
+
+    async def aget_template(self, prompt_template_id=None, task_type='evaluation'):
+        """
+        Retourner un template par son id, ou le template par défaut d'un type de tâche.
+
+        Si l'id est inconnu, le template par défaut est utilisé, comme auparavant.
+
+        Returns:
+            AIPromptTemplate ou None
+        """
+        from .models import AIPromptTemplate
+
+        key = ('id', prompt_template_id) if prompt_template_id else ('default', task_type)
+        ttl = getattr(settings, 'PROMPT_TEMPLATE_CACHE_TTL', 300)
+        cached = self._templates.get(key)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        template = None
+        if prompt_template_id:
+            template = await AIPromptTemplate.objects.filter(id=prompt_template_id).afirst()
+        if template is None:
+            template = await AIPromptTemplate.objects.filter(task_type=task_type).afirst()
+
+        with self._lock:
+            self._templates[key] = (time.monotonic(), template)
+        return template
+
+    def invalidate(self, template_id=None):
+        """Vider le cache (tout, ou les entrées d'un template)."""
+        with self._lock:
+            if template_id is None:
+                self._compiled.clear()
+            else:
+                for key in [k for k in self._compiled if k[0] == template_id]:
+                    del self._compiled[key]
+            # Le template par défaut d'un type de tâche peut avoir changé
+            self._templates.clear()
+
+
+prompt_template_cache = PromptTemplateCache()
@@ -0,0 +1,192 @@
+import re
+import json
+
+# Schéma JSON imposé à la réponse du modèle (paramètre `format` d'Ollama) :
+# la génération est contrainte, les réponses illisibles deviennent rares.
+FEEDBACK_TYPES = ('positive', 'improvement', 'error', 'suggestion')
+
+EVALUATION_RESPONSE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'score': {'type': 'number', 'minimum': 0},
+        'feedback': {'type': 'string'},
+        'strengths': {'type': 'array', 'items': {'type': 'string'}},
+        'weaknesses': {'type': 'array', 'items': {'type': 'string'}},
+        'detailed_feedback': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'content': {'type': 'string'},
+                    'type': {'type': 'string', 'enum': list(FEEDBACK_TYPES)},
+                },
+                'required': ['title', 'content', 'type'],
+            },
+        },
+    },
+    'required': ['score', 'feedback', 'strengths', 'weaknesses', 'detailed_feedback'],
+}
+
+# Motifs de la lecture de secours d'une réponse texte, compilés une seule fois.
+# Le commentaire s'arrête à une ligne vide ou à une ligne commençant par une
+# majuscule (titre de section suivant) : ce terminateur reste sensible à la casse.
+SCORE_PATTERN = re.compile(
+    r'(?:score|note|grade)\s*:?\s*(\d+(?:[.,]\d+)?)\s*(?:/\s*(\d+(?:[.,]\d+)?))?',
+    re.IGNORECASE,
+)
+FEEDBACK_PATTERN = re.compile(
+    r'(?:feedback|commentaire général|remarques générales)\s*:?\s*(.*?)(?:\n\n|(?-i:\n[A-Z])|$)',
+    re.IGNORECASE | re.DOTALL,
+)
+NUMBER_PATTERN = re.compile(r'\d+(?:[.,]\d+)?')
+
+
+class ParsedResponse:
+    """Résultat de la lecture d'une réponse du modèle."""
+
+    def __init__(self, data, fallback=False):
+        self.data = data
+        # True si la réponse n'était pas un JSON conforme au schéma
+        self.fallback = fallback
+
+
+def _to_number(value):
+    """Convertir une note ("15", "15,5", "15/20"...) en nombre, ou None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.search(value)
+        if match:
+            return float(match.group(0).replace(',', '.'))
+    return None
+
+
+def _string_list(value):
+    if not isinstance(value, list):
+        return []
+    return [str(item) for item in value if isinstance(item, (str, int, float)) and str(item).strip()]
+
+
+def _feedback_items(value):
+    if not isinstance(value, list):
+        return []
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            feedback_type = item.get('type')
+            items.append({
+                'title': str(item.get('title') or 'Commentaire'),
+                'content': str(item.get('content') or ''),
+                'type': feedback_type if feedback_type in FEEDBACK_TYPES else 'suggestion',
+            })
+        elif isinstance(item, str) and item.strip():
+            items.append({'title': 'Commentaire', 'content': item, 'type': 'suggestion'})
+    return items
+
+
+def validate_evaluation(data):
+    """
+    Vérifier et normaliser un résultat décodé du JSON de la réponse.
+
+    Les variantes courantes (`grade`, `general_comment`, note en texte) sont
+    acceptées et ramenées au format du schéma.
+
+    Returns:
+        tuple: (résultat normalisé ou None sans note exploitable, conformité stricte au schéma)
+    """
+    if not isinstance(data, dict):
+        return None, False
+
+    score = _to_number(data.get('score', data.get('grade')))
+    if score is None or score < 0:
+        return None, False
+
+    feedback = data.get('feedback', data.get('general_comment'))
+    conforming = (
+        isinstance(data.get('score'), (int, float)) and not isinstance(data.get('score'), bool)
+        and isinstance(data.get('feedback'), str)
+    )
+
+    result = dict(data)
+    result.pop('grade', None)
+    result.pop('general_comment', None)
+    result.update({
+        'score': score,
+        'feedback': feedback if isinstance(feedback, str) else '',
+        'strengths': _string_list(data.get('strengths')),
+        'weaknesses': _string_list(data.get('weaknesses')),
+        'detailed_feedback': _feedback_items(data.get('detailed_feedback')),
+    })
+    return result, conforming
+
+
+def extract_points(text):
+    """Extraire la note d'une réponse texte telle qu'écrite ("Score: 4/10" donne 4), ou None."""
+    match = SCORE_PATTERN.search(text)
+    if not match:
+        return None
+    return float(match.group(1).replace(',', '.'))
+
+
+def extract_score(text):
+    """Extraire la note d'une réponse texte ("Score: 15/20", "Note : 15"), ramenée sur 20."""
+    match = SCORE_PATTERN.search(text)
+    if not match:
+        return None
+    score = float(match.group(1).replace(',', '.'))
+    scale = float(match.group(2).replace(',', '.')) if match.group(2) else None
+    if scale:
+        return score / scale * 20
+    # Sans barème explicite, une note supérieure à 20 est un pourcentage
+    return score / 100 * 20 if score > 20 else score
+
+
+def extract_feedback(text):
+    """Extraire le commentaire général d'une réponse texte (sinon, son premier paragraphe)."""
+    match = FEEDBACK_PATTERN.search(text)
+    if match:
+        return match.group(1).strip()
+    return text.split('\n\n', 1)[0].strip()
+
+
+def parse_evaluation_response(text):
+    """
+    Lire la réponse générée par le modèle, en une passe.
+
+    Une réponse JSON est validée (voir validate_evaluation) ; sinon, la note
+    et le commentaire sont cherchés dans le texte. La note lue dans le texte
+    est ramenée sur 20 ; `points` garde la valeur écrite par le modèle
+    (points d'une partie, voir AIEvaluationService.merge_chunk_results).
+
+    Args:
+        text: Texte généré par le modèle
+
+    Returns:
+        ParsedResponse: Résultat au format du schéma
+
+    Raises:
+        ValueError: Aucune note trouvée dans la réponse
+    """
+    data = None
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    if data is not None:
+        result, conforming = validate_evaluation(data)
+        if result is not None:
+            return ParsedResponse(result, fallback=not conforming)
+
+    score = extract_score(text)
+    if score is None:
+        raise ValueError("Aucune note trouvée dans la réponse du modèle")
+    return ParsedResponse({
+        'score': score,
+        'points': extract_points(text),
+        'feedback': extract_feedback(text),
+        'details': text,
+    }, fallback=True)
@@ -0,0 +1,95 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+from django.utils import timezone
+from submissions.models import Submission
+
+
+def effective_priority():
+    """
+    Expression de la priorité effective d'une soumission en attente.
+
+    Une soumission d'un exercice dont l'échéance tombe dans les
+    EVALUATION_DEADLINE_WINDOW prochaines heures passe dans la classe
+    "échéance proche", sauf si elle est déjà plus prioritaire.
+    """
+    now = timezone.now()
+    window = timedelta(hours=getattr(settings, 'EVALUATION_DEADLINE_WINDOW', 48))
+    return Case(
+        When(
+            priority__gt=Submission.PRIORITY_DEADLINE,
+            exercise__deadline__gte=now,
+            exercise__deadline__lte=now + window,
+            then=Value(Submission.PRIORITY_DEADLINE),
+        ),
+        default='priority',
+        output_field=IntegerField(),
+    )
+
+
+def in_flight_counts():
+    """
+    Compter les soumissions en cours d'évaluation, par professeur et par exercice.
+
+    Returns:
+        tuple: (Counter par auteur d'exercice, Counter par exercice)
+    """
+    by_teacher, by_exercise = Counter(), Counter()
+    rows = (
+        Submission.objects.filter(status='processing')
+        .values('exercise_id', 'exercise__author_id')
+        .annotate(count=Count('id'))
+    )
+    for row in rows:
+        by_teacher[row['exercise__author_id']] += row['count']
+        by_exercise[row['exercise_id']] += row['count']
+    return by_teacher, by_exercise
+
+
+def fair_share(candidates, limit, by_teacher=None, by_exercise=None):
+    """
+    Choisir les soumissions à évaluer : priorité d'abord, puis partage équitable.
+
+    À priorité égale, la soumission retenue est celle du professeur, puis de
+    l'exercice, qui a le moins d'évaluations en cours (celles déjà réservées
+    par les workers et celles choisies dans cet appel) ; à égalité, la plus
+    ancienne. Un gros lot ne peut donc pas occuper tout le pool de workers
+    tant que d'autres exercices attendent.
+
+    Args:
+        candidates: Dicts (id, effective_priority, exercise_id, teacher_id, submitted_at),
+            triés par priorité puis date de soumission
+        limit: Nombre de soumissions à retenir
+        by_teacher: Évaluations en cours par professeur (Counter, modifié)
+        by_exercise: Évaluations en cours par exercice (Counter, modifié)
+
+    Returns:
+        list: IDs des soumissions retenues, dans l'ordre de traitement
+    """
+    by_teacher = by_teacher if by_teacher is not None else Counter()
+    by_exercise = by_exercise if by_exercise is not None else Counter()
+
+    # Une file par exercice, dans l'ordre (priorité, date) des candidats
+    queues = {}
+    for candidate in candidates:
+        queues.setdefault(candidate['exercise_id'], []).append(candidate)
+    positions = dict.fromkeys(queues, 0)
+
+    chosen = []
+    while len(chosen) < limit and queues:
+        exercise_id = min(queues, key=lambda key: (
+            queues[key][positions[key]]['effective_priority'],
+            by_teacher[queues[key][positions[key]]['teacher_id']],
+            by_exercise[key],
+            queues[key][positions[key]]['submitted_at'],
+        ))
+        candidate = queues[exercise_id][positions[exercise_id]]
+        chosen.append(candidate['id'])
+        by_teacher[candidate['teacher_id']] += 1
+        by_exercise[exercise_id] += 1
+
+        positions[exercise_id] += 1
+        if positions[exercise_id] == len(queues[exercise_id]):
+            del queues[exercise_id]
+    return chosen
@@ -1,29 +1,248 @@
 import json
 import time
+import asyncio
+import random
+import hashlib
 import logging
+import weakref
+import threading
+from contextlib import asynccontextmanager
 import httpx
 from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
 from django.utils import timezone
 from asgiref.sync import sync_to_async
-from .models import AIModel, AIPromptTemplate, AIEvaluationJob
+from .models import AIModel, AIEvaluationJob
+from .clients import get_client, ollama_api_url
+from .prompts import (
+    CHUNK_HEADER, MIN_CHUNK_TOKENS, TRUNCATION_MARKER, compact_text, estimate_tokens,
+    prompt_template_cache, split_into_chunks, trim_variables,
+)
+from .responses import EVALUATION_RESPONSE_SCHEMA, ParsedResponse, parse_evaluation_response
+from .balancer import load_balancer, BackendSaturatedError
+from . import events, metrics
+from .extraction import ensure_extracted_text_in_thread
 
 logger = logging.getLogger(__name__)
 
 
+class EvaluationResultCache:
+    """
+    Cache des résultats d'évaluation, adressé par le contenu de la requête.
+    
+    La clé est une empreinte SHA-256 du prompt formaté, du modèle et de ses
+    paramètres de génération : deux requêtes identiques (même soumission
+    renvoyée, nouvelle correction sans changement...) réutilisent le résultat
+    déjà parsé sans appeler le LLM. L'expiration (TTL) et la taille maximale
+    sont celles du cache Django configuré (voir CACHES['ai_evaluations']).
+    """
+    
+    KEY_PREFIX = 'ai_evaluation'
+    
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'AI_EVALUATION_CACHE_ALIAS', 'ai_evaluations')
+    
+    @property
+    def backend(self):
+        return caches[self.alias]
+    
+    @classmethod
+    def make_key(cls, prompt, model_id, temperature, max_tokens):
+        """Calculer la clé de cache d'une requête."""
+        digest = hashlib.sha256()
+        for part in (prompt, model_id, repr(float(temperature)), str(int(max_tokens))):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\x00')
+        return digest.hexdigest()
+    
+    async def aget(self, key):
+        """Retourner le résultat en cache ou None."""
+        try:
+            return await self.backend.aget(f"{self.KEY_PREFIX}:{key}")
+        except Exception as e:
+            logger.warning(f"Lecture du cache d'évaluation impossible: {str(e)}")
+            return None
+    
+    async def aset(self, key, result):
+        """Enregistrer un résultat parsé dans le cache."""
+        try:
+            await self.backend.aset(f"{self.KEY_PREFIX}:{key}", result)
+        except Exception as e:
+            logger.warning(f"Écriture dans le cache d'évaluation impossible: {str(e)}")
+
+
+class ResponseParseError(Exception):
+    """La réponse du modèle n'a pas pu être interprétée."""
+
+
+def retry_delay(attempt):
+    """
+    Délai avant une nouvelle tentative : exponentiel, avec une part aléatoire.
+    
+    La moitié du délai est fixe et l'autre tirée au hasard, pour que les
+    évaluations échouées en même temps ne réessaient pas toutes ensemble.
+    
+    Args:
+        attempt: Numéro de la tentative qui vient d'échouer (à partir de 1)
+        
+    Returns:
+        float: Délai en secondes
+    """
+    base = getattr(settings, 'AI_EVALUATION_RETRY_BASE_DELAY', 2)
+    maximum = getattr(settings, 'AI_EVALUATION_RETRY_MAX_DELAY', 60)
+    delay = min(maximum, base * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limite de concurrence adaptative (AIMD) pour un endpoint Ollama.
+    
+    La limite augmente d'environ une requête par « aller-retour » tant que
+    les réponses arrivent sans erreur et sous le seuil de latence (additive
+    increase), et elle est divisée quand le backend sature : dépassement de
+    délai, erreur réseau, HTTP 429/5xx ou latence excessive
+    (multiplicative decrease). Les requêtes au-delà de la limite attendent
+    une place ; si aucune ne se libère à temps, BackendSaturatedError est
+    levée et la soumission est remise en attente au lieu d'échouer.
+    """
+    
+    def __init__(self, endpoint_url):
+        self.endpoint_url = endpoint_url
+        self.max_limit = getattr(settings, 'OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT', 8)
+        self.min_limit = getattr(settings, 'OLLAMA_LIMITER_MIN_CONCURRENCY', 1)
+        self.limit = float(min(
+            max(getattr(settings, 'OLLAMA_LIMITER_INITIAL_CONCURRENCY', 2), self.min_limit),
+            self.max_limit
+        ))
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+    
+    @property
+    def available(self):
+        """Nombre de requêtes pouvant partir immédiatement."""
+        return max(int(self.limit) - self.in_flight, 0)
+    
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Attendre une place, exécuter la requête puis ajuster la limite.
+        
+        Le bloc signale la latence observée via `outcome['latency']` ; une
+        exception réseau ou HTTP 429/5xx est comptée comme une saturation.
+        """
+        timeout = getattr(settings, 'OLLAMA_LIMITER_QUEUE_TIMEOUT', 30)
+        async with self._condition:
+            try:
+                await asyncio.wait_for(
+                    self._condition.wait_for(lambda: self.in_flight < int(self.limit)),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                raise BackendSaturatedError(
+                    f"Endpoint {self.endpoint_url} saturé ({self.in_flight}/{int(self.limit)} requêtes en cours)"
+                )
+            self.in_flight += 1
+        
+        started_at = time.monotonic()
+        outcome = {'latency': None}
+        overloaded = False
+        try:
+            yield outcome
+        except (httpx.TimeoutException, httpx.NetworkError):
+            overloaded = True
+            raise
+        except httpx.HTTPStatusError as e:
+            overloaded = e.response.status_code == 429 or e.response.status_code >= 500
+            raise
+        finally:
+            latency = outcome['latency'] if outcome['latency'] is not None else time.monotonic() - started_at
+            async with self._condition:
+                self.in_flight -= 1
+                self._adjust(started_at, latency, overloaded)
+                self._condition.notify_all()
+    
+    def _adjust(self, started_at, latency, overloaded):
+        """Ajuster la limite après une requête."""
+        if overloaded or latency > getattr(settings, 'OLLAMA_LIMITER_LATENCY_THRESHOLD', 60):
+            # Une seule réduction par vague : les requêtes parties avant la
+            # dernière réduction ont déjà été prises en compte
+            if started_at >= self._last_decrease:
+                previous = self.limit
+                self.limit = max(self.min_limit, self.limit * getattr(settings, 'OLLAMA_LIMITER_BACKOFF_RATIO', 0.5))
+                self._last_decrease = time.monotonic()
+                logger.warning(
+                    f"Endpoint {self.endpoint_url} saturé (latence: {latency:.1f}s), "
+                    f"concurrence réduite de {previous:.1f} à {self.limit:.1f}."
+                )
+        elif self.limit < self.max_limit:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+class ConcurrencyLimiterRegistry:
+    """Limiteurs adaptatifs par endpoint, indexés par boucle asyncio comme les clients httpx."""
+    
+    def __init__(self):
+        self._limiters = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+    
+    def get(self, endpoint_url):
+        """Retourner le limiteur d'un endpoint sur la boucle courante."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            limiters = self._limiters.setdefault(loop, {})
+            limiter = limiters.get(endpoint_url)
+            if limiter is None:
+                limiter = limiters[endpoint_url] = AdaptiveConcurrencyLimiter(endpoint_url)
+        return limiter
+    
+    def available_capacity(self):
+        """
+        Places libres sur les endpoints utilisés par la boucle courante.
+        
+        Returns:
+            int: Nombre de requêtes pouvant partir, ou None si aucun endpoint
+            n'a encore été utilisé (capacité inconnue)
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            limiters = list(self._limiters.get(loop, {}).values())
+        if not limiters:
+            return None
+        return sum(limiter.available for limiter in limiters)
+
+
+concurrency_limiters = ConcurrencyLimiterRegistry()
+
+
 class AIEvaluationService:
     """Service pour gérer les évaluations via l'API Ollama/DeepSeek."""
     
-    def __init__(self, model_id=None):
-        """Initialiser le service avec un modèle spécifique ou le modèle par défaut."""
+    def __init__(self, model_id=None, stream=None):
+        """
+        Initialiser le service avec un modèle spécifique ou le modèle par défaut.
+        
+        Args:
+            model_id: ID de l'AIModel à utiliser (facultatif)
+            stream: Consommer la réponse d'Ollama en flux (défaut: OLLAMA_STREAMING)
+        """
         # Solution : utiliser un système d'initialisation différé
         self.ai_model = None
         self.model_id = model_id
+        self.stream = getattr(settings, 'OLLAMA_STREAMING', True) if stream is None else stream
+        self.result_cache = EvaluationResultCache()
         
-        # Exécuter l'initialisation de manière synchrone si nous ne sommes pas dans un contexte async
+        # Dans une boucle asyncio, l'ORM synchrone est interdit : le modèle
+        # sera chargé par _ainitialize_model au premier appel.
         try:
-            self._initialize_model()
-        except Exception as e:
-            logger.error(f"Erreur d'initialisation du modèle: {str(e)}")
+            asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                self._initialize_model()
+            except Exception as e:
+                logger.error(f"Erreur d'initialisation du modèle: {str(e)}")
     
     def _initialize_model(self):
         """Initialiser le modèle de manière synchrone."""
@@ -39,75 +258,464 @@ class AIEvaluationService:
         if not self.ai_model:
             raise ValueError("Aucun modèle d'IA actif n'est disponible")
     
-    async def evaluate_submission(self, submission, prompt_template_id=None):
+    async def _ainitialize_model(self):
+        """Initialiser le modèle avec l'ORM asynchrone."""
+        active_models = AIModel.objects.filter(is_active=True)
+        self.ai_model = None
+        if self.model_id:
+            self.ai_model = await active_models.filter(id=self.model_id).afirst()
+        if self.ai_model is None:
+            # Utiliser le modèle par défaut
+            self.ai_model = await active_models.afirst()
+        
+        if not self.ai_model:
+            raise ValueError("Aucun modèle d'IA actif n'est disponible")
+    
+    async def load_exercise_context(self, exercise, prompt_template_id=None):
+        """
+        Charger les données partagées par toutes les soumissions d'un exercice.
+        
+        Utilisé pour l'évaluation en lot : l'exercice, sa correction principale
+        et le template de prompt ne sont chargés qu'une seule fois.
+        
+        Args:
+            exercise: Instance du modèle Exercise
+            prompt_template_id: ID du template de prompt à utiliser (facultatif)
+            
+        Returns:
+            dict: Exercice, correction (ou None) et template de prompt (ou None)
+        """
+        # Récupérer le template de prompt approprié (ou celui d'évaluation par défaut), depuis le cache
+        prompt_template = await prompt_template_cache.aget_template(prompt_template_id)
+        
+        # Récupérer la correction si disponible
+        correction = (
+            await exercise.corrections.filter(is_primary=True).afirst()
+            or await exercise.corrections.afirst()
+        )
+        
+        # Extraire le texte des PDF si l'extraction en arrière-plan n'est pas terminée
+        await self._aensure_text(exercise, 'file_content_text')
+        if correction:
+            await self._aensure_text(correction, 'text_content')
+        
+        return {
+            'exercise': exercise,
+            'correction': correction,
+            'prompt_template': prompt_template,
+        }
+    
+    async def evaluate_submission(self, submission, prompt_template_id=None, force_refresh=False, context=None,
+                                  timings=None):
         """
         Évaluer une soumission en utilisant l'IA.
         
         Args:
             submission: Instance du modèle Submission
             prompt_template_id: ID du template de prompt à utiliser (facultatif)
+            force_refresh: Ignorer le cache de résultats et interroger le modèle
+            context: Données de l'exercice déjà chargées (voir load_exercise_context)
+            timings: Durées mesurées par l'appelant (queue_wait_time, db_read_time),
+                enregistrées sur le job ; le job y est ajouté sous la clé 'job'
             
         Returns:
             dict: Résultat de l'évaluation
+            
+        Raises:
+            BackendSaturatedError: Aucune place libre à temps sur l'endpoint Ollama
         """
-        # Si le modèle n'est pas initialisé, essayer de l'initialiser de manière asynchrone
+        # Si le modèle n'est pas initialisé, l'initialiser de manière asynchrone
         if self.ai_model is None:
             try:
-                await sync_to_async(self._initialize_model)()
+                await self._ainitialize_model()
             except Exception as e:
                 logger.error(f"Erreur lors de l'initialisation asynchrone du modèle: {str(e)}")
                 return None
         
-        # Utiliser sync_to_async pour les opérations de base de données
-        create_job = sync_to_async(AIEvaluationJob.objects.create)
-        get_prompt_template = sync_to_async(AIPromptTemplate.objects.get)
-        filter_prompt_template = sync_to_async(lambda: AIPromptTemplate.objects.filter(task_type='evaluation').first())
+        timings = {} if timings is None else timings
+        if context is None:
+            read_started_at = time.perf_counter()
+            context = await self.load_exercise_context(submission.exercise, prompt_template_id)
+            timings['db_read_time'] = timings.get('db_read_time', 0) + time.perf_counter() - read_started_at
+        prompt_template = context['prompt_template']
         
-        # Récupérer ou créer une tâche d'évaluation
-        evaluation_job = await create_job(
+        # Le job n'est écrit qu'au début de l'appel au modèle puis à la fin :
+        # les échecs de préparation et les résultats en cache ne coûtent
+        # qu'une seule insertion.
+        evaluation_job = AIEvaluationJob(
             submission=submission,
             model=self.ai_model,
-            status='processing'
+            prompt_template=prompt_template,
+            status='processing',
+            queue_wait_time=timings.get('queue_wait_time'),
+            db_read_time=timings.get('db_read_time'),
         )
+        timings['job'] = evaluation_job
         
-        # Récupérer le template de prompt approprié
-        prompt_template = None
-        if prompt_template_id:
-            try:
-                prompt_template = await get_prompt_template(id=prompt_template_id)
-            except AIPromptTemplate.DoesNotExist:
-                prompt_template = await filter_prompt_template()
+        if not prompt_template:
+            await self._fail_job(evaluation_job, "Aucun template de prompt disponible")
+            return None
+        
+        # Extraire le texte du PDF si l'extraction en arrière-plan n'est pas terminée
+        build_started_at = time.perf_counter()
+        await self._aensure_text(submission, 'file_content_text')
+        
+        # Préparer les variables pour le template
+        prompt_variables = self.build_prompt_variables(context, submission)
+        
+        # Formater le prompt : préfixe commun à l'exercice, puis partie propre
+        # à la soumission, découpée en plusieurs prompts si elle est trop longue
+        try:
+            prompts = self.fit_prompts(prompt_template_cache.compile(prompt_template), prompt_variables)
+        except KeyError as e:
+            await self._fail_job(evaluation_job, f"Variable manquante dans le template: {str(e)}")
+            return None
+        formatted_prompt = '\n\n'.join(prefix + suffix for prefix, suffix in prompts)
+        evaluation_job.prompt_used = formatted_prompt
+        
+        # Rechercher un résultat identique déjà calculé
+        cache_enabled = getattr(settings, 'AI_EVALUATION_CACHE_ENABLED', True)
+        evaluation_job.cache_key = EvaluationResultCache.make_key(
+            formatted_prompt,
+            self.ai_model.model_id,
+            self.ai_model.default_temperature,
+            self.ai_model.default_max_tokens,
+        )
+        evaluation_job.prompt_build_time = time.perf_counter() - build_started_at
+        if cache_enabled and not force_refresh:
+            cached_result = await self.result_cache.aget(evaluation_job.cache_key)
+            if cached_result is not None:
+                evaluation_job.status = 'completed'
+                evaluation_job.cache_hits += 1
+                evaluation_job.completed_at = timezone.now()
+                evaluation_job.processing_time = 0
+                await evaluation_job.asave()
+                metrics.record_cache_lookup(hit=True)
+                metrics.record_job(evaluation_job)
+                logger.info(f"Résultat en cache utilisé pour la soumission {submission.id}.")
+                return cached_result
+        evaluation_job.cache_misses += 1
+        if cache_enabled:
+            metrics.record_cache_lookup(hit=False)
+        
+        if len(prompts) == 1:
+            evaluation_result = await self._run_job(evaluation_job, *prompts[0])
         else:
-            # Utiliser le template d'évaluation par défaut
-            prompt_template = await filter_prompt_template()
+            evaluation_result = await self._evaluate_chunks(
+                evaluation_job, prompts, max_score=context['exercise'].total_points
+            )
         
-        if not prompt_template:
-            # Mettre à jour le job de manière asynchrone
-            await sync_to_async(self._update_job_status)(
-                evaluation_job, 'failed', "Aucun template de prompt disponible"
+        if cache_enabled and evaluation_result:
+            await self.result_cache.aset(evaluation_job.cache_key, evaluation_result)
+        return evaluation_result
+    
+    async def _run_job(self, evaluation_job, prompt_prefix, prompt_suffix):
+        """
+        Envoyer un prompt au modèle et enregistrer le job.
+        
+        Les erreurs passagères sont réessayées avec un délai exponentiel
+        aléatoire ; au-delà de AI_EVALUATION_MAX_ATTEMPTS, le job passe au
+        statut 'dead_letter' (voir la commande requeue_dead_letters).
+        
+        Args:
+            evaluation_job: Job d'évaluation (pas encore enregistré)
+            prompt_prefix: Partie du prompt commune à l'exercice
+            prompt_suffix: Partie du prompt propre à la soumission
+            
+        Returns:
+            dict: Résultat de l'évaluation, ou None en cas d'échec
+            
+        Raises:
+            BackendSaturatedError: Aucune place libre à temps sur l'endpoint Ollama
+        """
+        submission_id = evaluation_job.submission_id
+        evaluation_job.prompt_used = prompt_prefix + prompt_suffix
+        
+        # Préparer la requête pour l'API Ollama
+        request_data = self.build_request_data(prompt_prefix, prompt_suffix)
+        
+        max_attempts = max(1, getattr(settings, 'AI_EVALUATION_MAX_ATTEMPTS', 3))
+        while True:
+            evaluation_job.attempts += 1
+            try:
+                result, processing_time = await self._call_model(evaluation_job, request_data)
+                
+                # Mettre à jour le job avec les résultats et extraire les résultats formatés
+                self._set_job_result(evaluation_job, result, processing_time)
+                parse_started_at = time.perf_counter()
+                try:
+                    parsed = self._parse_ai_response(result)
+                    evaluation_job.parse_time = time.perf_counter() - parse_started_at
+                except Exception as e:
+                    await self._record_parse(evaluation_job.model, fallback=True)
+                    raise ResponseParseError(str(e)) from e
+                await self._record_parse(evaluation_job.model, parsed.fallback)
+                if parsed.fallback:
+                    logger.warning(
+                        f"Réponse non conforme au schéma pour la soumission {submission_id}, "
+                        f"lecture de secours utilisée."
+                    )
+                evaluation_result = parsed.data
+                break
+            except BackendSaturatedError as e:
+                # Aucune requête envoyée : la soumission sera remise en attente
+                logger.warning(f"Backend saturé, évaluation de la soumission {submission_id} reportée.")
+                if evaluation_job.pk:
+                    # Job déjà enregistré par une tentative précédente : ne pas le laisser 'processing'
+                    await self._fail_job(evaluation_job, f"Backend saturé: {str(e)}")
+                raise
+            except Exception as e:
+                error_message = self._describe_error(e)
+                retryable = self._is_retryable(e)
+                
+                if not retryable or evaluation_job.attempts >= max_attempts:
+                    status = 'dead_letter' if retryable else 'failed'
+                    logger.error(
+                        f"Évaluation de la soumission {submission_id} abandonnée après "
+                        f"{evaluation_job.attempts} tentative(s): {error_message}"
+                    )
+                    await self._fail_job(evaluation_job, error_message, status=status)
+                    return None
+                
+                delay = retry_delay(evaluation_job.attempts)
+                logger.warning(
+                    f"Tentative {evaluation_job.attempts}/{max_attempts} échouée pour la soumission "
+                    f"{submission_id} ({error_message}), nouvel essai dans {delay:.1f}s."
+                )
+                evaluation_job.status = 'processing'
+                evaluation_job.error_message = error_message
+                await evaluation_job.asave(update_fields=['status', 'attempts', 'error_message'])
+                await asyncio.sleep(delay)
+        
+        # Seconde écriture du job
+        evaluation_job.error_message = ''
+        await evaluation_job.asave()
+        metrics.record_job(evaluation_job)
+        return evaluation_result
+    
+    async def _evaluate_chunks(self, evaluation_job, prompts, max_score=None):
+        """
+        Évaluer en parallèle les parties d'une soumission trop longue et fusionner les résultats.
+        
+        Chaque partie a son propre job ; le premier est `evaluation_job`.
+        
+        Args:
+            evaluation_job: Job de la première partie
+            prompts: Couples (préfixe commun, suite), un par partie
+            max_score: Barème de l'exercice, plafond de la note fusionnée (facultatif)
+        
+        Returns:
+            dict: Résultat fusionné, ou None si une partie a échoué
+            
+        Raises:
+            BackendSaturatedError: Aucune place libre à temps sur l'endpoint Ollama
+        """
+        jobs = [evaluation_job] + [
+            AIEvaluationJob(
+                submission=evaluation_job.submission,
+                model=self.ai_model,
+                prompt_template=evaluation_job.prompt_template,
+                status='processing',
+                cache_key=evaluation_job.cache_key,
             )
+            for _ in prompts[1:]
+        ]
+        logger.info(
+            f"Soumission {evaluation_job.submission_id} découpée en {len(prompts)} parties "
+            f"évaluées en parallèle."
+        )
+        results = await asyncio.gather(
+            *(self._run_job(job, prefix, suffix) for job, (prefix, suffix) in zip(jobs, prompts)),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        if any(result is None for result in results):
             return None
         
-        # Mettre à jour le job de manière asynchrone
-        await sync_to_async(self._update_job_with_template)(evaluation_job, prompt_template)
+        return self.merge_chunk_results(results, max_score)
+    
+    def prompt_token_budget(self):
+        """
+        Nombre de tokens disponibles pour le prompt.
         
-        # Préparer les données pour le prompt
-        exercise = submission.exercise
-        student = submission.student
-        correction = None
+        La fenêtre de contexte du modèle, moins une marge pour l'imprécision
+        de l'estimation (PROMPT_TOKEN_SAFETY_MARGIN) et les tokens réservés à
+        la réponse.
+        """
+        margin = getattr(settings, 'PROMPT_TOKEN_SAFETY_MARGIN', 0.1)
+        budget = int(self.ai_model.context_window * (1 - margin)) - self.ai_model.default_max_tokens
+        return max(budget, MIN_CHUNK_TOKENS)
+    
+    def fit_prompts(self, compiled_template, prompt_variables):
+        """
+        Adapter le prompt à la fenêtre de contexte du modèle.
         
-        # Récupérer la correction si disponible
-        if exercise.has_corrections:
-            get_correction = sync_to_async(lambda: exercise.corrections.filter(is_primary=True).first() or exercise.corrections.first())
-            correction = await get_correction()
+        Les variables communes à l'exercice sont d'abord compactées puis
+        raccourcies pour ne pas dépasser la part PROMPT_SHARED_CONTEXT_RATIO
+        du budget (voir trim_variables). Si le prompt reste trop long, la
+        soumission est découpée en parties évaluées séparément, au plus
+        AI_EVALUATION_MAX_CHUNKS : le temps d'évaluation reste borné quelle
+        que soit la longueur de la soumission.
+        
+        Args:
+            compiled_template: Template compilé (voir PromptTemplateCache.compile)
+            prompt_variables: Variables du prompt (voir build_prompt_variables)
+            
+        Returns:
+            list: Couples (préfixe commun, suite), un par partie de la soumission
+            
+        Raises:
+            KeyError: Variable du template absente de `prompt_variables`
+        """
+        budget = self.prompt_token_budget()
+        shared_ratio = getattr(settings, 'PROMPT_SHARED_CONTEXT_RATIO', 0.5)
+        variables = trim_variables(
+            prompt_variables,
+            int((budget - compiled_template.literal_tokens) * shared_ratio),
+        )
+        
+        prefix, suffix = compiled_template.render(variables)
+        prompt_tokens = estimate_tokens(prefix) + estimate_tokens(suffix)
+        if prompt_tokens <= budget or 'submission_content' not in compiled_template.variables:
+            return [(prefix, suffix)]
+        
+        submission_content = compact_text(variables.get('submission_content') or '')
+        other_tokens = prompt_tokens - estimate_tokens(variables.get('submission_content'))
+        chunk_budget = max(budget - other_tokens - estimate_tokens(CHUNK_HEADER), MIN_CHUNK_TOKENS)
+        chunks = split_into_chunks(submission_content, chunk_budget)
+        
+        max_chunks = max(1, getattr(settings, 'AI_EVALUATION_MAX_CHUNKS', 4))
+        if len(chunks) > max_chunks:
+            logger.warning(
+                f"Soumission de {estimate_tokens(submission_content)} tokens environ : "
+                f"seules les {max_chunks} premières parties sont évaluées."
+            )
+            chunks = chunks[:max_chunks]
+            chunks[-1] += TRUNCATION_MARKER
+        
+        if len(chunks) <= 1:
+            return [compiled_template.render({**variables, 'submission_content': ''.join(chunks)})]
+        return [
+            compiled_template.render({
+                **variables,
+                'submission_content': CHUNK_HEADER.format(index=index, count=len(chunks)) + chunk,
+            })
+            for index, chunk in enumerate(chunks, start=1)
+        ]
+    
+    @staticmethod
+    def merge_chunk_results(results, max_score=None):
+        """
+        Fusionner les résultats des parties d'une soumission en un seul résultat.
+        
+        Chaque partie n'est notée que sur les questions qu'elle contient (voir
+        CHUNK_HEADER) : la note est la somme des points des parties, plafonnée
+        au barème. Les commentaires et listes de points sont mis bout à bout.
+        Pour une partie lue dans le texte, les points tels qu'écrits par le
+        modèle (`points`) sont additionnés, et non la note ramenée sur 20.
+        
+        Args:
+            results: Résultats des parties, dans l'ordre
+            max_score: Barème de l'exercice (facultatif)
+            
+        Returns:
+            dict: Résultat fusionné, au format attendu par SubmissionEvaluator
+        """
+        merged = {'strengths': [], 'weaknesses': [], 'detailed_feedback': [], 'chunks': len(results)}
+        scores = []
+        feedback = []
+        for index, result in enumerate(results, start=1):
+            if not isinstance(result, dict):
+                feedback.append(f"Partie {index}: {result}")
+                continue
+            
+            score = result.get('points')
+            if score is None:
+                score = result.get('score', result.get('grade'))
+            try:
+                scores.append(max(float(score), 0.0))
+            except (TypeError, ValueError):
+                pass
+            
+            comment = result.get('feedback') or result.get('general_comment')
+            if comment:
+                feedback.append(f"Partie {index}: {comment}")
+            for key in ('strengths', 'weaknesses', 'detailed_feedback'):
+                if isinstance(result.get(key), list):
+                    merged[key].extend(result[key])
+        
+        if scores:
+            total = sum(scores)
+            if max_score:
+                total = min(total, max_score)
+            merged['score'] = round(total, 2)
+        merged['feedback'] = '\n\n'.join(feedback)
+        return merged
+    
+    async def _call_model(self, evaluation_job, request_data):
+        """
+        Envoyer une requête au modèle, sur l'hôte Ollama le moins chargé.
+        
+        Args:
+            evaluation_job: Job d'évaluation (enregistré au début de l'appel)
+            request_data: Corps de la requête Ollama
+            
+        Returns:
+            tuple: (réponse JSON, temps de traitement en secondes)
+        """
+        evaluation_job.tokens_generated = 0
+        evaluation_job.time_to_first_token = None
+        
+        async with load_balancer.lease(self.ai_model) as endpoint, \
+                concurrency_limiters.get(endpoint.endpoint_url).slot() as outcome:
+            evaluation_job.model = endpoint
+            
+            # Enregistrer le job avec le prompt utilisé (première écriture)
+            await evaluation_job.asave()
+            start_time = time.time()
+            
+            # Client partagé : les connexions keep-alive sont réutilisées entre les évaluations
+            client = get_client(endpoint.endpoint_url)
+            url = self.request_url(endpoint, request_data)
+            if self.stream:
+                result = await self._generate_streaming(
+                    client, url, request_data, evaluation_job, start_time
+                )
+                # Le délai avant le premier token reflète l'attente côté serveur
+                outcome['latency'] = evaluation_job.time_to_first_token
+            else:
+                response = await client.post(url, json=request_data)
+                response.raise_for_status()
+                result = response.json()
+                if 'message' in result:
+                    # Réponse de /api/chat : même forme que /api/generate
+                    result['response'] = result['message'].get('content', '')
+        
+        return result, time.time() - start_time
+    
+    @staticmethod
+    def build_prompt_variables(context, submission):
+        """
+        Préparer les variables du template pour une soumission.
+        
+        Args:
+            context: Données de l'exercice (voir load_exercise_context)
+            submission: Instance du modèle Submission, avec student chargé
+            
+        Returns:
+            dict: Variables du prompt
+        """
+        exercise = context['exercise']
+        correction = context['correction']
         
-        # Préparer les variables pour le template
         prompt_variables = {
             'exercise_title': exercise.title,
             'exercise_description': exercise.description,
             'exercise_content': exercise.file_content_text,
             'submission_content': submission.file_content_text,
-            'student_name': await sync_to_async(student.get_full_name)(),
+            'student_name': submission.student.get_full_name(),
             'total_points': exercise.total_points,
         }
         
@@ -115,102 +723,170 @@ class AIEvaluationService:
         if correction:
             prompt_variables['correction_content'] = correction.text_content
         
-        # Formater le prompt
-        try:
-            formatted_prompt = prompt_template.prompt_text.format(**prompt_variables)
-        except KeyError as e:
-            await sync_to_async(self._update_job_status)(
-                evaluation_job, 'failed', f"Variable manquante dans le template: {str(e)}"
-            )
-            return None
+        return prompt_variables
+    
+    def build_request_data(self, prompt_prefix, prompt_suffix, prefix_reuse=None):
+        """
+        Construire le corps de la requête Ollama.
         
-        # Enregistrer le prompt utilisé
-        await sync_to_async(self._update_job_prompt)(evaluation_job, formatted_prompt)
+        Avec la réutilisation du préfixe, la partie commune à l'exercice est
+        envoyée comme message système de /api/chat : d'une soumission à
+        l'autre, Ollama ne réévalue que la partie propre à la soumission.
+        `keep_alive` garde le modèle (et son cache) chargé entre deux requêtes.
         
-        # Préparer la requête pour l'API Ollama
-        start_time = time.time()
+        Args:
+            prompt_prefix: Partie du prompt commune à l'exercice
+            prompt_suffix: Partie du prompt propre à la soumission
+            prefix_reuse: Forcer ou désactiver la réutilisation (défaut: OLLAMA_PREFIX_REUSE)
+            
+        Returns:
+            dict: Corps de la requête, pour /api/chat si la clé "messages" est présente
+        """
+        if prefix_reuse is None:
+            prefix_reuse = getattr(settings, 'OLLAMA_PREFIX_REUSE', True)
         
         request_data = {
             "model": self.ai_model.model_id,
-            "prompt": formatted_prompt,
-            "temperature": self.ai_model.default_temperature,
-            "max_tokens": self.ai_model.default_max_tokens,
-            "stream": False,
-            "format": "json"  # Demander une réponse formatée en JSON
+            "stream": self.stream,
+            # Réponse contrainte par le schéma JSON attendu, ou simplement en JSON
+            "format": EVALUATION_RESPONSE_SCHEMA if getattr(settings, 'OLLAMA_STRUCTURED_OUTPUT', True) else "json",
+            "keep_alive": getattr(settings, 'OLLAMA_KEEP_ALIVE', '30m'),
+            "options": {
+                "temperature": self.ai_model.default_temperature,
+                "num_predict": self.ai_model.default_max_tokens,
+                # Sans num_ctx, Ollama tronque le prompt à sa fenêtre par défaut
+                "num_ctx": self.ai_model.context_window,
+            },
         }
+        if prefix_reuse and prompt_prefix:
+            request_data["messages"] = [
+                {"role": "system", "content": prompt_prefix},
+                {"role": "user", "content": prompt_suffix},
+            ]
+        else:
+            request_data["prompt"] = prompt_prefix + prompt_suffix
+        return request_data
+    
+    @staticmethod
+    def request_url(endpoint, request_data):
+        """URL de l'API Ollama correspondant à une requête (/api/chat ou l'endpoint configuré)."""
+        if "messages" in request_data:
+            return ollama_api_url(endpoint.endpoint_url, '/api/chat')
+        return endpoint.endpoint_url
+    
+    @staticmethod
+    def _is_retryable(error):
+        """Déterminer si une erreur est passagère (réseau, surcharge, réponse illisible)."""
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return isinstance(error, (httpx.RequestError, ResponseParseError, json.JSONDecodeError))
+    
+    @staticmethod
+    def _describe_error(error):
+        """Message d'erreur enregistré sur le job."""
+        if isinstance(error, httpx.RequestError):
+            return f"Erreur de requête: {str(error)}"
+        if isinstance(error, ResponseParseError):
+            return f"Erreur de parsing: {str(error)}"
+        return f"Erreur inattendue: {str(error)}"
+    
+    def available_capacity(self):
+        """Places libres sur les endpoints Ollama (None si inconnue), pour la contre-pression."""
+        return concurrency_limiters.available_capacity()
+    
+    async def _aensure_text(self, instance, text_field):
+        """Extraire le texte du PDF d'une instance, seulement s'il manque."""
+        if getattr(instance, text_field) or not instance.file:
+            return
+        # Lecture de fichier et parsing : hors du thread partagé de l'ORM, qui
+        # resterait bloqué pendant l'extraction ; la connexion du thread est fermée
+        await sync_to_async(ensure_extracted_text_in_thread, thread_sensitive=False)(instance, text_field)
+    
+    async def _generate_streaming(self, client, endpoint_url, request_data, job, start_time):
+        """
+        Consommer le flux NDJSON d'Ollama au fil de la génération.
         
-        # Faire la requête à l'API
-        try:
-            async with httpx.AsyncClient(timeout=120) as client:
-                response = await client.post(
-                    self.ai_model.endpoint_url,
-                    json=request_data
-                )
-                response.raise_for_status()
-                result = response.json()
-        except httpx.RequestError as e:
-            # Gérer les erreurs de requête
-            await sync_to_async(self._update_job_status)(
-                evaluation_job, 'failed', f"Erreur de requête: {str(e)}"
-            )
-            logger.error(f"Erreur lors de la requête AI: {str(e)}")
-            return None
-        except Exception as e:
-            # Gérer les autres erreurs
-            await sync_to_async(self._update_job_status)(
-                evaluation_job, 'failed', f"Erreur inattendue: {str(e)}"
-            )
-            logger.error(f"Erreur inattendue: {str(e)}")
-            return None
+        Chaque ligne du flux porte un fragment de la réponse (un token) ; la
+        dernière (done=true) porte les statistiques de génération. La
+        progression est enregistrée sur le job et publiée aux pages en attente
+        au plus une fois par OLLAMA_PROGRESS_INTERVAL secondes.
         
-        # Calculer le temps de traitement
-        processing_time = time.time() - start_time
+        Returns:
+            dict: Dernier message du flux, avec la réponse complète reconstituée
+        """
+        progress_interval = getattr(settings, 'OLLAMA_PROGRESS_INTERVAL', 1.0)
+        fragments = []
+        final_message = {}
+        last_report = start_time
         
-        # Mettre à jour le job avec les résultats
-        await sync_to_async(self._update_job_result)(
-            evaluation_job, 'completed', result, processing_time
-        )
+        async with client.stream('POST', endpoint_url, json=request_data) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                
+                message = json.loads(line)
+                if message.get('error'):
+                    raise ValueError(message['error'])
+                
+                # /api/generate : 'response' ; /api/chat : 'message.content'
+                fragment = message.get('response') or message.get('message', {}).get('content', '')
+                if fragment:
+                    if not fragments:
+                        job.time_to_first_token = time.time() - start_time
+                    fragments.append(fragment)
+                    job.tokens_generated += 1
+                
+                if message.get('done'):
+                    final_message = message
+                    break
+                
+                now = time.time()
+                if now - last_report >= progress_interval or len(fragments) == 1:
+                    last_report = now
+                    await AIEvaluationJob.objects.filter(pk=job.pk).aupdate(
+                        tokens_generated=job.tokens_generated,
+                        time_to_first_token=job.time_to_first_token,
+                    )
+                    events.publish_progress(
+                        job.submission_id,
+                        tokens_generated=job.tokens_generated,
+                        max_tokens=request_data['options']['num_predict'],
+                        time_to_first_token=job.time_to_first_token,
+                        elapsed=round(now - start_time, 1),
+                    )
         
-        # Extraire et retourner les résultats formatés
-        try:
-            evaluation_result = await sync_to_async(self._parse_ai_response)(result)
-            return evaluation_result
-        except Exception as e:
-            logger.error(f"Erreur lors du parsing de la réponse AI: {str(e)}")
-            await sync_to_async(self._update_job_status)(
-                evaluation_job, 'failed', f"Erreur de parsing: {str(e)}"
-            )
-            return None
+        final_message['response'] = ''.join(fragments)
+        if final_message.get('eval_count'):
+            job.tokens_generated = final_message['eval_count']
+        return final_message
     
-    def _update_job_status(self, job, status, error_message=None):
-        """Mettre à jour le statut d'un job."""
-        job.status = status
-        if error_message:
-            job.error_message = error_message
-        job.save()
-    
-    def _update_job_with_template(self, job, template):
-        """Mettre à jour le job avec un template."""
-        job.prompt_template = template
-        job.save()
-    
-    def _update_job_prompt(self, job, prompt):
-        """Mettre à jour le prompt utilisé par un job."""
-        job.prompt_used = prompt
-        job.save()
-    
-    def _update_job_result(self, job, status, result, processing_time):
-        """Mettre à jour un job avec les résultats."""
+    async def _fail_job(self, job, error_message, status='failed'):
+        """Enregistrer un job en échec ('failed', ou 'dead_letter' après plusieurs tentatives)."""
         job.status = status
+        job.error_message = error_message
+        await job.asave()
+        metrics.record_job(job)
+    
+    def _set_job_result(self, job, result, processing_time):
+        """Renseigner un job avec les résultats (sans l'enregistrer)."""
+        job.status = 'completed'
         job.completed_at = timezone.now()
         job.processing_time = processing_time
         job.response_json = result
         
-        # Extraire les tokens utilisés si disponible
-        if 'usage' in result and 'total_tokens' in result['usage']:
-            job.token_usage = result['usage']['total_tokens']
-            
-        job.save()
+        if job.time_to_first_token is not None:
+            job.generation_time = max(processing_time - job.time_to_first_token, 0)
+        else:
+            job.generation_time = processing_time
+        
+        # Statistiques de la dernière réponse d'Ollama (durées en nanosecondes)
+        job.prompt_eval_count = result.get('prompt_eval_count')
+        job.eval_count = result.get('eval_count')
+        for field in ('load_duration', 'prompt_eval_duration', 'eval_duration'):
+            duration = result.get(field)
+            setattr(job, field, duration / 1e9 if duration is not None else None)
+        job.token_usage = (job.prompt_eval_count or 0) + (job.eval_count or 0)
     
     def _parse_ai_response(self, response):
         """
@@ -220,65 +896,23 @@ class AIEvaluationService:
             response: Réponse JSON de l'API
             
         Returns:
-            dict: Données structurées pour l'évaluation
+            ParsedResponse: Données structurées pour l'évaluation
+            
+        Raises:
+            ValueError: Réponse sans note exploitable
         """
         # Extraction de la réponse générée
         if 'response' in response:
-            try:
-                # Tenter de parser le contenu JSON dans la réponse
-                content = json.loads(response['response'])
-                return content
-            except json.JSONDecodeError:
-                # Si ce n'est pas du JSON valide, essayer d'extraire manuellement
-                text_response = response['response']
-                
-                # Chercher les sections communes dans la réponse texte
-                result = {
-                    'score': self._extract_score(text_response),
-                    'feedback': self._extract_feedback(text_response),
-                    'details': text_response,
-                }
-                return result
+            return parse_evaluation_response(response['response'])
         
         # Fallback: retourner la réponse brute
-        return response
+        return ParsedResponse(response, fallback=True)
     
-    def _extract_score(self, text):
-        """Extraire la note depuis une réponse texte."""
-        try:
-            # Chercher des patterns comme "Score: 15/20" ou "Note: 15"
-            import re
-            score_pattern = r'(?:score|note|grade)\s*:?\s*(\d+(?:[.,]\d+)?)\s*(?:\/\s*20)?'
-            match = re.search(score_pattern, text.lower())
-            if match:
-                score = float(match.group(1).replace(',', '.'))
-                # Si la note n'est pas sur 20, convertir
-                if score > 20:
-                    score = (score / 100) * 20
-                return score
-        except Exception:
-            pass
-        return 0  # Valeur par défaut
-    
-    def _extract_feedback(self, text):
-        """Extraire le feedback général depuis une réponse texte."""
-        try:
-            import re
-            # Chercher des sections comme "Feedback:" ou "Commentaire général:"
-            patterns = [
-                r'(?:feedback|commentaire général)\s*:?\s*(.*?)(?:\n\n|\n[A-Z]|$)',
-                r'(?:remarques générales)\s*:?\s*(.*?)(?:\n\n|\n[A-Z]|$)',
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, text.lower(), re.DOTALL)
-                if match:
-                    return match.group(1).strip()
-            
-            # Si pas de section spécifique, prendre les premiers paragraphes
-            paragraphs = text.split('\n\n')
-            if paragraphs:
-                return paragraphs[0].strip()
-        except Exception:
-            pass
-        return ""  # Valeur par défaut
\ No newline at end of file
+    async def _record_parse(self, ai_model, fallback):
+        """Compter, par AIModel, les réponses lues et celles passées par la lecture de secours."""
+        if ai_model is None:
+            return
+        await AIModel.objects.filter(pk=ai_model.pk).aupdate(
+            parsed_response_count=F('parsed_response_count') + 1,
+            fallback_parse_count=F('fallback_parse_count') + int(fallback),
+        )
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import AIPromptTemplate
+from .prompts import prompt_template_cache
+
+
+@receiver(post_save, sender=AIPromptTemplate)
+@receiver(post_delete, sender=AIPromptTemplate)
+def invalidate_prompt_template_cache(sender, instance, **kwargs):
+    """Vider le cache des templates de prompt après une modification."""
+    prompt_template_cache.invalidate(instance.pk)
@@ -1,3 +1,1325 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import httpx
+from asgiref.sync import async_to_sync
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from ai_engine import events, metrics
+from ai_engine.balancer import BackendSaturatedError, OllamaLoadBalancer
+from ai_engine.clients import OllamaClientPool, close_clients, get_client, ollama_api_url
+from ai_engine.evaluator import (
+    SubmissionEvaluator, claim_pending_submissions, enqueue_submission, evaluate_submission,
+    get_default_feedback_category_id, keep_claims, reclaim_expired_claims, release_submissions,
+    requeue_dead_letters, run_exercise_batch,
+)
+from ai_engine import extraction
+from ai_engine.extraction import ensure_extracted_text_in_thread, extract_text_for_file, schedule_text_extraction
+from ai_engine.admin import AIModelAdmin
+from ai_engine.metrics import DatabaseStateCollector, generate_metrics, job_timing_summary, percentile
+from ai_engine.middleware import QueryCountMiddleware
+from ai_engine.models import AIEvaluationJob, AIModel, AIPromptTemplate, ExtractedDocument
+from ai_engine.prompts import (
+    CompiledTemplate, TRUNCATION_MARKER, estimate_tokens, split_into_chunks, split_template, trim_variables,
+)
+from ai_engine.responses import extract_feedback, parse_evaluation_response
+from ai_engine.scheduler import fair_share
+from ai_engine.services import AdaptiveConcurrencyLimiter, AIEvaluationService, EvaluationResultCache
+from exercises.models import Exercise, Topic
+from submissions.models import Evaluation, FeedbackCategory, FeedbackItem, Submission
+
+User = get_user_model()
+
+EVALUATION_RESULT = {
+    'score': 14,
+    'feedback': 'Bonne requête',
+    'strengths': ['Jointure correcte'],
+    'weaknesses': [],
+    'detailed_feedback': [],
+}
+
+
+@contextmanager
+def mock_ollama(handler):
+    """Remplacer le transport HTTP des clients Ollama par `handler` (httpx.MockTransport)."""
+    def create_client(pool):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    with mock.patch.object(OllamaClientPool, '_create_client', create_client):
+        yield
+
+
+@contextmanager
+def saturated_retries():
+    """Laisser passer la première tentative de chaque job, puis signaler un backend saturé."""
+    call_model = AIEvaluationService._call_model
+
+    async def saturate_on_retry(service, evaluation_job, request_data):
+        if evaluation_job.attempts > 1:
+            raise BackendSaturatedError('Endpoint saturé')
+        return await call_model(service, evaluation_job, request_data)
+
+    with mock.patch.object(AIEvaluationService, '_call_model', saturate_on_retry):
+        yield
+
+
+def chat_response(result=EVALUATION_RESULT, status_code=200):
+    """Réponse de /api/chat (sans flux) portant `result` en JSON."""
+    return httpx.Response(status_code, json={
+        'message': {'role': 'assistant', 'content': json.dumps(result)},
+        'done': True,
+        'prompt_eval_count': 100,
+        'eval_count': 20,
+    })
+
+
+def run_async(coroutine_function, *args, **kwargs):
+    """Exécuter une coroutine puis fermer les clients httpx ouverts sur sa boucle."""
+    async def run():
+        try:
+            return await coroutine_function(*args, **kwargs)
+        finally:
+            await close_clients()
+
+    return async_to_sync(run)()
+
+
+class EvaluationFixturesMixin:
+    """Professeur, étudiant et exercice communs aux tests du moteur d'évaluation."""
+
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        self.student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        self.topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        self.exercise = self._create_exercise('exercice', self.teacher)
+        self.attempts = 0
+
+    def _create_exercise(self, slug, author, **fields):
+        return Exercise.objects.create(
+            title=slug, slug=slug, description='Requêtes SQL', author=author, topic=self.topic, **fields
+        )
+
+    def _create_submission(self, exercise=None, **fields):
+        self.attempts += 1
+        fields.setdefault('file', 'submissions/test.pdf')
+        return Submission.objects.create(
+            exercise=exercise or self.exercise,
+            student=self.student,
+            attempt_number=self.attempts,
+            **fields,
+        )
+
+
+@override_settings(EVALUATION_CLAIM_LEASE=60)
+class ClaimLeaseTests(EvaluationFixturesMixin, TestCase):
+    """Une soumission réservée par un worker disparu doit revenir dans la file."""
+
+    def test_claim_sets_lease_and_release_clears_it(self):
+        submission = self._create_submission(status='pending')
+
+        [claimed] = claim_pending_submissions(1)
+        submission.refresh_from_db()
+        self.assertEqual(claimed.id, submission.id)
+        self.assertEqual(submission.status, 'processing')
+        self.assertIsNotNone(submission.claimed_at)
+
+        release_submissions([submission.id])
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'pending')
+        self.assertIsNone(submission.claimed_at)
+
+    def test_expired_lease_returns_submission_to_queue(self):
+        now = timezone.now()
+        expired = self._create_submission(status='processing', claimed_at=now - timedelta(seconds=120))
+        legacy = self._create_submission(status='processing')
+        held = self._create_submission(status='processing', claimed_at=now)
+        job = AIEvaluationJob.objects.create(submission=expired, status='processing')
+
+        self.assertEqual(reclaim_expired_claims(), 2)
+
+        statuses = dict(Submission.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[expired.id], 'pending')
+        self.assertEqual(statuses[legacy.id], 'pending')
+        self.assertEqual(statuses[held.id], 'processing')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    @override_settings(EVALUATION_CLAIM_LEASE=0.03)
+    def test_held_claims_are_renewed(self):
+        stale = timezone.now() - timedelta(seconds=120)
+        submission = self._create_submission(status='processing', claimed_at=stale)
+
+        async def hold_for_a_while():
+            renewal = asyncio.create_task(keep_claims(lambda: [submission.id]))
+            await asyncio.sleep(0.05)
+            renewal.cancel()
+
+        async_to_sync(hold_for_a_while)()
+
+        submission.refresh_from_db()
+        self.assertGreater(submission.claimed_at, stale)
+        with self.settings(EVALUATION_CLAIM_LEASE=60):
+            self.assertEqual(reclaim_expired_claims(), 0)
+
+
+class InteractivePriorityTests(EvaluationFixturesMixin, TestCase):
+    """Une évaluation demandée pour une seule soumission passe avant les lots et les échéances."""
+
+    def test_interactive_claim_beats_bulk_and_deadline(self):
+        bulk = self._create_submission(status='pending', priority=Submission.PRIORITY_BULK)
+        urgent_exercise = self._create_exercise(
+            'echeance', self.teacher, deadline=timezone.now() + timedelta(hours=2)
+        )
+        deadline = self._create_submission(urgent_exercise, status='pending')
+        interactive = self._create_submission(status='completed')
+
+        self.assertTrue(enqueue_submission(interactive.id))
+
+        claimed = claim_pending_submissions(3)
+        self.assertEqual([s.id for s in claimed], [interactive.id, deadline.id, bulk.id])
+
+    def test_evaluate_submission_enqueues_as_interactive(self):
+        submission = self._create_submission(status='completed', priority=Submission.PRIORITY_BULK)
+
+        with mock.patch('ai_engine.evaluator._evaluate_submission_and_close') as evaluate:
+            evaluate_submission(submission.id)
+
+        evaluate.assert_called_once_with(submission.id, False)
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'pending')
+        self.assertEqual(submission.priority, Submission.PRIORITY_INTERACTIVE)
+        self.assertIsNotNone(submission.queued_at)
+
+    def test_submission_being_evaluated_is_not_enqueued(self):
+        submission = self._create_submission(status='processing', priority=Submission.PRIORITY_BULK)
+
+        with mock.patch('ai_engine.evaluator._evaluate_submission_and_close') as evaluate:
+            self.assertIsNone(evaluate_submission(submission.id))
+
+        evaluate.assert_not_called()
+        submission.refresh_from_db()
+        self.assertEqual(submission.priority, Submission.PRIORITY_BULK)
+
+
+class ExerciseBatchTests(EvaluationFixturesMixin, TransactionTestCase):
+    """Le lot d'un exercice réserve ses soumissions par places libres, comme le worker."""
+
+    def test_batch_claims_incrementally_within_exercise(self):
+        for _ in range(5):
+            self._create_submission(status='pending')
+        other = self._create_submission(self._create_exercise('autre', self.teacher), status='pending')
+        claimed_counts = []
+
+        async def fake_evaluate(evaluator, submission, force_refresh=False, context=None, timings=None):
+            claimed_counts.append(await Submission.objects.filter(status='processing').acount())
+            self.assertEqual(context, {'exercise': 'chargé'})
+            submission.status = 'completed'
+            await submission.asave(update_fields=['status'])
+            return True
+
+        with mock.patch.object(AIEvaluationService, 'load_exercise_context', return_value={'exercise': 'chargé'}), \
+                mock.patch.object(SubmissionEvaluator, 'evaluate_claimed_submission', fake_evaluate):
+            report = run_exercise_batch(self.exercise.id, concurrency=2)
+
+        self.assertEqual(report['total'], 5)
+        self.assertEqual(report['succeeded'], 5)
+        self.assertLessEqual(max(claimed_counts), 2)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'pending')
+
+
+class TextExtractionThreadTests(EvaluationFixturesMixin, TransactionTestCase):
+    """L'extraction de dernier recours, hors du thread de l'ORM, ne laisse pas de connexion ouverte."""
+
+    def test_thread_connection_is_closed(self):
+        submission = self._create_submission(status='processing')
+
+        with mock.patch('ai_engine.extraction.extract_text_for_file', return_value='SELECT 1;'), \
+                mock.patch('ai_engine.extraction.close_old_connections') as close_old_connections, \
+                ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(ensure_extracted_text_in_thread, submission, 'file_content_text').result()
+
+        # Avant (connexion périmée laissée par une tâche précédente) et après l'extraction
+        self.assertEqual(close_old_connections.call_count, 2)
+        submission.refresh_from_db()
+        self.assertEqual(submission.file_content_text, 'SELECT 1;')
+
+
+class FeedbackItemsTests(EvaluationFixturesMixin, TestCase):
+    """Éléments de feedback insérés en une requête, dans l'ordre de la réponse du modèle."""
+
+    def setUp(self):
+        super().setUp()
+        self.evaluation = Evaluation.objects.create(
+            submission=self._create_submission(status='processing'),
+            score=14, percentage=70, general_feedback='Bonne requête',
+        )
+        AIModel.objects.create(name='DeepSeek', model_id='deepseek-coder')
+        self.evaluator = SubmissionEvaluator()
+        patcher = mock.patch('ai_engine.evaluator._default_category_id', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_items_are_bulk_inserted_in_order(self):
+        FeedbackItem.objects.create(evaluation=self.evaluation, title='Ancien', content='Remplacé')
+        result = {
+            'strengths': ['Jointure correcte', 'Alias lisibles'],
+            'weaknesses': ['Index manquant'],
+            'detailed_feedback': [
+                {'title': 'Requête 2', 'content': 'GROUP BY incomplet', 'type': 'error'},
+                'Pensez à HAVING',
+            ],
+        }
+        get_default_feedback_category_id()
+
+        with CaptureQueriesContext(connection) as queries:
+            created = self.evaluator._create_feedback_items(self.evaluation, result)
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(created, 5)
+        items = list(self.evaluation.feedback_items.order_by('order').values_list('order', 'title', 'feedback_type'))
+        self.assertEqual(items, [
+            (0, 'Point fort', 'positive'),
+            (1, 'Point fort', 'positive'),
+            (2, 'Point à améliorer', 'improvement'),
+            (3, 'Requête 2', 'error'),
+            (4, 'Commentaire', 'suggestion'),
+        ])
+        self.assertEqual(
+            set(self.evaluation.feedback_items.values_list('category__name', flat=True)), {'Général'}
+        )
+
+    def test_general_feedback_when_nothing_detailed(self):
+        self.assertEqual(self.evaluator._create_feedback_items(self.evaluation, {'score': 14}), 1)
+
+        item = self.evaluation.feedback_items.get()
+        self.assertEqual((item.title, item.content), ('Évaluation globale', 'Bonne requête'))
+
+    def test_stale_cached_category_is_recreated(self):
+        stale_id = get_default_feedback_category_id()
+        FeedbackCategory.objects.filter(pk=stale_id).delete()
+
+        created = self.evaluator._create_feedback_items(self.evaluation, {'strengths': ['Jointure correcte']})
+
+        self.assertEqual(created, 1)
+        category = FeedbackCategory.objects.get(name='Général')
+        self.assertNotEqual(category.id, stale_id)
+        self.assertEqual(self.evaluation.feedback_items.get().category_id, category.id)
+        self.assertEqual(get_default_feedback_category_id(), category.id)
+
+
+class PdfExtractionTests(EvaluationFixturesMixin, TransactionTestCase):
+    """Un même PDF n'est parsé qu'une fois, y compris quand deux extractions arrivent ensemble."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+        # Parsing dans un thread du processus de test (le faux extract_pdf_text n'existe pas ailleurs)
+        pool = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(pool.shutdown)
+        for patcher in (
+            mock.patch('ai_engine.extraction._get_process_pool', return_value=pool),
+            mock.patch('ai_engine.extraction.extract_pdf_text', return_value=('SELECT 1;', 1)),
+        ):
+            self.extract_pdf_text = patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _upload(self, content=b'%PDF-1.4 identique'):
+        return self._create_submission(file=SimpleUploadedFile('copie.pdf', content)).file
+
+    def test_identical_file_is_reused_by_hash(self):
+        first, second = self._upload(), self._upload()
+        self.assertNotEqual(first.name, second.name)
+
+        self.assertEqual(extract_text_for_file(first), 'SELECT 1;')
+        self.assertEqual(extract_text_for_file(second), 'SELECT 1;')
+
+        self.assertEqual(self.extract_pdf_text.call_count, 1)
+        self.assertEqual(ExtractedDocument.objects.get().page_count, 1)
+
+        self.assertEqual(extract_text_for_file(self._upload(b'%PDF-1.4 autre')), 'SELECT 1;')
+        self.assertEqual(self.extract_pdf_text.call_count, 2)
+
+    def test_concurrent_identical_file_waits_for_the_first_extraction(self):
+        first, second = self._upload(), self._upload()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_extraction(path, max_pages=None):
+            started.set()
+            release.wait(5)
+            return 'SELECT 1;', 1
+
+        self.extract_pdf_text.side_effect = slow_extraction
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            owner = executor.submit(extract_text_for_file, first)
+            self.assertTrue(started.wait(5))
+            self.assertEqual(len(extraction._in_flight), 1)
+
+            waiter = executor.submit(extract_text_for_file, second)
+            with self.assertRaises(TimeoutError):
+                waiter.result(timeout=0.1)
+            release.set()
+
+            self.assertEqual(owner.result(timeout=5), 'SELECT 1;')
+            self.assertEqual(waiter.result(timeout=5), 'SELECT 1;')
+
+        self.assertEqual(self.extract_pdf_text.call_count, 1)
+        self.assertEqual(extraction._in_flight, {})
+
+
+class ScheduleTextExtractionTests(EvaluationFixturesMixin, TestCase):
+    """L'extraction en arrière-plan ne démarre qu'après la validation de la transaction."""
+
+    def test_extraction_starts_on_commit(self):
+        submission = self._create_submission()
+
+        with mock.patch('ai_engine.extraction._get_dispatcher') as get_dispatcher, \
+                self.captureOnCommitCallbacks(execute=True) as callbacks:
+            schedule_text_extraction(submission, 'file_content_text')
+            get_dispatcher.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        get_dispatcher.return_value.submit.assert_called_once_with(
+            extraction._extract_for_instance, 'submissions.Submission', submission.pk,
+            'file_content_text', 'file', True,
+        )
+
+    def test_instance_without_file_is_skipped(self):
+        submission = self._create_submission(file='')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            schedule_text_extraction(submission, 'file_content_text')
+
+        self.assertEqual(callbacks, [])
+
+
+class ResponseParserTests(TestCase):
+    """Lecture de la réponse du modèle, en JSON ou en texte libre."""
+
+    def test_feedback_continues_on_lowercase_line(self):
+        text = "Score: 12/20\nFeedback: Bonne requête\nmais la jointure manque\n\nDétails : ..."
+
+        self.assertEqual(extract_feedback(text), "Bonne requête\nmais la jointure manque")
+
+    def test_feedback_stops_at_next_section(self):
+        text = "Feedback: Bonne requête\nPoints forts: syntaxe correcte"
+
+        self.assertEqual(extract_feedback(text), "Bonne requête")
+
+    def test_text_fallback(self):
+        parsed = parse_evaluation_response("Note : 15\nFeedback: Bonne requête\nmais la jointure manque\n\nFin")
+
+        self.assertTrue(parsed.fallback)
+        self.assertEqual(parsed.data['score'], 15)
+        self.assertEqual(parsed.data['feedback'], "Bonne requête\nmais la jointure manque")
+
+    def test_json_response(self):
+        parsed = parse_evaluation_response(json.dumps(EVALUATION_RESULT))
+
+        self.assertFalse(parsed.fallback)
+        self.assertEqual(parsed.data['score'], 14)
+        self.assertEqual(parsed.data['strengths'], ['Jointure correcte'])
+
+    def test_json_variants_are_normalized(self):
+        parsed = parse_evaluation_response(json.dumps({'grade': '15,5/20', 'general_comment': 'Correct'}))
+
+        self.assertTrue(parsed.fallback)
+        self.assertEqual(parsed.data['score'], 15.5)
+        self.assertEqual(parsed.data['feedback'], 'Correct')
+        self.assertNotIn('grade', parsed.data)
+        self.assertEqual(parsed.data['detailed_feedback'], [])
+
+    def test_text_scores_are_brought_back_to_20(self):
+        self.assertEqual(parse_evaluation_response("Note : 7/10").data['score'], 14)
+        self.assertEqual(parse_evaluation_response("Score: 75").data['score'], 15)
+        self.assertEqual(parse_evaluation_response("Note : 7/10").data['points'], 7)
+
+    def test_response_without_score_is_rejected(self):
+        with self.assertRaises(ValueError):
+            parse_evaluation_response(json.dumps({'feedback': 'Pas de note'}))
+        with self.assertRaises(ValueError):
+            parse_evaluation_response("Réponse sans note")
+
+
+@override_settings(
+    OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT=8, OLLAMA_LIMITER_INITIAL_CONCURRENCY=4, OLLAMA_LIMITER_MIN_CONCURRENCY=1,
+    OLLAMA_LIMITER_BACKOFF_RATIO=0.5, OLLAMA_LIMITER_LATENCY_THRESHOLD=60, OLLAMA_LIMITER_QUEUE_TIMEOUT=0.05,
+)
+class AdaptiveConcurrencyLimiterTests(SimpleTestCase):
+    """Limite de concurrence AIMD d'un endpoint Ollama."""
+
+    async def _request(self, limiter, latency=1.0, status_code=None):
+        async with limiter.slot() as outcome:
+            outcome['latency'] = latency
+            if status_code:
+                request = httpx.Request('POST', limiter.endpoint_url)
+                response = httpx.Response(status_code, request=request)
+                raise httpx.HTTPStatusError('Erreur HTTP', request=request, response=response)
+
+    def _run(self, scenario):
+        limiter = None
+
+        async def run():
+            nonlocal limiter
+            limiter = AdaptiveConcurrencyLimiter('http://ollama:11434/api/generate')
+            await scenario(limiter)
+
+        async_to_sync(run)()
+        return limiter
+
+    def test_success_increases_limit_additively(self):
+        limiter = self._run(self._request)
+
+        self.assertEqual(limiter.limit, 4.25)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_overload_halves_limit_once_per_wave(self):
+        async def scenario(limiter):
+            await asyncio.gather(
+                self._request(limiter, status_code=503),
+                self._request(limiter, status_code=503),
+                return_exceptions=True,
+            )
+
+        self.assertEqual(self._run(scenario).limit, 2)
+
+    def test_slow_response_decreases_limit(self):
+        self.assertEqual(self._run(lambda limiter: self._request(limiter, latency=120)).limit, 2)
+
+    def test_client_error_does_not_decrease_limit(self):
+        async def scenario(limiter):
+            with self.assertRaises(httpx.HTTPStatusError):
+                await self._request(limiter, status_code=400)
+
+        self.assertGreater(self._run(scenario).limit, 4)
+
+    @override_settings(OLLAMA_LIMITER_INITIAL_CONCURRENCY=1)
+    def test_full_endpoint_raises_backend_saturated(self):
+        async def scenario(limiter):
+            async with limiter.slot():
+                self.assertEqual(limiter.available, 0)
+                with self.assertRaises(BackendSaturatedError):
+                    async with limiter.slot():
+                        pass
+
+        self.assertEqual(self._run(scenario).in_flight, 0)
+
+
+@override_settings(
+    OLLAMA_BALANCER_FAILURE_THRESHOLD=2, OLLAMA_BALANCER_EJECTION_TIME=30,
+    OLLAMA_BALANCER_MAX_EJECTION_TIME=300, OLLAMA_BALANCER_SLOW_FACTOR=3,
+)
+class LoadBalancerTests(TestCase):
+    """Répartition entre les hôtes Ollama, éviction et contrôle de santé."""
+
+    def setUp(self):
+        self.balancer = OllamaLoadBalancer()
+        self.first = AIModel.objects.create(
+            name='Hôte A', model_id='deepseek', endpoint_url='http://hote-a:11434/api/generate'
+        )
+        self.second = AIModel.objects.create(
+            name='Hôte B', model_id='deepseek', endpoint_url='http://hote-b:11434/api/generate'
+        )
+
+    def test_least_loaded_endpoint_is_chosen(self):
+        self.balancer.record_success(self.first, 4.0)
+        self.balancer.record_success(self.second, 1.0)
+        self.assertEqual(run_async(self.balancer.choose, self.first), self.second)
+
+        # Latence x (requêtes en cours + 1) : l'hôte rapide mais chargé cède la place
+        self.balancer._state(self.second).outstanding = 4
+        self.assertEqual(run_async(self.balancer.choose, self.first), self.first)
+
+    def test_concurrent_leases_spread_over_endpoints(self):
+        async def lease_two():
+            async with self.balancer.lease(self.first) as a, self.balancer.lease(self.first) as b:
+                return {a.pk, b.pk}
+
+        self.assertEqual(run_async(lease_two), {self.first.pk, self.second.pk})
+        self.assertEqual(self.balancer._state(self.first).outstanding, 0)
+
+    def test_failures_eject_endpoint_until_health_check_passes(self):
+        self.balancer.record_failure(self.first)
+        self.balancer.record_failure(self.first)
+        state = self.balancer._state(self.first)
+        self.assertTrue(state.is_ejected)
+        self.assertEqual(run_async(self.balancer.choose, self.first), self.second)
+
+        # Éviction expirée, hôte toujours en panne : écarté à nouveau, pour plus longtemps
+        state.ejected_until = 0.0
+        checked = []
+
+        def unhealthy(request):
+            checked.append((request.url.host, request.url.path))
+            return httpx.Response(503)
+
+        with mock_ollama(unhealthy):
+            self.assertEqual(run_async(self.balancer.choose, self.first), self.second)
+        self.assertEqual(checked, [('hote-a', '/api/tags')])
+        self.assertTrue(state.is_ejected)
+        self.assertEqual(state.ejection_count, 2)
+
+        # L'hôte répond de nouveau : il est réintégré
+        state.ejected_until = 0.0
+        with mock_ollama(lambda request: httpx.Response(200, json={'models': []})):
+            run_async(self.balancer.choose, self.first)
+        self.assertFalse(state.is_ejected)
+        self.assertEqual(state.consecutive_failures, 0)
+
+    def test_slow_endpoint_is_ejected(self):
+        for _ in range(5):
+            self.balancer.record_success(self.second, 1.0)
+        for _ in range(5):
+            self.balancer.record_success(self.first, 10.0)
+
+        self.assertTrue(self.balancer._state(self.first).is_ejected)
+        self.assertFalse(self.balancer._state(self.second).is_ejected)
+
+
+class OllamaServiceTestMixin(EvaluationFixturesMixin):
+    """Service d'évaluation branché sur un transport HTTP simulé."""
+
+    def setUp(self):
+        super().setUp()
+        self.ai_model = AIModel.objects.create(name='DeepSeek', model_id='deepseek-coder')
+        self.service = AIEvaluationService(stream=False)
+        self.requests = []
+        for patcher in (
+            mock.patch('ai_engine.services.retry_delay', return_value=0),
+            mock.patch('ai_engine.services.load_balancer', OllamaLoadBalancer()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _handler(self, responses):
+        """Transport qui enregistre les requêtes et renvoie `responses` dans l'ordre (la dernière ensuite)."""
+        responses = list(responses)
+
+        def handler(request):
+            self.requests.append(request)
+            response = responses.pop(0) if len(responses) > 1 else responses[0]
+            return response() if callable(response) else response
+
+        return handler
+
+
+@override_settings(AI_EVALUATION_MAX_ATTEMPTS=3)
+class RetryTests(OllamaServiceTestMixin, TestCase):
+    """Nouvelles tentatives, abandon (dead letter) et remise en file."""
+
+    def _run_job(self, *responses):
+        self.submission = self._create_submission(status='processing')
+        job = AIEvaluationJob(submission=self.submission, model=self.ai_model, status='processing')
+        with mock_ollama(self._handler(responses)):
+            result = run_async(self.service._run_job, job, 'Énoncé\n', 'Réponse')
+        job.refresh_from_db()
+        return job, result
+
+    def test_transient_error_is_retried(self):
+        job, result = self._run_job(httpx.Response(503), chat_response)
+
+        self.assertEqual(result['score'], 14)
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.attempts, 2)
+        self.assertEqual(job.error_message, '')
+        self.assertEqual(self.requests[0].url.path, '/api/chat')
+
+    def test_unreadable_response_is_retried(self):
+        job, result = self._run_job(chat_response({'feedback': 'Pas de note'}), chat_response)
+
+        self.assertEqual(result['score'], 14)
+        self.assertEqual(job.attempts, 2)
+
+    def test_dead_letter_after_max_attempts(self):
+        job, result = self._run_job(httpx.Response(503))
+
+        self.assertIsNone(result)
+        self.assertEqual(job.status, 'dead_letter')
+        self.assertEqual(job.attempts, 3)
+        self.assertEqual(len(self.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        job, result = self._run_job(httpx.Response(400))
+
+        self.assertIsNone(result)
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 1)
+
+    def test_saturation_on_retry_fails_the_saved_job(self):
+        self.submission = self._create_submission(status='processing')
+        job = AIEvaluationJob(submission=self.submission, model=self.ai_model, status='processing')
+
+        with mock_ollama(self._handler([httpx.Response(503)])), saturated_retries(), \
+                self.assertRaises(BackendSaturatedError):
+            run_async(self.service._run_job, job, 'Énoncé\n', 'Réponse')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+        self.assertIn('saturé', job.error_message)
+
+    def test_requeue_dead_letters(self):
+        job, _ = self._run_job(httpx.Response(503))
+        Submission.objects.filter(pk=self.submission.pk).update(status='error')
+        other = self._create_submission(self._create_exercise('autre', self.teacher), status='error')
+        AIEvaluationJob.objects.create(submission=other, status='dead_letter')
+
+        self.assertEqual(requeue_dead_letters(exercise_id=self.exercise.id), 1)
+        self.submission.refresh_from_db()
+        job.refresh_from_db()
+        self.assertEqual(self.submission.status, 'pending')
+        self.assertIsNotNone(self.submission.queued_at)
+        self.assertIsNotNone(job.requeued_at)
+        self.assertEqual(requeue_dead_letters(exercise_id=self.exercise.id), 0)
+
+        self.assertEqual(requeue_dead_letters(), 1)
+        other.refresh_from_db()
+        self.assertEqual(other.status, 'pending')
+
+
+class StreamingTests(OllamaServiceTestMixin, TestCase):
+    """Lecture du flux NDJSON d'Ollama et suivi de la progression de la génération."""
+
+    def setUp(self):
+        super().setUp()
+        self.service = AIEvaluationService(stream=True)
+        self.submission = self._create_submission(status='processing')
+        self.job = AIEvaluationJob(submission=self.submission, model=self.ai_model, status='processing')
+
+    def _stream(self, *messages):
+        """Réponse NDJSON de /api/chat : une ligne par message."""
+        body = ''.join(json.dumps(message) + '\n' for message in messages)
+        return httpx.Response(200, content=body.encode(), headers={'Content-Type': 'application/x-ndjson'})
+
+    def _run_job(self, response):
+        with mock_ollama(self._handler([response])), \
+                mock.patch('ai_engine.events.publish_progress') as publish_progress:
+            result = run_async(self.service._run_job, self.job, 'Énoncé\n', 'Réponse')
+        self.job.refresh_from_db()
+        return result, publish_progress
+
+    def test_fragments_are_reassembled_and_progress_is_recorded(self):
+        content = json.dumps(EVALUATION_RESULT)
+        fragments = [content[:10], content[10:30], content[30:]]
+        response = self._stream(
+            *({'message': {'role': 'assistant', 'content': fragment}, 'done': False} for fragment in fragments),
+            {'message': {'role': 'assistant', 'content': ''}, 'done': True, 'eval_count': 42},
+        )
+
+        result, publish_progress = self._run_job(response)
+
+        self.assertEqual(result['score'], 14)
+        self.assertTrue(json.loads(self.requests[0].content)['stream'])
+        self.assertEqual(self.job.status, 'completed')
+        self.assertEqual(self.job.tokens_generated, 42)
+        self.assertIsNotNone(self.job.time_to_first_token)
+        self.assertGreaterEqual(self.job.time_to_first_token, 0)
+        # Progression publiée dès le premier token
+        progress = publish_progress.call_args_list[0]
+        self.assertEqual(progress.args, (self.submission.id,))
+        self.assertEqual(progress.kwargs['tokens_generated'], 1)
+        self.assertEqual(progress.kwargs['max_tokens'], self.ai_model.default_max_tokens)
+
+    def test_token_count_without_final_statistics(self):
+        content = json.dumps(EVALUATION_RESULT)
+        response = self._stream(
+            {'message': {'content': content[:20]}, 'done': False},
+            {'message': {'content': content[20:]}, 'done': False},
+            {'done': True},
+        )
+
+        result, _ = self._run_job(response)
+
+        self.assertEqual(result['score'], 14)
+        self.assertEqual(self.job.tokens_generated, 2)
+
+    def test_error_line_fails_the_job(self):
+        result, _ = self._run_job(self._stream({'error': 'model not found'}))
+
+        self.assertIsNone(result)
+        self.assertEqual(self.job.status, 'failed')
+        self.assertIn('model not found', self.job.error_message)
+
+
+class ResultCacheTests(OllamaServiceTestMixin, TestCase):
+    """Cache des résultats adressé par le contenu de la requête."""
+
+    def setUp(self):
+        super().setUp()
+        caches['ai_evaluations'].clear()
+        AIPromptTemplate.objects.create(
+            name='Évaluation', prompt_text="Exercice : {exercise_title}\nRéponse :\n{submission_content}"
+        )
+
+    def _evaluate(self, content, **kwargs):
+        submission = self._create_submission(status='processing', file_content_text=content)
+        with mock_ollama(self._handler([chat_response])):
+            return run_async(self.service.evaluate_submission, submission, **kwargs)
+
+    def test_key_depends_on_prompt_model_and_parameters(self):
+        key = EvaluationResultCache.make_key('prompt', 'deepseek', 0.7, 2048)
+
+        self.assertEqual(key, EvaluationResultCache.make_key('prompt', 'deepseek', 0.7, 2048))
+        for variant in (
+            ('prompt ', 'deepseek', 0.7, 2048),
+            ('prompt', 'llama', 0.7, 2048),
+            ('prompt', 'deepseek', 0.2, 2048),
+            ('prompt', 'deepseek', 0.7, 1024),
+        ):
+            self.assertNotEqual(key, EvaluationResultCache.make_key(*variant))
+
+    def test_identical_request_is_served_from_cache(self):
+        first = self._evaluate('SELECT * FROM etudiants;')
+        second = self._evaluate('SELECT * FROM etudiants;')
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.requests), 1)
+        cached_job = AIEvaluationJob.objects.get(cache_hits=1)
+        self.assertEqual(cached_job.status, 'completed')
+        self.assertEqual(cached_job.cache_key, AIEvaluationJob.objects.get(cache_misses=1).cache_key)
+
+    def test_different_content_or_forced_refresh_calls_the_model(self):
+        self._evaluate('SELECT * FROM etudiants;')
+        self._evaluate('SELECT nom FROM etudiants;')
+        self._evaluate('SELECT * FROM etudiants;', force_refresh=True)
+
+        self.assertEqual(len(self.requests), 3)
+
+
+@override_settings(PROMPT_CHARS_PER_TOKEN=4, PROMPT_TOKEN_SAFETY_MARGIN=0.1, AI_EVALUATION_MAX_CHUNKS=4)
+class ChunkedEvaluationTests(OllamaServiceTestMixin, TestCase):
+    """Une soumission trop longue est notée par parties, dont les points s'additionnent."""
+
+    def setUp(self):
+        super().setUp()
+        caches['ai_evaluations'].clear()
+        AIPromptTemplate.objects.create(
+            name='Évaluation', prompt_text="Exercice : {exercise_title}\nRéponse :\n{submission_content}"
+        )
+
+    def test_chunk_points_are_summed(self):
+        merged = AIEvaluationService.merge_chunk_results([
+            {'score': 6, 'feedback': 'Q1 juste', 'strengths': ['Q1']},
+            {'score': 4.5, 'feedback': 'Q3 incomplète', 'weaknesses': ['Q3']},
+        ], max_score=20)
+
+        self.assertEqual(merged['score'], 10.5)
+        self.assertEqual(merged['strengths'], ['Q1'])
+        self.assertEqual(merged['weaknesses'], ['Q3'])
+        self.assertEqual(merged['feedback'], "Partie 1: Q1 juste\n\nPartie 2: Q3 incomplète")
+
+    def test_merged_score_is_capped_at_total_points(self):
+        merged = AIEvaluationService.merge_chunk_results([{'score': 15}, {'score': 12}], max_score=20)
+
+        self.assertEqual(merged['score'], 20)
+
+    def test_text_parts_are_summed_as_written(self):
+        parts = [parse_evaluation_response(text).data for text in ("Score: 4/10\nBien", "Score: 3/10\nMoyen")]
+
+        self.assertEqual(AIEvaluationService.merge_chunk_results(parts, max_score=10)['score'], 7)
+
+    def test_text_answers_keep_their_points_on_the_exercise_scale(self):
+        exercise = self._create_exercise('sur-dix', self.teacher, total_points=10)
+        content = '\n\n'.join(f"Q{index} " + 'z' * 1000 for index in range(40))
+        submission = self._create_submission(exercise, status='processing', file_content_text=content)
+        text_answer = httpx.Response(200, json={
+            'message': {'role': 'assistant', 'content': "Score: 2/10\nCommentaire: requête correcte"},
+            'done': True,
+        })
+        with mock_ollama(self._handler([text_answer])):
+            result = run_async(self.service.evaluate_submission, submission)
+
+        self.assertGreater(len(self.requests), 1)
+        self.assertEqual(result['score'], 2 * len(self.requests))
+
+    def test_long_submission_score_is_the_sum_of_its_parts(self):
+        content = '\n\n'.join(f"Q{index} " + 'z' * 1000 for index in range(40))
+        submission = self._create_submission(status='processing', file_content_text=content)
+        with mock_ollama(self._handler([lambda: chat_response({**EVALUATION_RESULT, 'score': 4})])):
+            result = run_async(self.service.evaluate_submission, submission)
+
+        self.assertGreater(len(self.requests), 1)
+        self.assertEqual(result['chunks'], len(self.requests))
+        self.assertEqual(result['score'], 4 * len(self.requests))
+        self.assertIn("somme des points", json.loads(self.requests[0].content)['messages'][1]['content'])
+
+    def test_saturation_on_retry_leaves_no_chunk_job_processing(self):
+        content = '\n\n'.join(f"Q{index} " + 'z' * 1000 for index in range(40))
+        submission = self._create_submission(status='processing', file_content_text=content)
+
+        with mock_ollama(self._handler([httpx.Response(503)])), saturated_retries(), \
+                self.assertRaises(BackendSaturatedError):
+            run_async(self.service.evaluate_submission, submission)
+
+        jobs = AIEvaluationJob.objects.filter(submission=submission)
+        self.assertGreater(jobs.count(), 1)
+        self.assertFalse(jobs.filter(status='processing').exists())
+
+
+@override_settings(
+    PROMPT_CHARS_PER_TOKEN=4, PROMPT_TOKEN_SAFETY_MARGIN=0.1,
+    PROMPT_SHARED_CONTEXT_RATIO=0.5, AI_EVALUATION_MAX_CHUNKS=4,
+)
+class PromptFittingTests(TestCase):
+    """Découpage du template, raccourcissement des variables et découpage des soumissions."""
+
+    TEMPLATE = (
+        "Exercice : {exercise_title}\n{exercise_content}\nCorrection : {correction_content}\n"
+        "Étudiant : {student_name}\n{submission_content}\nNote sur {total_points}."
+    )
+
+    def _variables(self, submission_content):
+        return {
+            'exercise_title': 'Jointures', 'exercise_content': 'Énoncé', 'correction_content': 'SELECT 1;',
+            'student_name': 'Ana', 'submission_content': submission_content, 'total_points': 20,
+        }
+
+    def _fit(self, submission_content):
+        AIModel.objects.create(name='Petit', model_id='petit', context_window=2048, default_max_tokens=512)
+        service = AIEvaluationService()
+        compiled = CompiledTemplate(AIPromptTemplate(prompt_text=self.TEMPLATE))
+        return service, service.fit_prompts(compiled, self._variables(submission_content))
+
+    def test_template_is_split_before_submission_variables(self):
+        prefix, suffix = split_template(self.TEMPLATE)
+
+        self.assertTrue(prefix.endswith("Étudiant : "))
+        self.assertTrue(suffix.startswith("{student_name}\n{submission_content}"))
+
+    def test_template_variables_are_validated_by_clean(self):
+        template = AIPromptTemplate(name='Évaluation', prompt_text="{submission_content} {inconnue}")
+
+        with self.assertRaises(ValidationError) as raised:
+            template.clean()
+        self.assertIn('prompt_text', raised.exception.message_dict)
+
+        template.prompt_text = "{submission_content}"
+        template.clean()
+
+    def test_trim_shortens_least_useful_variable_first(self):
+        variables = {'exercise_content': 'e' * 4000, 'exercise_description': 'd' * 400, 'correction_content': 'c' * 400}
+        trimmed = trim_variables(variables, 500)
+
+        self.assertTrue(trimmed['exercise_content'].endswith(TRUNCATION_MARKER))
+        self.assertEqual(trimmed['exercise_description'], variables['exercise_description'])
+        self.assertEqual(trimmed['correction_content'], variables['correction_content'])
+        self.assertLessEqual(sum(estimate_tokens(value) for value in trimmed.values()), 500)
+        self.assertEqual(len(variables['exercise_content']), 4000)
+
+    def test_chunks_break_between_paragraphs(self):
+        paragraphs = [f"Question {index}\n" + 'x' * 300 for index in range(10)]
+        chunks = split_into_chunks('\n\n'.join(paragraphs), 200)
+
+        self.assertEqual(len(chunks), 5)
+        self.assertTrue(all(len(chunk) <= 800 for chunk in chunks))
+        self.assertTrue(all(chunk.startswith('Question') for chunk in chunks))
+        self.assertEqual('\n\n'.join(chunks), '\n\n'.join(paragraphs))
+
+    def test_chunks_cut_overlong_lines(self):
+        chunks = split_into_chunks('y' * 2000, 100)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [400] * 5)
+
+    def test_short_submission_gives_one_prompt(self):
+        _, prompts = self._fit('SELECT * FROM etudiants;')
+
+        self.assertEqual(len(prompts), 1)
+        self.assertIn('SELECT * FROM etudiants;', prompts[0][1])
+
+    def test_long_submission_is_split_into_chunks(self):
+        paragraphs = [f"Q{index} " + 'z' * 500 for index in range(20)]
+        service, prompts = self._fit('\n\n'.join(paragraphs))
+
+        self.assertGreater(len(prompts), 1)
+        self.assertEqual(len({prefix for prefix, _ in prompts}), 1)
+        budget = service.prompt_token_budget()
+        for index, (prefix, suffix) in enumerate(prompts, start=1):
+            self.assertLessEqual(estimate_tokens(prefix) + estimate_tokens(suffix), budget)
+            self.assertIn(f"[Partie {index}/{len(prompts)}", suffix)
+        for index in range(20):
+            self.assertEqual(sum(f"Q{index} " in suffix for _, suffix in prompts), 1)
+
+    @override_settings(AI_EVALUATION_MAX_CHUNKS=2)
+    def test_chunk_count_is_bounded(self):
+        paragraphs = [f"Q{index} " + 'z' * 500 for index in range(40)]
+        _, prompts = self._fit('\n\n'.join(paragraphs))
+
+        self.assertEqual(len(prompts), 2)
+        self.assertIn(TRUNCATION_MARKER, prompts[-1][1])
+
+
+class FairShareTests(SimpleTestCase):
+    """Choix des soumissions à réserver : priorité, puis partage entre professeurs et exercices."""
+
+    def _candidate(self, submission_id, exercise_id, teacher_id, priority=Submission.PRIORITY_NORMAL):
+        return {
+            'id': submission_id, 'exercise_id': exercise_id, 'teacher_id': teacher_id,
+            'effective_priority': priority, 'submitted_at': datetime(2024, 1, 1, 8, submission_id),
+        }
+
+    def test_priority_comes_first(self):
+        candidates = [
+            self._candidate(9, exercise_id=2, teacher_id=2, priority=Submission.PRIORITY_INTERACTIVE),
+            self._candidate(1, exercise_id=1, teacher_id=1),
+        ]
+
+        self.assertEqual(fair_share(candidates, 1), [9])
+
+    def test_exercises_share_slots(self):
+        candidates = [self._candidate(index, 1, 1) for index in range(1, 5)]
+        candidates += [self._candidate(index, 2, 2) for index in (5, 6)]
+
+        self.assertEqual(fair_share(candidates, 4), [1, 5, 2, 6])
+
+    def test_in_flight_evaluations_are_counted(self):
+        candidates = [self._candidate(index, 1, 1) for index in range(1, 5)]
+        candidates += [self._candidate(index, 2, 2) for index in (5, 6)]
+        by_teacher = Counter({1: 3})
+
+        self.assertEqual(fair_share(candidates, 3, by_teacher, Counter()), [5, 6, 1])
+        self.assertEqual(by_teacher, Counter({1: 4, 2: 2}))
+
+
+class QueryCountMiddlewareTests(TestCase):
+    """Requêtes SQL comptées par vue, dans la chaîne synchrone comme asynchrone."""
+
+    def test_sync_chain(self):
+        def view(request):
+            list(Submission.objects.all())
+            return HttpResponse()
+
+        middleware = QueryCountMiddleware(view)
+        with mock.patch('ai_engine.middleware.record_view_queries') as record:
+            middleware(RequestFactory().get('/'))
+
+        self.assertFalse(middleware.async_mode)
+        view_name, count, _ = record.call_args.args
+        self.assertEqual((view_name, count), ('non_resolue', 1))
+
+    def test_async_chain(self):
+        async def view(request):
+            await Submission.objects.acount()
+            await Submission.objects.filter(status='pending').aexists()
+            return HttpResponse()
+
+        middleware = QueryCountMiddleware(view)
+        with mock.patch('ai_engine.middleware.record_view_queries') as record:
+            response = async_to_sync(middleware)(AsyncRequestFactory().get('/'))
+
+        self.assertTrue(middleware.async_mode)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(record.call_args.args[1], 2)
+        # Le compteur est retiré de la connexion après la requête
+        self.assertEqual(connection.execute_wrappers, [])
+
+
+class MetricsViewTests(EvaluationFixturesMixin, TestCase):
+    """Accès à /metrics et texte d'exposition Prometheus."""
+
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('metrics')
+        self.staff = User.objects.create_user(email='admin@example.com', password='secret', is_staff=True)
+
+    @override_settings(METRICS_TOKEN='jeton')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer jeton').status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+        # Un membre de l'équipe sans jeton est refusé
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_staff_only_without_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_missing_prometheus_client(self):
+        self.client.force_login(self.staff)
+        with mock.patch('ai_engine.views.prometheus_client', None):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_exposition_content(self):
+        self._create_submission(status='pending')
+        self._create_submission(status='pending')
+        dead = self._create_submission(status='error')
+        AIEvaluationJob.objects.create(submission=dead, status='dead_letter')
+        self.client.force_login(self.staff)
+
+        response = self.client.get(self.url)
+
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        content = response.content.decode()
+        self.assertIn('smartdb_submissions{status="pending"} 2.0', content)
+        self.assertIn('smartdb_submissions{status="processing"} 0.0', content)
+        self.assertIn('smartdb_evaluation_dead_letters 1.0', content)
+        self.assertIn('smartdb_evaluation_jobs', content)
+
+    def test_database_state_collector(self):
+        self._create_submission(status='completed')
+        job = AIEvaluationJob.objects.create(
+            submission=self._create_submission(status='error'), status='dead_letter'
+        )
+
+        families = {family.name: family for family in DatabaseStateCollector().collect()}
+
+        samples = {sample.labels['status']: sample.value for sample in families['smartdb_submissions'].samples}
+        self.assertEqual(samples, {'pending': 0, 'processing': 0, 'completed': 1, 'error': 1})
+        self.assertEqual(families['smartdb_evaluation_dead_letters'].samples[0].value, 1)
+
+        job.requeued_at = timezone.now()
+        job.save(update_fields=['requeued_at'])
+        content, content_type = generate_metrics()
+        self.assertIn(b'smartdb_evaluation_dead_letters 0.0', content)
+        self.assertIn('text/plain', content_type)
+
+
+@override_settings(EVALUATION_EVENT_POLL_INTERVAL=0.01)
+class DatabasePollingBrokerTests(EvaluationFixturesMixin, TestCase):
+    """Changements faits par un worker d'un autre processus, relus en base pour les pages en attente."""
+
+    def setUp(self):
+        super().setUp()
+        self.broker = events.DatabasePollingBroker()
+        self.submission = self._create_submission(status='pending')
+
+    async def test_status_changes_are_published_once(self):
+        async with self.broker.subscribe(self.submission.id) as subscription:
+            self.assertEqual(await subscription.get(timeout=1), events.status_event('pending'))
+
+            await Submission.objects.filter(pk=self.submission.pk).aupdate(status='completed')
+            self.assertEqual(await subscription.get(timeout=1), events.status_event('completed'))
+
+            # Statut inchangé : rien de plus n'est publié
+            with self.assertRaises(asyncio.TimeoutError):
+                await subscription.get(timeout=0.05)
+
+    async def test_progress_of_processing_jobs(self):
+        await Submission.objects.filter(pk=self.submission.pk).aupdate(status='processing')
+        await AIEvaluationJob.objects.acreate(submission=self.submission, status='processing', tokens_generated=0)
+        await AIEvaluationJob.objects.acreate(
+            submission=self.submission, status='processing', tokens_generated=40, time_to_first_token=0.5,
+        )
+
+        async with self.broker.subscribe(self.submission.id) as subscription:
+            self.assertEqual(await subscription.get(timeout=1), events.status_event('processing'))
+            progress = await subscription.get(timeout=1)
+
+        self.assertEqual(progress['type'], 'progress')
+        self.assertEqual(progress['data']['tokens_generated'], 40)
+        self.assertEqual(progress['data']['time_to_first_token'], 0.5)
+
+    async def test_poller_stops_without_subscribers(self):
+        async with self.broker.subscribe(self.submission.id) as subscription:
+            await subscription.get(timeout=1)
+            [poller] = self.broker._pollers.values()
+
+        await asyncio.wait_for(poller, timeout=1)
+        self.assertTrue(poller.done())
+        self.assertEqual(self.broker._last_status, {})
+
+    def test_worker_process_does_not_accumulate_statuses(self):
+        self.broker.publish(self.submission.id, events.status_event('processing'))
+
+        self.assertEqual(self.broker._last_status, {})
+
+
+class PercentileTests(SimpleTestCase):
+    """Percentiles par interpolation linéaire entre les rangs."""
+
+    def test_interpolation(self):
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4], 0), 1)
+        self.assertEqual(percentile([1, 2, 3, 4], 100), 4)
+        self.assertAlmostEqual(percentile(list(range(11)), 95), 9.5)
+        self.assertEqual(percentile([7], 99), 7)
+
+    def test_no_values(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertIsNone(percentile(None, 50))
+
+
+class JobTimingTests(OllamaServiceTestMixin, TestCase):
+    """Temps par étape enregistrés sur les jobs et résumés par modèle."""
+
+    def _job(self, model=None, status='completed', **timings):
+        return AIEvaluationJob.objects.create(
+            submission=self._create_submission(status='completed'),
+            model=model or self.ai_model, status=status, **timings,
+        )
+
+    def test_summary_of_completed_jobs(self):
+        for seconds in (1, 2, 3, 4, 5):
+            self._job(processing_time=seconds, parse_time=0.01)
+        self._job()
+        self._job(status='failed', processing_time=100)
+        self._job(AIModel.objects.create(name='Autre', model_id='llama3'), processing_time=100)
+
+        summary = {line['field']: line for line in job_timing_summary(self.ai_model)}
+
+        self.assertEqual(list(summary), [field for field, _ in metrics.JOB_TIMING_FIELDS])
+        processing = summary['processing_time']
+        self.assertEqual(processing['count'], 5)
+        self.assertEqual(processing['p50'], 3)
+        self.assertAlmostEqual(processing['p95'], 4.8)
+        self.assertAlmostEqual(processing['p99'], 4.96)
+        self.assertEqual(summary['parse_time']['count'], 5)
+        self.assertEqual(summary['load_duration'], {
+            'field': 'load_duration', 'label': "Ollama : chargement du modèle",
+            'count': 0, 'p50': None, 'p95': None, 'p99': None,
+        })
+
+    def test_summary_uses_the_latest_jobs(self):
+        now = timezone.now()
+        for age, seconds in enumerate((1, 1, 10, 10)):
+            job = self._job(processing_time=seconds)
+            AIEvaluationJob.objects.filter(pk=job.pk).update(created_at=now - timedelta(minutes=age))
+
+        summary = {line['field']: line for line in job_timing_summary(self.ai_model, sample_size=2)}
+
+        self.assertEqual(summary['processing_time']['count'], 2)
+        self.assertEqual(summary['processing_time']['p99'], 1)
+
+    def test_admin_timing_summary(self):
+        self._job(processing_time=2.5, parse_time=0.004)
+        model_admin = AIModelAdmin(AIModel, admin.site)
+
+        html = model_admin.timing_summary(self.ai_model)
+
+        self.assertIn('<td>Appel au modèle (total)</td><td>1</td><td>2.50 s</td>', html)
+        self.assertIn('<td>Lecture de la réponse</td><td>1</td><td>4 ms</td>', html)
+        self.assertIn('<td>Premier token</td><td>0</td><td>-</td>', html)
+        self.assertEqual(model_admin.timing_summary(AIModel(name='Nouveau')), '-')
+
+    def test_stage_timings_are_recorded_on_the_job(self):
+        AIPromptTemplate.objects.create(
+            name='Évaluation', prompt_text="Exercice : {exercise_title}\nRéponse :\n{submission_content}"
+        )
+        submission = self._create_submission(status='processing', file_content_text='SELECT 1;')
+        Submission.objects.filter(pk=submission.pk).update(queued_at=timezone.now() - timedelta(seconds=30))
+        # Comme une soumission réservée par le worker : exercice et étudiant chargés
+        submission = Submission.objects.select_related('exercise', 'student').get(pk=submission.pk)
+        evaluator = SubmissionEvaluator()
+        evaluator.ai_service = self.service
+        response = chat_response()
+        response_json = {
+            **json.loads(response.content),
+            'load_duration': 5_000_000, 'prompt_eval_duration': 200_000_000, 'eval_duration': 1_500_000_000,
+        }
+
+        with mock_ollama(self._handler([httpx.Response(200, json=response_json)])), \
+                self.settings(AI_EVALUATION_CACHE_ENABLED=False):
+            evaluation = run_async(evaluator.evaluate_claimed_submission, submission)
+
+        self.assertIsNotNone(evaluation)
+        job = AIEvaluationJob.objects.get(submission=submission)
+        self.assertGreaterEqual(job.queue_wait_time, 30)
+        for field in ('prompt_build_time', 'processing_time', 'generation_time', 'parse_time', 'db_write_time'):
+            self.assertIsNotNone(getattr(job, field), field)
+        self.assertEqual(job.generation_time, job.processing_time)
+        self.assertAlmostEqual(job.load_duration, 0.005)
+        self.assertAlmostEqual(job.prompt_eval_duration, 0.2)
+        self.assertAlmostEqual(job.eval_duration, 1.5)
+        self.assertEqual(job.token_usage, 120)
+
+
+class OllamaClientPoolTests(SimpleTestCase):
+    """Un client httpx (et ses connexions keep-alive) par boucle asyncio et par endpoint."""
+
+    FIRST = 'http://ollama-1:11434/api/generate'
+    SECOND = 'http://ollama-2:11434/api/generate'
+
+    def setUp(self):
+        self.pool = OllamaClientPool()
+
+    def test_client_is_reused_per_loop_and_endpoint(self):
+        async def clients():
+            first = self.pool.get_client(self.FIRST)
+            try:
+                return first, self.pool.get_client(self.FIRST), self.pool.get_client(self.SECOND)
+            finally:
+                await self.pool.aclose()
+
+        first, again, second = asyncio.run(clients())
+        self.assertIs(again, first)
+        self.assertIsNot(second, first)
+
+        # Les clients httpx sont liés à leur boucle : une autre boucle a les siens
+        other_loop, _, _ = asyncio.run(clients())
+        self.assertIsNot(other_loop, first)
+
+    def test_aclose_closes_clients_of_the_current_loop(self):
+        async def open_then_close():
+            clients = [self.pool.get_client(self.FIRST), self.pool.get_client(self.SECOND)]
+            await self.pool.aclose()
+            # Un client fermé est remplacé à la demande suivante
+            replacement = self.pool.get_client(self.FIRST)
+            await self.pool.aclose()
+            return clients, replacement
+
+        clients, replacement = asyncio.run(open_then_close())
+
+        self.assertTrue(all(client.is_closed for client in clients))
+        self.assertNotIn(replacement, clients)
+        self.assertEqual(len(self.pool._clients), 0)
+
+    def test_closed_client_is_replaced(self):
+        async def replace():
+            client = self.pool.get_client(self.FIRST)
+            await client.aclose()
+            try:
+                return client, self.pool.get_client(self.FIRST)
+            finally:
+                await self.pool.aclose()
+
+        closed, replacement = asyncio.run(replace())
+
+        self.assertTrue(closed.is_closed)
+        self.assertIsNot(replacement, closed)
+
+    def test_close_clients_closes_the_global_pool(self):
+        async def use_global_pool():
+            client = get_client(self.FIRST)
+            await close_clients()
+            return client
+
+        self.assertTrue(asyncio.run(use_global_pool()).is_closed)
+
+    def test_api_url_of_the_same_server(self):
+        self.assertEqual(ollama_api_url(self.FIRST, '/api/chat'), 'http://ollama-1:11434/api/chat')
@@ -1,3 +1,25 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from .metrics import prometheus_client, generate_metrics
 
-# Create your views here.
+
+def metrics_view(request):
+    """
+    Exposer les métriques du système d'évaluation au format Prometheus.
+
+    Accès avec l'en-tête "Authorization: Bearer <METRICS_TOKEN>" ou, si
+    aucun jeton n'est configuré, réservé aux membres de l'équipe (is_staff).
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponseForbidden("Jeton d'accès aux métriques invalide.")
+    elif not request.user.is_staff:
+        return HttpResponseForbidden("Accès réservé.")
+
+    if prometheus_client is None:
+        return HttpResponse("prometheus_client n'est pas installé.", status=501, content_type='text/plain')
+
+    content, content_type = generate_metrics()
+    return HttpResponse(content, content_type=content_type)
@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import signal
+import time
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from .clients import close_clients
+from .evaluator import (
+    SubmissionEvaluator, claim_pending_submissions, keep_claims, reclaim_expired_claims, release_submissions,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationWorker:
+    """
+    Worker longue durée qui évalue les soumissions en attente.
+
+    Le worker garde une seule boucle asyncio ouverte, réserve les soumissions
+    par lots (SELECT ... FOR UPDATE SKIP LOCKED) et en évalue au plus
+    `concurrency` en même temps. Plusieurs processus peuvent tourner en
+    parallèle : le débit augmente avec le nombre de workers.
+
+    Chaque soumission réservée porte un bail (claimed_at) que le worker
+    renouvelle tant qu'il la détient ; à chaque passage, les soumissions dont
+    le bail a expiré (worker tué sans pouvoir les libérer) repassent en attente.
+
+    Avec `exercise_id`, le worker ne réserve que les soumissions de cet
+    exercice (évaluation en lot, voir run_exercise_batch), toujours dans
+    l'ordre du planificateur et par places libres.
+    """
+
+    def __init__(self, concurrency=None, batch_size=None, poll_interval=None,
+                 exercise_id=None, force_refresh=False, context=None):
+        """
+        Initialiser le worker avec les paramètres ou les valeurs des settings.
+
+        Args:
+            exercise_id: Ne réserver que les soumissions de cet exercice (facultatif)
+            force_refresh: Ignorer le cache de résultats
+            context: Données de l'exercice déjà chargées, partagées par toutes
+                les évaluations (seulement avec exercise_id)
+        """
+        self.concurrency = max(1, concurrency or getattr(settings, 'EVALUATION_WORKER_CONCURRENCY', 4))
+        self.batch_size = max(1, batch_size or getattr(settings, 'EVALUATION_WORKER_BATCH_SIZE', self.concurrency))
+        self.poll_interval = poll_interval or getattr(settings, 'EVALUATION_WORKER_POLL_INTERVAL', 5)
+        self.exercise_id = exercise_id
+        self.force_refresh = force_refresh
+        self.context = context
+
+        self.evaluator = SubmissionEvaluator()
+        self.processed_count = 0
+        self.success_count = 0
+        self._tasks = {}
+        self._stopping = None
+        self._last_reclaim = None
+
+    def stop(self):
+        """Demander l'arrêt du worker après les évaluations en cours."""
+        if self._stopping is not None and not self._stopping.is_set():
+            logger.info("Arrêt du worker demandé, fin des évaluations en cours...")
+            self._stopping.set()
+
+    async def run(self, once=False):
+        """
+        Boucle principale du worker.
+
+        Args:
+            once: Si True, s'arrêter dès qu'il n'y a plus de soumission en attente
+
+        Returns:
+            int: Nombre de soumissions évaluées avec succès
+        """
+        self._stopping = asyncio.Event()
+        self._install_signal_handlers()
+        started_at = time.monotonic()
+        renewal = asyncio.create_task(keep_claims(self._tasks.values))
+
+        logger.info(
+            f"Worker d'évaluation démarré (concurrence: {self.concurrency}, "
+            f"lot: {self.batch_size}, intervalle: {self.poll_interval}s)."
+        )
+
+        try:
+            while not self._stopping.is_set():
+                await self._reclaim_expired()
+                claimed = await self._claim()
+
+                if once and not claimed and not self._tasks:
+                    break
+
+                if self._tasks:
+                    # Attendre qu'une place se libère (worker ou backend) avant de réserver à nouveau
+                    await asyncio.wait(
+                        self._tasks.keys(),
+                        timeout=self.poll_interval,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                else:
+                    await self._sleep()
+
+            if self._tasks:
+                await asyncio.wait(self._tasks.keys())
+        finally:
+            renewal.cancel()
+            await self._release_unfinished()
+            await close_clients()
+
+        elapsed = time.monotonic() - started_at
+        logger.info(
+            f"Worker arrêté: {self.success_count}/{self.processed_count} soumissions "
+            f"évaluées avec succès en {elapsed:.1f}s."
+        )
+        return self.success_count
+
+    async def _reclaim_expired(self):
+        """Reprendre les soumissions au bail expiré (au plus une fois par intervalle de scrutation)."""
+        now = time.monotonic()
+        if self._last_reclaim is not None and now - self._last_reclaim < self.poll_interval:
+            return
+        self._last_reclaim = now
+        try:
+            await sync_to_async(reclaim_expired_claims)()
+        except Exception as e:
+            logger.exception(f"Erreur lors de la reprise des soumissions au bail expiré: {str(e)}")
+
+    async def _claim(self):
+        """Réserver autant de soumissions que de places libres."""
+        free_slots = min(self.batch_size, self.concurrency - len(self._tasks))
+        
+        # Contre-pression : ne pas réserver plus que ce que les endpoints Ollama
+        # peuvent absorber, les soumissions restent disponibles pour les autres workers
+        capacity = self.evaluator.ai_service.available_capacity()
+        if capacity is not None:
+            free_slots = min(free_slots, capacity)
+        if free_slots <= 0:
+            return []
+
+        try:
+            submissions = await sync_to_async(claim_pending_submissions)(free_slots, exercise_id=self.exercise_id)
+        except Exception as e:
+            logger.exception(f"Erreur lors de la réservation des soumissions: {str(e)}")
+            return []
+
+        for submission in submissions:
+            task = asyncio.create_task(self._evaluate(submission))
+            self._tasks[task] = submission.id
+            task.add_done_callback(self._tasks.pop)
+
+        return submissions
+
+    async def _evaluate(self, submission):
+        """Évaluer une soumission réservée et mettre à jour les compteurs."""
+        result = await self.evaluator.evaluate_claimed_submission(
+            submission, force_refresh=self.force_refresh, context=self.context
+        )
+        if submission.status == 'pending':
+            # Remise en attente par contre-pression : elle sera réservée à nouveau
+            return result
+        self.processed_count += 1
+        if result:
+            self.success_count += 1
+        return result
+
+    async def _sleep(self):
+        """Attendre l'intervalle de scrutation, interrompu par un arrêt."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _release_unfinished(self):
+        """Remettre en attente les soumissions dont l'évaluation a été interrompue."""
+        tasks = list(self._tasks)
+        submission_ids = list(self._tasks.values())
+        if not tasks:
+            return
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        released = await sync_to_async(release_submissions)(submission_ids)
+        logger.warning(f"{released} soumission(s) interrompue(s) remise(s) en attente.")
+
+    def _install_signal_handlers(self):
+        """Arrêter proprement le worker sur SIGINT/SIGTERM."""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows ou boucle hors du thread principal
+                pass
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from dashboard.statistics import rebuild_statistics
+
+
+class Command(BaseCommand):
+    help = "Recalcule les statistiques matérialisées des exercices et des professeurs."
+
+    def handle(self, *args, **options):
+        result = rebuild_statistics()
+        self.stdout.write(self.style.SUCCESS(
+            f"Statistiques reconstruites: {result['exercises']} exercice(s), "
+            f"{result['teachers']} professeur(s), {result['days']} jour(s) d'activité."
+        ))
@@ -0,0 +1,75 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('exercises', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExerciseStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('evaluation_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+                ('percentage_sum', models.FloatField(default=0.0)),
+                ('min_score', models.FloatField(blank=True, null=True)),
+                ('max_score', models.FloatField(blank=True, null=True)),
+                ('range_0_20', models.PositiveIntegerField(default=0)),
+                ('range_20_40', models.PositiveIntegerField(default=0)),
+                ('range_40_60', models.PositiveIntegerField(default=0)),
+                ('range_60_80', models.PositiveIntegerField(default=0)),
+                ('range_80_100', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='exercises.exercise')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TeacherStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('evaluation_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0.0)),
+                ('percentage_sum', models.FloatField(default=0.0)),
+                ('min_score', models.FloatField(blank=True, null=True)),
+                ('max_score', models.FloatField(blank=True, null=True)),
+                ('range_0_20', models.PositiveIntegerField(default=0)),
+                ('range_20_40', models.PositiveIntegerField(default=0)),
+                ('range_40_60', models.PositiveIntegerField(default=0)),
+                ('range_60_80', models.PositiveIntegerField(default=0)),
+                ('range_80_100', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('submission_count', models.PositiveIntegerField(default=0)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_activity', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('teacher', 'day')},
+            },
+        ),
+    ]
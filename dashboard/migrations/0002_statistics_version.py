@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exercisestatistics',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incrémenté à chaque modification (ETag des réponses en cache)'),
+        ),
+        migrations.AddField(
+            model_name='teacherstatistics',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incrémenté à chaque modification (ETag des réponses en cache)'),
+        ),
+    ]
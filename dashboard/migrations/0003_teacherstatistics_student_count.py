@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:24
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_student_count(apps, schema_editor):
+    TeacherStatistics = apps.get_model('dashboard', 'TeacherStatistics')
+    Submission = apps.get_model('submissions', 'Submission')
+    counts = Submission.objects.values('exercise__author_id').annotate(
+        students=Count('student', distinct=True)
+    ).order_by()
+    for row in counts:
+        TeacherStatistics.objects.filter(teacher_id=row['exercise__author_id']).update(student_count=row['students'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_statistics_version'),
+        ('submissions', '0005_submission_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teacherstatistics',
+            name='student_count',
+            field=models.PositiveIntegerField(default=0, help_text="Nombre d'étudiants distincts ayant soumis au moins une fois"),
+        ),
+        migrations.RunPython(fill_student_count, migrations.RunPython.noop),
+    ]
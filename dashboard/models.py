@@ -1,3 +1,118 @@
 from django.db import models
+from django.conf import settings
 
-# Create your models here.
+
+# Tranches de pourcentage utilisées pour la distribution des notes
+SCORE_RANGES = ('0-20%', '20-40%', '40-60%', '60-80%', '80-100%')
+SCORE_RANGE_FIELDS = ('range_0_20', 'range_20_40', 'range_40_60', 'range_60_80', 'range_80_100')
+
+
+def score_range_field(percentage):
+    """Retourner le champ de tranche correspondant à un pourcentage."""
+    index = min(max(int(percentage // 20), 0), len(SCORE_RANGE_FIELDS) - 1)
+    return SCORE_RANGE_FIELDS[index]
+
+
+class EvaluationStatistics(models.Model):
+    """
+    Statistiques d'évaluation pré-agrégées.
+
+    Mises à jour de manière incrémentale à chaque création, révision ou
+    suppression d'évaluation (voir dashboard.statistics), pour que les
+    tableaux de bord lisent une seule ligne au lieu de parcourir toutes les
+    évaluations.
+    """
+
+    submission_count = models.PositiveIntegerField(default=0)
+    evaluation_count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0.0)
+    percentage_sum = models.FloatField(default=0.0)
+    min_score = models.FloatField(null=True, blank=True)
+    max_score = models.FloatField(null=True, blank=True)
+
+    # Distribution des notes par tranche de pourcentage
+    range_0_20 = models.PositiveIntegerField(default=0)
+    range_20_40 = models.PositiveIntegerField(default=0)
+    range_40_60 = models.PositiveIntegerField(default=0)
+    range_60_80 = models.PositiveIntegerField(default=0)
+    range_80_100 = models.PositiveIntegerField(default=0)
+
+    # Métadonnées
+    version = models.PositiveIntegerField(
+        default=0,
+        help_text="Incrémenté à chaque modification (ETag des réponses en cache)"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def avg_score(self):
+        if not self.evaluation_count:
+            return None
+        return self.score_sum / self.evaluation_count
+
+    @property
+    def avg_percentage(self):
+        if not self.evaluation_count:
+            return None
+        return self.percentage_sum / self.evaluation_count
+
+    @property
+    def score_distribution(self):
+        """Distribution des notes, au format utilisé par les graphiques."""
+        return [
+            {'range': label, 'count': getattr(self, field)}
+            for label, field in zip(SCORE_RANGES, SCORE_RANGE_FIELDS)
+            if getattr(self, field)
+        ]
+
+
+class ExerciseStatistics(EvaluationStatistics):
+    """Statistiques pré-agrégées d'un exercice."""
+
+    exercise = models.OneToOneField(
+        'exercises.Exercise',
+        on_delete=models.CASCADE,
+        related_name='statistics'
+    )
+
+    def __str__(self):
+        return f"Statistiques de l'exercice {self.exercise_id}"
+
+
+class TeacherStatistics(EvaluationStatistics):
+    """Statistiques pré-agrégées de tous les exercices d'un professeur."""
+
+    teacher = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='statistics'
+    )
+    student_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Nombre d'étudiants distincts ayant soumis au moins une fois"
+    )
+
+    def __str__(self):
+        return f"Statistiques du professeur {self.teacher_id}"
+
+
+class DailyActivity(models.Model):
+    """Nombre de soumissions reçues par jour pour les exercices d'un professeur."""
+
+    teacher = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_activity'
+    )
+    day = models.DateField()
+    submission_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Activité du {self.day} ({self.submission_count} soumissions)"
+
+    class Meta:
+        unique_together = ('teacher', 'day')
+        ordering = ['day']
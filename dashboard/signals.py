@@ -0,0 +1,82 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from exercises.models import Exercise
+from submissions.models import Submission, Evaluation
+from .statistics import apply_evaluation_change, record_submission, get_submission_owner
+
+
+def _evaluation_values(evaluation):
+    return (evaluation.score, evaluation.percentage)
+
+
+def _evaluation_owner(evaluation):
+    """Retourner (exercise_id, author_id), sans requête si la soumission est déjà chargée."""
+    if Evaluation.submission.is_cached(evaluation):
+        submission = evaluation.submission
+        if Submission.exercise.is_cached(submission):
+            return submission.exercise_id, submission.exercise.author_id
+    return get_submission_owner(evaluation.submission_id)
+
+
+def _submission_owner(submission):
+    """Retourner (exercise_id, author_id) d'une soumission."""
+    if Submission.exercise.is_cached(submission):
+        return submission.exercise_id, submission.exercise.author_id
+    author_id = Exercise.objects.filter(pk=submission.exercise_id).values_list('author_id', flat=True).first()
+    return submission.exercise_id, author_id
+
+
+@receiver(post_init, sender=Evaluation)
+def remember_evaluation_values(sender, instance, **kwargs):
+    """Mémoriser la note chargée, pour calculer la variation à l'enregistrement."""
+    # Lire __dict__ pour ne pas charger les champs différés (.only()/.defer())
+    values = (instance.__dict__.get('score'), instance.__dict__.get('percentage'))
+    instance._statistics_snapshot = values if instance.pk and None not in values else None
+
+
+@receiver(post_save, sender=Evaluation)
+def update_statistics_on_evaluation_save(sender, instance, created, raw=False, **kwargs):
+    """Répercuter une évaluation créée ou révisée sur les statistiques."""
+    if raw:
+        return
+
+    old = None if created else getattr(instance, '_statistics_snapshot', None)
+    new = _evaluation_values(instance)
+    exercise_id, teacher_id = _evaluation_owner(instance)
+    if exercise_id is not None:
+        apply_evaluation_change(exercise_id, teacher_id, old, new)
+    instance._statistics_snapshot = new
+
+
+@receiver(post_delete, sender=Evaluation)
+def update_statistics_on_evaluation_delete(sender, instance, **kwargs):
+    """Retirer une évaluation supprimée des statistiques."""
+    old = getattr(instance, '_statistics_snapshot', None) or _evaluation_values(instance)
+    exercise_id, teacher_id = get_submission_owner(instance.submission_id)
+    if exercise_id is not None:
+        apply_evaluation_change(exercise_id, teacher_id, old, None, create=False)
+
+
+@receiver(post_save, sender=Submission)
+def update_statistics_on_submission_create(sender, instance, created, raw=False, **kwargs):
+    """Compter une nouvelle soumission (total et activité journalière)."""
+    if raw or not created:
+        return
+    exercise_id, teacher_id = _submission_owner(instance)
+    record_submission(
+        exercise_id, teacher_id, instance.submitted_at,
+        student_id=instance.student_id, submission_id=instance.pk,
+    )
+
+
+@receiver(post_delete, sender=Submission)
+def update_statistics_on_submission_delete(sender, instance, **kwargs):
+    """Décompter une soumission supprimée."""
+    exercise_id, teacher_id = _submission_owner(instance)
+    if teacher_id is not None:
+        record_submission(
+            exercise_id, teacher_id, instance.submitted_at, delta=-1,
+            student_id=instance.student_id, submission_id=instance.pk,
+        )
+
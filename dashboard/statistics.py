@@ -0,0 +1,282 @@
+import logging
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from exercises.models import Exercise
+from submissions.models import Submission, Evaluation
+from .models import (
+    ExerciseStatistics, TeacherStatistics, DailyActivity,
+    SCORE_RANGE_FIELDS, score_range_field,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def exercise_stats_cache_key(exercise_id):
+    """Clé de la réponse de exercise_stats_view dans le cache 'dashboard'."""
+    return f'exercise_stats:{exercise_id}'
+
+
+def invalidate_exercise_stats(exercise_id):
+    """
+    Retirer du cache les statistiques d'un exercice, après la validation de la transaction.
+
+    Avec un cache local au processus, les autres processus servent l'ancienne
+    version jusqu'à l'expiration (TIMEOUT du cache 'dashboard').
+    """
+    key = exercise_stats_cache_key(exercise_id)
+    transaction.on_commit(lambda: caches['dashboard'].delete(key))
+
+
+def get_submission_owner(submission_id):
+    """
+    Retourner (exercise_id, author_id) d'une soumission.
+
+    Args:
+        submission_id: ID de la soumission
+
+    Returns:
+        tuple: (exercise_id, author_id), ou (None, None) si elle n'existe plus
+    """
+    row = Submission.objects.filter(pk=submission_id).values_list(
+        'exercise_id', 'exercise__author_id'
+    ).first()
+    return row or (None, None)
+
+
+def _apply_change(stats, old, new):
+    """
+    Appliquer une variation d'évaluation à une ligne de statistiques verrouillée.
+
+    Args:
+        stats: ExerciseStatistics ou TeacherStatistics
+        old: (score, percentage) avant la modification, ou None
+        new: (score, percentage) après la modification, ou None
+
+    Returns:
+        bool: True si le minimum ou le maximum doit être recalculé
+    """
+    recompute_extremes = False
+
+    if old is not None:
+        score, percentage = old
+        stats.evaluation_count -= 1
+        stats.score_sum -= score
+        stats.percentage_sum -= percentage
+        field = score_range_field(percentage)
+        setattr(stats, field, max(getattr(stats, field) - 1, 0))
+        # Retirer un extrême impose de relire les notes restantes
+        recompute_extremes = score in (stats.min_score, stats.max_score)
+
+    if new is not None:
+        score, percentage = new
+        stats.evaluation_count += 1
+        stats.score_sum += score
+        stats.percentage_sum += percentage
+        field = score_range_field(percentage)
+        setattr(stats, field, getattr(stats, field) + 1)
+        if not recompute_extremes:
+            stats.min_score = score if stats.min_score is None else min(stats.min_score, score)
+            stats.max_score = score if stats.max_score is None else max(stats.max_score, score)
+
+    if stats.evaluation_count <= 0:
+        stats.evaluation_count = 0
+        stats.score_sum = 0.0
+        stats.percentage_sum = 0.0
+        stats.min_score = stats.max_score = None
+        recompute_extremes = False
+
+    return recompute_extremes
+
+
+def apply_evaluation_change(exercise_id, teacher_id, old, new, create=True):
+    """
+    Répercuter la création, la révision ou la suppression d'une évaluation.
+
+    Les lignes de l'exercice puis du professeur sont verrouillées dans cet
+    ordre, pour que les mises à jour concurrentes ne s'écrasent pas.
+
+    Args:
+        exercise_id: ID de l'exercice évalué
+        teacher_id: ID de l'auteur de l'exercice
+        old: (score, percentage) avant la modification, ou None
+        new: (score, percentage) après la modification, ou None
+        create: Créer les lignes manquantes (False lors d'une suppression)
+    """
+    if old == new:
+        return
+
+    targets = (
+        (ExerciseStatistics, {'exercise_id': exercise_id}, {'submission__exercise_id': exercise_id}),
+        (TeacherStatistics, {'teacher_id': teacher_id}, {'submission__exercise__author_id': teacher_id}),
+    )
+
+    with transaction.atomic():
+        for model, lookup, evaluation_filter in targets:
+            queryset = model.objects.select_for_update()
+            if create:
+                stats, _ = queryset.get_or_create(**lookup)
+            else:
+                stats = queryset.filter(**lookup).first()
+                if stats is None:
+                    continue
+
+            if _apply_change(stats, old, new):
+                extremes = Evaluation.objects.filter(**evaluation_filter).aggregate(
+                    min_score=Min('score'), max_score=Max('score')
+                )
+                stats.min_score = extremes['min_score']
+                stats.max_score = extremes['max_score']
+
+            stats.version += 1
+            stats.save()
+
+    invalidate_exercise_stats(exercise_id)
+
+
+def record_submission(exercise_id, teacher_id, submitted_at, delta=1, student_id=None, submission_id=None):
+    """
+    Mettre à jour les compteurs de soumissions et l'activité journalière.
+
+    Args:
+        exercise_id: ID de l'exercice
+        teacher_id: ID de l'auteur de l'exercice
+        submitted_at: Date de la soumission
+        delta: +1 à la création, -1 à la suppression
+        student_id: Auteur de la soumission, pour le nombre d'étudiants distincts (facultatif)
+        submission_id: ID de la soumission, exclue de la recherche d'autres soumissions de l'étudiant
+    """
+    day = timezone.localdate(submitted_at) if timezone.is_aware(submitted_at) else submitted_at.date()
+    # update() ne renseigne pas les champs auto_now : version et date explicites
+    changes = {
+        'submission_count': F('submission_count') + delta,
+        'version': F('version') + 1,
+        'updated_at': timezone.now(),
+    }
+
+    with transaction.atomic():
+        for model, lookup, fields in (
+            (ExerciseStatistics, {'exercise_id': exercise_id}, changes),
+            (TeacherStatistics, {'teacher_id': teacher_id}, changes),
+            (DailyActivity, {'teacher_id': teacher_id, 'day': day}, {'submission_count': changes['submission_count']}),
+        ):
+            if model.objects.filter(**lookup).update(**fields) or delta < 0:
+                continue
+            try:
+                with transaction.atomic():
+                    model.objects.create(submission_count=delta, **lookup)
+            except IntegrityError:
+                # Ligne créée entre-temps par une autre requête
+                model.objects.filter(**lookup).update(**fields)
+
+        # Première (ou dernière) soumission de l'étudiant chez ce professeur. La
+        # ligne du professeur est verrouillée par la mise à jour ci-dessus : une
+        # soumission concurrente du même étudiant est visible une fois validée.
+        if student_id is not None and not Submission.objects.filter(
+            student_id=student_id, exercise__author_id=teacher_id
+        ).exclude(pk=submission_id).exists():
+            TeacherStatistics.objects.filter(teacher_id=teacher_id).update(
+                student_count=F('student_count') + delta
+            )
+
+    invalidate_exercise_stats(exercise_id)
+
+
+def _evaluation_totals(queryset, group_by):
+    """Agréger les évaluations d'un queryset par exercice ou par professeur."""
+    aggregates = {
+        'evaluation_count': Count('id'),
+        'score_sum': Sum('score'),
+        'percentage_sum': Sum('percentage'),
+        'min_score': Min('score'),
+        'max_score': Max('score'),
+    }
+    bounds = (None, 20, 40, 60, 80, None)
+    for index, field in enumerate(SCORE_RANGE_FIELDS):
+        condition = {}
+        if bounds[index] is not None:
+            condition['percentage__gte'] = bounds[index]
+        if bounds[index + 1] is not None:
+            condition['percentage__lt'] = bounds[index + 1]
+        aggregates[field] = Count('id', filter=Q(**condition))
+
+    return {row.pop(group_by): row for row in queryset.values(group_by).annotate(**aggregates).order_by()}
+
+
+@transaction.atomic
+def rebuild_statistics():
+    """
+    Recalculer entièrement les statistiques matérialisées.
+
+    À utiliser après une migration de données ou pour corriger une dérive
+    éventuelle des compteurs incrémentaux.
+
+    Returns:
+        dict: Nombre de lignes reconstruites par table
+    """
+    ExerciseStatistics.objects.all().delete()
+    TeacherStatistics.objects.all().delete()
+    DailyActivity.objects.all().delete()
+
+    exercise_submissions = dict(
+        Submission.objects.values('exercise_id').annotate(count=Count('id')).order_by()
+        .values_list('exercise_id', 'count')
+    )
+    teacher_submissions = {
+        row['exercise__author_id']: row
+        for row in Submission.objects.values('exercise__author_id').annotate(
+            count=Count('id'), students=Count('student', distinct=True)
+        ).order_by()
+    }
+    exercise_evaluations = _evaluation_totals(Evaluation.objects.all(), 'submission__exercise_id')
+    teacher_evaluations = _evaluation_totals(Evaluation.objects.all(), 'submission__exercise__author_id')
+
+    def build(model, owner_field, owner_ids, submissions, evaluations, extra=None):
+        rows = []
+        for owner_id in owner_ids:
+            values = dict(evaluations.get(owner_id, {}))
+            values['score_sum'] = values.get('score_sum') or 0.0
+            values['percentage_sum'] = values.get('percentage_sum') or 0.0
+            if extra:
+                values.update(extra(owner_id))
+            rows.append(model(
+                submission_count=submissions.get(owner_id, 0),
+                **{owner_field: owner_id},
+                **values,
+            ))
+        model.objects.bulk_create(rows, batch_size=500)
+        return len(rows)
+
+    exercise_ids = set(exercise_submissions) | set(exercise_evaluations)
+    teacher_ids = set(Exercise.objects.values_list('author_id', flat=True).distinct())
+
+    daily_rows = [
+        DailyActivity(teacher_id=row['exercise__author_id'], day=row['day'], submission_count=row['count'])
+        for row in Submission.objects.annotate(day=TruncDate('submitted_at'))
+        .values('exercise__author_id', 'day').annotate(count=Count('id')).order_by()
+    ]
+    DailyActivity.objects.bulk_create(daily_rows, batch_size=500)
+
+    result = {
+        'exercises': build(ExerciseStatistics, 'exercise_id', exercise_ids,
+                           exercise_submissions, exercise_evaluations),
+        'teachers': build(
+            TeacherStatistics, 'teacher_id', teacher_ids,
+            {teacher_id: row['count'] for teacher_id, row in teacher_submissions.items()},
+            teacher_evaluations,
+            extra=lambda teacher_id: {
+                'student_count': teacher_submissions.get(teacher_id, {}).get('students', 0),
+            },
+        ),
+        'days': len(daily_rows),
+    }
+    # Les lignes recréées repartent de la version 0 : vider les réponses en cache
+    transaction.on_commit(caches['dashboard'].clear)
+    logger.info(
+        f"Statistiques reconstruites: {result['exercises']} exercices, "
+        f"{result['teachers']} professeurs, {result['days']} jours d'activité."
+    )
+    return result
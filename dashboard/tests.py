@@ -1,3 +1,273 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from dashboard.models import DailyActivity, ExerciseStatistics, TeacherStatistics
+from dashboard.statistics import rebuild_statistics
+from exercises.models import Exercise, ExerciseCorrection, Topic
+from submissions.models import Submission, Evaluation
+
+User = get_user_model()
+
+
+class TeacherDashboardQueryCountTests(TestCase):
+    """Le tableau de bord professeur doit rester dans un budget fixe de requêtes."""
+
+    # Session et utilisateur (middleware) + requêtes de statistiques + template
+    QUERY_BUDGET = 10
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        self.students = [
+            User.objects.create_user(email=f'etudiant{i}@example.com', password='secret')
+            for i in range(3)
+        ]
+        self.client.force_login(self.teacher)
+        self.exercise_count = 0
+
+    def _create_exercises(self, count):
+        """Créer des exercices, catégories, soumissions et évaluations."""
+        for _ in range(count):
+            self.exercise_count += 1
+            index = self.exercise_count
+            topic = Topic.objects.create(name=f'Catégorie {index}', slug=f'categorie-{index}')
+            exercise = Exercise.objects.create(
+                title=f'Exercice {index}',
+                slug=f'exercice-{index}',
+                description='Requêtes SQL',
+                author=self.teacher,
+                topic=topic,
+            )
+            if index % 2:
+                ExerciseCorrection.objects.create(exercise=exercise, text_content='SELECT 1;', is_primary=True)
+
+            for student in self.students:
+                submission = Submission.objects.create(
+                    exercise=exercise,
+                    student=student,
+                    file='submissions/test.pdf',
+                    status='completed',
+                )
+                Evaluation.objects.create(
+                    submission=submission,
+                    score=index % 20,
+                    percentage=(index * 7) % 100,
+                )
+
+    def _count_dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard:dashboard'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_data(self):
+        self._create_exercises(2)
+        small_count = self._count_dashboard_queries()
+
+        self._create_exercises(25)
+        large_count = self._count_dashboard_queries()
+
+        self.assertEqual(small_count, large_count)
+        self.assertLessEqual(large_count, self.QUERY_BUDGET)
+
+    def test_statistics(self):
+        self._create_exercises(4)
+        response = self.client.get(reverse('dashboard:dashboard'))
+
+        self.assertEqual(response.context['total_exercises'], 4)
+        self.assertEqual(response.context['total_submissions'], 12)
+        self.assertEqual(response.context['unique_students'], 3)
+        self.assertEqual(response.context['exercises_without_correction'], 2)
+        self.assertEqual(len(response.context['topic_performance']), 4)
+        self.assertEqual(sum(item['count'] for item in response.context['score_distribution']), 12)
+
+    def test_pending_evaluations_count_ungraded_submissions(self):
+        self._create_exercises(1)
+        exercise = Exercise.objects.get()
+        Submission.objects.create(
+            exercise=exercise, student=self.students[0], file='submissions/test.pdf', attempt_number=2,
+        )
+        response = self.client.get(reverse('dashboard:dashboard'))
+
+        self.assertEqual(response.context['total_submissions'], 4)
+        self.assertEqual(response.context['pending_evaluations'], 1)
+        self.assertEqual(response.context['exercises'][0].submission_count, 4)
+
+
+class ExerciseStatsConditionalGetTests(TestCase):
+    """Les interrogations répétées des statistiques d'un exercice doivent recevoir un 304."""
+
+    def setUp(self):
+        caches['dashboard'].clear()
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        self.exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+        )
+        self.submission = Submission.objects.create(
+            exercise=self.exercise, student=student, file='submissions/test.pdf', status='completed',
+        )
+        self.url = reverse('dashboard:exercise_stats', args=[self.exercise.id])
+        self.client.force_login(self.teacher)
+
+    def test_repeat_poll_returns_not_modified_without_statistics_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['submission_count'], 1)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(any('dashboard_exercisestatistics' in query['sql'] for query in queries))
+
+    def test_evaluation_change_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Evaluation.objects.create(submission=self.submission, score=15, percentage=75)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['max_score'], 15)
+
+
+class MaterializedStatisticsTests(TestCase):
+    """Mise à jour incrémentale des statistiques et reconstruction complète."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        self.students = [
+            User.objects.create_user(email=f'etudiant{i}@example.com', password='secret')
+            for i in range(2)
+        ]
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        self.exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+        )
+        self.attempts = 0
+
+    def _submit(self, student=None):
+        self.attempts += 1
+        return Submission.objects.create(
+            exercise=self.exercise, student=student or self.students[0],
+            file='submissions/test.pdf', attempt_number=self.attempts,
+        )
+
+    def _evaluate(self, score, percentage=None):
+        percentage = score * 5 if percentage is None else percentage
+        return Evaluation.objects.create(submission=self._submit(), score=score, percentage=percentage)
+
+    def _stats(self):
+        return (
+            ExerciseStatistics.objects.get(exercise=self.exercise),
+            TeacherStatistics.objects.get(teacher=self.teacher),
+        )
+
+    def test_distribution_buckets(self):
+        for percentage in (0, 19.9, 20, 59, 80, 100):
+            self._evaluate(10, percentage)
+
+        for stats in self._stats():
+            self.assertEqual(
+                [stats.range_0_20, stats.range_20_40, stats.range_40_60, stats.range_60_80, stats.range_80_100],
+                [2, 1, 1, 0, 2],
+            )
+            self.assertEqual(
+                stats.score_distribution,
+                [{'range': '0-20%', 'count': 2}, {'range': '20-40%', 'count': 1},
+                 {'range': '40-60%', 'count': 1}, {'range': '80-100%', 'count': 2}],
+            )
+
+    def test_deleting_extremes_recomputes_min_and_max(self):
+        low, _, high = self._evaluate(5), self._evaluate(10), self._evaluate(18)
+
+        high.delete()
+        exercise_stats, teacher_stats = self._stats()
+        self.assertEqual((exercise_stats.min_score, exercise_stats.max_score), (5, 10))
+        self.assertEqual((teacher_stats.min_score, teacher_stats.max_score), (5, 10))
+
+        low.delete()
+        exercise_stats, teacher_stats = self._stats()
+        self.assertEqual((exercise_stats.min_score, exercise_stats.max_score), (10, 10))
+        self.assertEqual(exercise_stats.evaluation_count, 1)
+        self.assertEqual(exercise_stats.score_sum, 10)
+        self.assertEqual(exercise_stats.range_80_100, 0)
+
+    def test_regrading_extremes(self):
+        low, _, high = self._evaluate(5), self._evaluate(10), self._evaluate(18)
+
+        high.score, high.percentage = 12, 60
+        high.save()
+        exercise_stats, _ = self._stats()
+        self.assertEqual(exercise_stats.max_score, 12)
+        self.assertEqual((exercise_stats.range_60_80, exercise_stats.range_80_100), (1, 0))
+        self.assertEqual(exercise_stats.score_sum, 27)
+
+        low.score, low.percentage = 3, 15
+        low.save()
+        exercise_stats, teacher_stats = self._stats()
+        self.assertEqual((exercise_stats.min_score, exercise_stats.max_score), (3, 12))
+        self.assertEqual((teacher_stats.min_score, teacher_stats.max_score), (3, 12))
+        self.assertEqual(exercise_stats.evaluation_count, 3)
+
+    def test_deleting_last_evaluation_resets_statistics(self):
+        self._evaluate(14).delete()
+
+        exercise_stats, _ = self._stats()
+        self.assertEqual(exercise_stats.evaluation_count, 0)
+        self.assertIsNone(exercise_stats.min_score)
+        self.assertIsNone(exercise_stats.avg_score)
+        self.assertEqual(exercise_stats.submission_count, 1)
+
+    def test_distinct_students(self):
+        first = self._submit(self.students[0])
+        second = self._submit(self.students[0])
+        other = self._submit(self.students[1])
+        self.assertEqual(self._stats()[1].student_count, 2)
+
+        first.delete()
+        self.assertEqual(self._stats()[1].student_count, 2)
+        second.delete()
+        other.delete()
+        teacher_stats = self._stats()[1]
+        self.assertEqual(teacher_stats.student_count, 0)
+        self.assertEqual(teacher_stats.submission_count, 0)
+
+    def test_rebuild_matches_incremental_statistics(self):
+        for score in (4, 11, 19):
+            self._evaluate(score)
+        self._submit(self.students[1])
+
+        def snapshot():
+            exercise_stats, teacher_stats = self._stats()
+            fields = (
+                'submission_count', 'evaluation_count', 'score_sum', 'percentage_sum', 'min_score', 'max_score',
+                'range_0_20', 'range_20_40', 'range_40_60', 'range_60_80', 'range_80_100',
+            )
+            return (
+                [getattr(exercise_stats, field) for field in fields],
+                [getattr(teacher_stats, field) for field in fields + ('student_count',)],
+                list(DailyActivity.objects.values_list('teacher_id', 'day', 'submission_count')),
+            )
+
+        expected = snapshot()
+        # Dérive des compteurs (mises à jour en masse qui contournent les signaux...)
+        ExerciseStatistics.objects.update(evaluation_count=0, score_sum=0, max_score=None)
+        TeacherStatistics.objects.update(submission_count=9, student_count=0)
+        DailyActivity.objects.all().delete()
+
+        self.assertEqual(rebuild_statistics(), {'exercises': 1, 'teachers': 1, 'days': 1})
+        self.assertEqual(snapshot(), expected)
+        self.assertEqual(expected[1][-1], 2)
@@ -1,13 +1,18 @@
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Avg, Max, Min, Sum, Q, F, Value, Case, When, CharField
-from django.db.models.functions import TruncDate, Extract
+from django.db.models import Count, Avg, Sum, F, Exists, OuterRef
+from django.db.models.functions import Coalesce, Extract
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.http import JsonResponse
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
 
-from exercises.models import Exercise, ExerciseAssignment
+from exercises.models import Exercise, ExerciseAssignment, ExerciseCorrection
 from submissions.models import Submission, Evaluation
+from .models import ExerciseStatistics, TeacherStatistics, DailyActivity
+from .statistics import exercise_stats_cache_key
 
 User = get_user_model()
 
@@ -94,105 +99,90 @@ def student_dashboard(request):
 
 
 def teacher_dashboard(request):
-    """Tableau de bord pour les professeurs."""
+    """
+    Tableau de bord pour les professeurs.
     
-    teacher = request.user
-    
-    # Exercices créés par le professeur
-    exercises = Exercise.objects.filter(author=teacher)
+    Toutes les statistiques proviennent des tables matérialisées
+    (dashboard.statistics), en un nombre constant de requêtes qui ne
+    parcourent ni les soumissions ni les évaluations.
+    """
     
-    # Soumissions pour les exercices du professeur (sans slice)
-    all_recent_submissions = Submission.objects.filter(
-        exercise__author=teacher
-    ).order_by('-submitted_at')
-    
-    # Version slicée pour l'affichage
-    recent_submissions = all_recent_submissions[:10]
+    teacher = request.user
+    now = timezone.now()
     
-    # Statistiques globales
-    total_exercises = exercises.count()
-    total_submissions = Submission.objects.filter(exercise__author=teacher).count()
-    
-    # Nombre d'étudiants uniques qui ont soumis des exercices
-    unique_students = Submission.objects.filter(
-        exercise__author=teacher
-    ).values('student').distinct().count()
-    
-    # Taux moyen de réussite
-    avg_score_pct = Evaluation.objects.filter(
-        submission__exercise__author=teacher
-    ).aggregate(avg=Avg('percentage'))['avg'] or 0
-    
-    # Distribution des notes (pour graphiques)
-    score_distribution = Evaluation.objects.filter(
-        submission__exercise__author=teacher
-    ).annotate(
-        range=Case(
-            When(percentage__lt=20, then=Value('0-20%')),
-            When(percentage__lt=40, then=Value('20-40%')),
-            When(percentage__lt=60, then=Value('40-60%')),
-            When(percentage__lt=80, then=Value('60-80%')),
-            default=Value('80-100%'),
-            output_field=CharField(),
+    # Exercices créés par le professeur, avec leurs compteurs matérialisés
+    # (jointures simples, sans agrégat sur les soumissions)
+    exercises = list(
+        Exercise.objects.filter(author=teacher)
+        .select_related('topic')
+        .annotate(
+            submission_count=Coalesce('statistics__submission_count', 0),
+            has_correction=Exists(ExerciseCorrection.objects.filter(exercise=OuterRef('pk'))),
         )
-    ).values('range').annotate(count=Count('id')).order_by('range')
-    
-    # Activité par jour (derniers 30 jours)
-    thirty_days_ago = timezone.now() - timezone.timedelta(days=30)
-    daily_activity = Submission.objects.filter(
-        exercise__author=teacher,
-        submitted_at__gte=thirty_days_ago
-    ).annotate(
-        day=TruncDate('submitted_at')
-    ).values('day').annotate(count=Count('id')).order_by('day')
-    
-    # Calcul des tâches à faire
-    # Utiliser all_recent_submissions au lieu de recent_submissions
-    pending_evaluations = all_recent_submissions.filter(status='pending').count()
+    )
     
-    # Exercices sans correction
-    exercises_without_correction = 0
-    for exercise in exercises:
-        if not exercise.corrections.exists():
-            exercises_without_correction += 1
+    # Soumissions récentes pour l'affichage, avec les relations utilisées par le template
+    recent_submissions = list(
+        Submission.objects.filter(exercise__author=teacher)
+        .select_related('student', 'exercise', 'evaluation')
+        .order_by('-submitted_at')[:10]
+    )
     
-    # Exercices qui expirent bientôt (dans la semaine)
-    now = timezone.now()
-    expiring_soon = timezone.now() + timezone.timedelta(days=7)
-    expiring_exercises = exercises.filter(
-        deadline__gt=now,
-        deadline__lt=expiring_soon
-    ).count()
+    # Soumissions, étudiants, taux moyen de réussite et distribution des
+    # notes : statistiques matérialisées du professeur (une seule ligne)
+    teacher_stats = TeacherStatistics.objects.filter(teacher=teacher).first() or TeacherStatistics()
+    avg_score_pct = teacher_stats.avg_percentage or 0
+    # Soumissions reçues mais pas encore notées
+    pending_evaluations = max(teacher_stats.submission_count - teacher_stats.evaluation_count, 0)
     
-    # Obtenir les données de performance par sujet/catégorie
-    from django.db.models import Subquery, OuterRef
+    # Activité par jour (derniers 30 jours)
+    thirty_days_ago = timezone.localdate(now) - timezone.timedelta(days=30)
+    daily_activity = DailyActivity.objects.filter(
+        teacher=teacher,
+        day__gte=thirty_days_ago,
+        submission_count__gt=0,
+    ).values('day', count=F('submission_count')).order_by('day')
+    
+    # Exercices sans correction et exercices qui expirent bientôt (dans la semaine)
+    expiring_soon = now + timezone.timedelta(days=7)
+    exercises_without_correction = sum(1 for exercise in exercises if not exercise.has_correction)
+    expiring_exercises = sum(
+        1 for exercise in exercises
+        if exercise.deadline and now < exercise.deadline < expiring_soon
+    )
     
-    # Supposons que vous ayez un modèle Topic pour les catégories d'exercices
-    from exercises.models import Topic  # Ajustez selon votre projet
+    # Performance par sujet/catégorie : sommes des statistiques des exercices
+    # (une ligne par exercice, pas de parcours des évaluations)
+    from exercises.models import Topic
     
     topics = Topic.objects.all()
-    topic_performance = []
+    topic_totals = ExerciseStatistics.objects.filter(
+        exercise__author=teacher,
+        exercise__topic__isnull=False,
+        evaluation_count__gt=0,
+    ).values(
+        'exercise__topic', 'exercise__topic__name'
+    ).annotate(
+        score_sum=Sum('score_sum'),
+        evaluation_count=Sum('evaluation_count'),
+    ).order_by('exercise__topic')
     
-    for topic in topics:
-        avg = Evaluation.objects.filter(
-            submission__exercise__topic=topic,
-            submission__exercise__author=teacher
-        ).aggregate(avg=Avg('score'))['avg']
-        
-        if avg is not None:
-            topic_performance.append({
-                'name': topic.name,
-                'avg_score': avg * 20 if avg <= 1.0 else avg  # Convertir en score sur 20 si nécessaire
-            })
+    topic_performance = []
+    for row in topic_totals:
+        avg = row['score_sum'] / row['evaluation_count']
+        topic_performance.append({
+            'name': row['exercise__topic__name'],
+            'avg_score': avg * 20 if avg <= 1.0 else avg,  # Convertir en score sur 20 si nécessaire
+        })
     
     context = {
         'exercises': exercises,
         'recent_submissions': recent_submissions,
-        'total_exercises': total_exercises,
-        'total_submissions': total_submissions,
-        'unique_students': unique_students,
+        'total_exercises': len(exercises),
+        'total_submissions': teacher_stats.submission_count,
+        'unique_students': teacher_stats.student_count,
         'avg_score_pct': round(avg_score_pct, 2),
-        'score_distribution': list(score_distribution),
+        'score_distribution': teacher_stats.score_distribution,
         'daily_activity': list(daily_activity),
         'pending_evaluations': pending_evaluations,
         'exercises_without_correction': exercises_without_correction,
@@ -205,44 +195,47 @@ def teacher_dashboard(request):
 
 @login_required
 def exercise_stats_view(request, exercise_id):
-    """Vue pour les statistiques détaillées d'un exercice spécifique."""
+    """
+    Vue pour les statistiques détaillées d'un exercice spécifique.
+    
+    La réponse est mise en cache par exercice et porte un ETag (version des
+    statistiques) et un Last-Modified : les interrogations répétées du
+    navigateur reçoivent un 304 sans requête sur les statistiques.
+    """
     
     if not request.user.is_teacher:
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
-    # Récupérer les statistiques pour l'exercice demandé
-    stats = Submission.objects.filter(
-        exercise_id=exercise_id
-    ).aggregate(
-        count=Count('id'),
-        avg_score=Avg('evaluation__score'),
-        max_score=Max('evaluation__score'),
-        min_score=Min('evaluation__score'),
-        avg_percentage=Avg('evaluation__percentage'),
-    )
-    
-    # Ajouter des statistiques de répartition
-    score_distribution = Evaluation.objects.filter(
-        submission__exercise_id=exercise_id
-    ).annotate(
-        range=Case(
-            When(percentage__lt=20, then=Value('0-20%')),
-            When(percentage__lt=40, then=Value('20-40%')),
-            When(percentage__lt=60, then=Value('40-60%')),
-            When(percentage__lt=80, then=Value('60-80%')),
-            default=Value('80-100%'),
-            output_field=CharField(),
-        )
-    ).values('range').annotate(count=Count('id')).order_by('range')
-    
-    # Formater les statistiques
-    result = {
-        'submission_count': stats['count'],
-        'avg_score': round(stats['avg_score'], 2) if stats['avg_score'] else 0,
-        'max_score': stats['max_score'] or 0,
-        'min_score': stats['min_score'] or 0,
-        'avg_percentage': round(stats['avg_percentage'], 2) if stats['avg_percentage'] else 0,
-        'score_distribution': list(score_distribution),
-    }
-    
-    return JsonResponse(result)
\ No newline at end of file
+    cache = caches['dashboard']
+    cache_key = exercise_stats_cache_key(exercise_id)
+    cached = cache.get(cache_key)
+    if cached is None:
+        # Statistiques matérialisées de l'exercice (une seule ligne)
+        stats = ExerciseStatistics.objects.filter(exercise_id=exercise_id).first() or ExerciseStatistics()
+        
+        # Formater les statistiques
+        result = {
+            'submission_count': stats.submission_count,
+            'avg_score': round(stats.avg_score, 2) if stats.avg_score else 0,
+            'max_score': stats.max_score or 0,
+            'min_score': stats.min_score or 0,
+            'avg_percentage': round(stats.avg_percentage, 2) if stats.avg_percentage else 0,
+            'score_distribution': stats.score_distribution,
+        }
+        
+        # La date départage deux versions identiques après rebuild_statistics
+        last_modified = int(stats.updated_at.timestamp()) if stats.updated_at else None
+        etag = quote_etag(f"{exercise_id}-{stats.version}-{last_modified or 0}")
+        cached = (etag, last_modified, result)
+        cache.set(cache_key, cached)
+    
+    etag, last_modified, result = cached
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(result)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    # Le navigateur garde la réponse mais la revalide à chaque appel
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
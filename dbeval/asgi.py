@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dbeval.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    """Application ASGI de Django, avec gestion du protocole lifespan."""
+    if scope['type'] != 'lifespan':
+        return await django_application(scope, receive, send)
+
+    # Django ne gère pas le lifespan : fermer ici les clients Ollama partagés
+    from ai_engine.clients import close_clients
+
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_clients()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
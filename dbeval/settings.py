@@ -56,6 +56,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Pour servir les fichiers statiques en production
+    'ai_engine.middleware.QueryCountMiddleware',  # Requêtes SQL par vue (métriques Prometheus)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -309,6 +310,128 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
     X_FRAME_OPTIONS = 'DENY'
 
+# Configuration du worker d'évaluation (python manage.py run_evaluation_worker)
+EVALUATION_WORKER_CONCURRENCY = int(os.environ.get('EVALUATION_WORKER_CONCURRENCY', '4'))
+EVALUATION_WORKER_BATCH_SIZE = int(os.environ.get('EVALUATION_WORKER_BATCH_SIZE', str(EVALUATION_WORKER_CONCURRENCY)))
+EVALUATION_WORKER_POLL_INTERVAL = float(os.environ.get('EVALUATION_WORKER_POLL_INTERVAL', '5'))
+# Bail (secondes) d'une soumission réservée : renouvelé tant que l'évaluation
+# tourne, il expire si le worker meurt (SIGKILL, OOM) et la soumission repasse en attente
+EVALUATION_CLAIM_LEASE = int(os.environ.get('EVALUATION_CLAIM_LEASE', '300'))
+
+# Connexions HTTP vers Ollama (clients partagés, par endpoint)
+OLLAMA_TIMEOUT = float(os.environ.get('OLLAMA_TIMEOUT', '120'))
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get('OLLAMA_CONNECT_TIMEOUT', '10'))
+OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT = int(os.environ.get('OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT', '8'))
+OLLAMA_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OLLAMA_MAX_KEEPALIVE_CONNECTIONS', str(OLLAMA_MAX_CONNECTIONS_PER_ENDPOINT)))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.environ.get('OLLAMA_KEEPALIVE_EXPIRY', '60'))
+
+# Répartition de charge entre les AIModel actifs servant le même modèle
+OLLAMA_BALANCER_FAILURE_THRESHOLD = int(os.environ.get('OLLAMA_BALANCER_FAILURE_THRESHOLD', '3'))
+OLLAMA_BALANCER_EJECTION_TIME = float(os.environ.get('OLLAMA_BALANCER_EJECTION_TIME', '30'))
+OLLAMA_BALANCER_MAX_EJECTION_TIME = float(os.environ.get('OLLAMA_BALANCER_MAX_EJECTION_TIME', '300'))
+OLLAMA_BALANCER_SLOW_FACTOR = float(os.environ.get('OLLAMA_BALANCER_SLOW_FACTOR', '3'))
+OLLAMA_BALANCER_REFRESH_INTERVAL = float(os.environ.get('OLLAMA_BALANCER_REFRESH_INTERVAL', '30'))
+OLLAMA_HEALTH_CHECK_TIMEOUT = float(os.environ.get('OLLAMA_HEALTH_CHECK_TIMEOUT', '5'))
+
+# Limite de concurrence adaptative par endpoint (AIMD) et contre-pression
+OLLAMA_LIMITER_INITIAL_CONCURRENCY = int(os.environ.get('OLLAMA_LIMITER_INITIAL_CONCURRENCY', '2'))
+OLLAMA_LIMITER_MIN_CONCURRENCY = int(os.environ.get('OLLAMA_LIMITER_MIN_CONCURRENCY', '1'))
+OLLAMA_LIMITER_LATENCY_THRESHOLD = float(os.environ.get('OLLAMA_LIMITER_LATENCY_THRESHOLD', '60'))
+OLLAMA_LIMITER_BACKOFF_RATIO = float(os.environ.get('OLLAMA_LIMITER_BACKOFF_RATIO', '0.5'))
+OLLAMA_LIMITER_QUEUE_TIMEOUT = float(os.environ.get('OLLAMA_LIMITER_QUEUE_TIMEOUT', '30'))
+
+# Nouvelles tentatives en cas d'erreur passagère, puis abandon ('dead_letter')
+AI_EVALUATION_MAX_ATTEMPTS = int(os.environ.get('AI_EVALUATION_MAX_ATTEMPTS', '3'))
+AI_EVALUATION_RETRY_BASE_DELAY = float(os.environ.get('AI_EVALUATION_RETRY_BASE_DELAY', '2'))
+AI_EVALUATION_RETRY_MAX_DELAY = float(os.environ.get('AI_EVALUATION_RETRY_MAX_DELAY', '60'))
+
+# Réutilisation du préfixe commun aux soumissions d'un exercice (cache KV d'Ollama)
+OLLAMA_PREFIX_REUSE = os.environ.get('OLLAMA_PREFIX_REUSE', 'True') == 'True'
+OLLAMA_KEEP_ALIVE = os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+
+# Réponse contrainte par un schéma JSON (paramètre format d'Ollama, version 0.5 ou plus)
+OLLAMA_STRUCTURED_OUTPUT = os.environ.get('OLLAMA_STRUCTURED_OUTPUT', 'True') == 'True'
+
+# Durée de conservation en mémoire des templates de prompt (secondes)
+PROMPT_TEMPLATE_CACHE_TTL = int(os.environ.get('PROMPT_TEMPLATE_CACHE_TTL', '300'))
+
+# Budget de tokens du prompt : estimation (caractères par token), marge de
+# sécurité, part réservée à l'énoncé et à la correction, et nombre maximal de
+# parties évaluées en parallèle pour une soumission trop longue
+PROMPT_CHARS_PER_TOKEN = float(os.environ.get('PROMPT_CHARS_PER_TOKEN', '4'))
+PROMPT_TOKEN_SAFETY_MARGIN = float(os.environ.get('PROMPT_TOKEN_SAFETY_MARGIN', '0.1'))
+PROMPT_SHARED_CONTEXT_RATIO = float(os.environ.get('PROMPT_SHARED_CONTEXT_RATIO', '0.5'))
+AI_EVALUATION_MAX_CHUNKS = int(os.environ.get('AI_EVALUATION_MAX_CHUNKS', '4'))
+
+# File d'évaluation : fenêtre (heures) avant l'échéance d'un exercice pendant
+# laquelle ses soumissions passent en priorité, et nombre de candidats examinés
+# à chaque réservation pour répartir les places entre professeurs et exercices
+EVALUATION_DEADLINE_WINDOW = int(os.environ.get('EVALUATION_DEADLINE_WINDOW', '48'))
+EVALUATION_SCHEDULER_SCAN = int(os.environ.get('EVALUATION_SCHEDULER_SCAN', '200'))
+
+# Nombre de jobs récents pris en compte pour les percentiles affichés dans l'admin
+AI_METRICS_SAMPLE_SIZE = int(os.environ.get('AI_METRICS_SAMPLE_SIZE', '1000'))
+
+# Jeton d'accès à /metrics/ (en-tête "Authorization: Bearer <jeton>") ; sans
+# jeton, la page est réservée aux membres de l'équipe. Sous gunicorn, définir
+# aussi PROMETHEUS_MULTIPROC_DIR pour agréger les métriques des workers.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Statut des évaluations poussé aux pages en attente (Server-Sent Events).
+# Actif seulement si le site est servi par dbeval.asgi (par exemple
+# `gunicorn dbeval.asgi:application -k uvicorn.workers.UvicornWorker`) ;
+# sous WSGI, les pages interrogent check-status toutes les 5 secondes.
+# Broker : 'ai_engine.events.InProcessBroker' si les évaluations tournent dans le
+# processus web ; le broker par défaut relit aussi la base toutes les
+# EVALUATION_EVENT_POLL_INTERVAL secondes (worker séparé).
+EVALUATION_EVENT_BROKER = os.environ.get('EVALUATION_EVENT_BROKER', 'ai_engine.events.DatabasePollingBroker')
+EVALUATION_EVENT_POLL_INTERVAL = float(os.environ.get('EVALUATION_EVENT_POLL_INTERVAL', '2'))
+EVALUATION_EVENTS_HEARTBEAT = int(os.environ.get('EVALUATION_EVENTS_HEARTBEAT', '15'))
+EVALUATION_EVENTS_MAX_DURATION = int(os.environ.get('EVALUATION_EVENTS_MAX_DURATION', '300'))
+
+# Génération en flux (NDJSON) et fréquence d'enregistrement de la progression
+OLLAMA_STREAMING = os.environ.get('OLLAMA_STREAMING', 'True') == 'True'
+OLLAMA_PROGRESS_INTERVAL = float(os.environ.get('OLLAMA_PROGRESS_INTERVAL', '1'))
+
+# Cache des résultats d'évaluation (clé: empreinte du prompt et du modèle)
+AI_EVALUATION_CACHE_ENABLED = os.environ.get('AI_EVALUATION_CACHE_ENABLED', 'True') == 'True'
+AI_EVALUATION_CACHE_ALIAS = 'ai_evaluations'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'ai_evaluations': {
+        'BACKEND': os.environ.get(
+            'AI_EVALUATION_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('AI_EVALUATION_CACHE_LOCATION', 'ai-evaluations'),
+        'TIMEOUT': int(os.environ.get('AI_EVALUATION_CACHE_TTL', str(7 * 24 * 3600))),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('AI_EVALUATION_CACHE_MAX_ENTRIES', '1000')),
+        },
+    },
+    # Réponses des statistiques du tableau de bord, retirées à chaque modification.
+    # Un cache partagé (Redis, Memcached...) rend l'invalidation immédiate pour
+    # tous les processus ; avec le cache local, TIMEOUT borne le retard.
+    'dashboard': {
+        'BACKEND': os.environ.get(
+            'DASHBOARD_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_LOCATION', 'dashboard'),
+        'TIMEOUT': int(os.environ.get('DASHBOARD_STATS_CACHE_TTL', '30')),
+    },
+}
+
+# Extraction du texte des PDF (processus dédiés, hors du thread de requête)
+PDF_EXTRACTION_PROCESSES = int(os.environ.get('PDF_EXTRACTION_PROCESSES', '2'))
+PDF_EXTRACTION_THREADS = int(os.environ.get('PDF_EXTRACTION_THREADS', '2'))
+PDF_EXTRACTION_TIMEOUT = float(os.environ.get('PDF_EXTRACTION_TIMEOUT', '120'))
+PDF_EXTRACTION_MAX_PAGES = int(os.environ.get('PDF_EXTRACTION_MAX_PAGES', '200'))
+
+# Balayage de secours pour les déploiements sans worker
 CRONJOBS = [
     ('*/5 * * * *', 'ai_engine.evaluator.evaluate_pending_submissions', '>> /tmp/smartdb_evaluation.log'),
 ]
\ No newline at end of file
@@ -3,11 +3,15 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
+from ai_engine.views import metrics_view
 
 urlpatterns = [
     # Administration Django
     path('admin/', admin.site.urls),
     
+    # Métriques Prometheus du système d'évaluation
+    path('metrics/', metrics_view, name='metrics'),
+    
     # Page d'accueil
     path('', TemplateView.as_view(template_name='home.html'), name='home'),
     
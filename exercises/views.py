@@ -21,6 +21,7 @@ from .forms import (
     ExerciseAssignmentForm, ExerciseFilterForm
 )
 from accounts.views import TeacherRequiredMixin
+from ai_engine.extraction import schedule_text_extraction
 
 
 class ExerciseListView(LoginRequiredMixin, ListView):
@@ -185,13 +186,15 @@ class ExerciseCreateView(LoginRequiredMixin, TeacherRequiredMixin, CreateView):
         else:
             form.instance.slug = base_slug
         
-        # Générer le texte à partir du PDF pour la recherche
         if form.cleaned_data.get('file'):
             form.instance.file = form.cleaned_data['file']
-            # TODO: Extraction du texte du PDF avec PyPDF2
         
         messages.success(self.request, "L'exercice a été créé avec succès.")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        
+        # Générer le texte à partir du PDF pour la recherche (en arrière-plan)
+        schedule_text_extraction(self.object, 'file_content_text')
+        return response
     
     def get_success_url(self):
         return reverse('exercises:exercise_detail', kwargs={'pk': self.object.pk})
@@ -210,13 +213,13 @@ class ExerciseUpdateView(LoginRequiredMixin, TeacherRequiredMixin, UpdateView):
         return obj
     
     def form_valid(self, form):
-        # Si un nouveau fichier est chargé, mettre à jour le contenu texte
-        if form.cleaned_data.get('file'):
-            # TODO: Extraction du texte du PDF avec PyPDF2
-            pass
-            
         messages.success(self.request, "L'exercice a été mis à jour avec succès.")
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        
+        # Si un nouveau fichier est chargé, mettre à jour le contenu texte
+        if 'file' in form.changed_data and self.object.file:
+            schedule_text_extraction(self.object, 'file_content_text')
+        return response
     
     def get_success_url(self):
         return reverse('exercises:exercise_detail', kwargs={'pk': self.object.pk})
@@ -260,13 +263,12 @@ def add_correction_view(request, pk):
             if not exercise.corrections.exists() or form.cleaned_data['is_primary']:
                 correction.is_primary = True
             
-            # Extraction du texte du fichier PDF
-            if form.cleaned_data.get('file'):
-                # TODO: Extraction du texte du PDF avec PyPDF2
-                pass
-            
             correction.save()
             
+            # Extraction du texte du fichier PDF, sans écraser un texte saisi
+            if form.cleaned_data.get('file'):
+                schedule_text_extraction(correction, 'text_content', overwrite=False)
+            
             messages.success(request, "La correction a été ajoutée avec succès.")
             return redirect('exercises:exercise_detail', pk=exercise.pk)
     else:
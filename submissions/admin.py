@@ -17,10 +17,11 @@ class IsLateFilter(admin.SimpleListFilter):
         )
     
     def queryset(self, request, queryset):
+        # is_late_flag : annotation de SubmissionAdmin.get_queryset (with_lateness)
         if self.value() == 'yes':
-            return queryset.filter(is_late=True)
+            return queryset.filter(is_late_flag=True)
         if self.value() == 'no':
-            return queryset.filter(is_late=False)
+            return queryset.filter(is_late_flag=False)
 
 
 class EvaluationInline(admin.StackedInline):
@@ -52,9 +53,9 @@ class SubmissionAdmin(admin.ModelAdmin):
     
     list_display = ('id', 'student', 'exercise', 'attempt_number', 'status_colored', 'score_display', 'is_late_display', 'submitted_at')
     # Remplacez 'is_late' par le filtre personnalisé IsLateFilter
-    list_filter = ('status', 'exercise__topic', IsLateFilter, 'submitted_at')
+    list_filter = ('status', 'priority', 'exercise__topic', IsLateFilter, 'submitted_at')
     search_fields = ('student_email', 'studentfirst_name', 'studentlast_name', 'exercise_title')
-    readonly_fields = ('submitted_at', 'processed_at', 'file_content_text')
+    readonly_fields = ('submitted_at', 'processed_at', 'claimed_at', 'file_content_text', 'is_late')
     date_hierarchy = 'submitted_at'
     inlines = [EvaluationInline]
     
@@ -62,9 +63,13 @@ class SubmissionAdmin(admin.ModelAdmin):
         (None, {'fields': ('student', 'exercise', 'attempt_number')}),
         (_('Fichier'), {'fields': ('file', 'file_content_text')}),
         (_('Statut'), {'fields': ('status', 'is_late')}),
-        (_('Dates'), {'fields': ('submitted_at', 'processed_at')}),
+        (_('Dates'), {'fields': ('submitted_at', 'claimed_at', 'processed_at')}),
     )
     
+    def get_queryset(self, request):
+        # Retard, note, étudiant et exercice lus dans la requête de la liste
+        return super().get_queryset(request).with_lateness().select_related('student', 'exercise', 'evaluation')
+    
     def status_colored(self, obj):
         """Affiche le statut avec un code couleur."""
         status_colors = {
@@ -103,3 +108,4 @@ class SubmissionAdmin(admin.ModelAdmin):
     status_colored.short_description = _('Statut')
     score_display.short_description = _('Note')
     is_late_display.short_description = _('Délai')
+    is_late_display.admin_order_field = 'is_late_flag'
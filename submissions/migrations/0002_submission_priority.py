@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0001_initial'),
+        ('submissions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='priority',
+            field=models.PositiveSmallIntegerField(choices=[(0, 'Évaluation individuelle'), (1, 'Échéance proche'), (2, 'Normale'), (3, 'Réévaluation en lot')], default=2, help_text="Ordre de traitement par le worker d'évaluation"),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['status', 'priority', 'submitted_at'], name='submission_queue_idx'),
+        ),
+    ]
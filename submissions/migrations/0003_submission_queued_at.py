@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0002_submission_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, help_text="Date de mise en file d'attente pour l'évaluation", null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercises', '0001_initial'),
+        ('submissions', '0003_submission_queued_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exercise', 'submitted_at', 'id'], name='submission_exercise_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['student', 'submitted_at', 'id'], name='submission_student_list_idx'),
+        ),
+    ]
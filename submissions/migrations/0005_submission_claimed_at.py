@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0004_submission_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text="Début du bail de réservation par un worker (renouvelé pendant l'évaluation)", null=True),
+        ),
+    ]
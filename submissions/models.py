@@ -1,5 +1,10 @@
 from django.db import models
+from django.db.models import (
+    Avg, BooleanField, Case, Count, F, Max, Min, OuterRef, Q, Subquery, Value, When, Window,
+)
+from django.db.models.functions import Coalesce, RowNumber
 from django.conf import settings
+from exercises.models import ExerciseAssignment
 import uuid
 import os
 
@@ -10,6 +15,81 @@ def submission_file_path(instance, filename):
     return os.path.join('submissions', str(instance.student.id), filename)
 
 
+class SubmissionQuerySet(models.QuerySet):
+    
+    def with_lateness(self):
+        """
+        Annoter la date limite effective et le retard de chaque soumission.
+        
+        effective_deadline : date limite de l'attribution de l'exercice à
+        l'étudiant, sinon celle de l'exercice. is_late_flag : soumission
+        postérieure à cette date. Calculés dans la requête de la liste, sans
+        requête supplémentaire par ligne (lu par Submission.is_late).
+        """
+        custom_deadline = ExerciseAssignment.objects.filter(
+            exercise_id=OuterRef('exercise_id'),
+            assigned_to_id=OuterRef('student_id'),
+        ).order_by('pk').values('custom_deadline')[:1]
+        return self.annotate(
+            effective_deadline=Coalesce(Subquery(custom_deadline), F('exercise__deadline')),
+        ).annotate(
+            is_late_flag=Case(
+                When(submitted_at__gt=F('effective_deadline'), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+    
+    def score_summary(self, percentiles=(25, 50, 75)):
+        """
+        Calculer les statistiques de notes des soumissions, sans charger les lignes.
+        
+        Effectifs, moyenne, minimum et maximum sont lus en une requête
+        d'agrégation, puis les notes encadrant chaque percentile en une seule
+        requête ordonnée (numéro de rang, interpolation linéaire comme
+        ai_engine.metrics.percentile) : la mémoire utilisée ne dépend pas du
+        nombre de soumissions. Un percentile dont les notes ont été supprimées
+        entre les deux requêtes est omis.
+        
+        Args:
+            percentiles: Percentiles des notes à calculer
+            
+        Returns:
+            dict: total, completed, evaluated, average_score, min_score,
+                max_score et percentiles ({percentile: note})
+        """
+        summary = self.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            evaluated=Count('evaluation'),
+            average_score=Avg('evaluation__score'),
+            min_score=Min('evaluation__score'),
+            max_score=Max('evaluation__score'),
+        )
+        
+        summary['percentiles'] = {}
+        evaluated = summary['evaluated']
+        if evaluated:
+            ranks = {percent: (evaluated - 1) * percent / 100 for percent in percentiles}
+            # Rangs (numérotés à partir de 1) des deux notes encadrant chaque percentile
+            bounds = {
+                percent: (int(rank) + 1, min(int(rank) + 2, evaluated))
+                for percent, rank in ranks.items()
+            }
+            scores = dict(
+                self.filter(evaluation__isnull=False)
+                .annotate(rank=Window(RowNumber(), order_by=F('evaluation__score').asc()))
+                .filter(rank__in={row for pair in bounds.values() for row in pair})
+                .values_list('rank', 'evaluation__score')
+            )
+            for percent, rank in ranks.items():
+                lower, upper = (scores.get(row) for row in bounds[percent])
+                if lower is None or upper is None:
+                    continue
+                summary['percentiles'][percent] = lower + (upper - lower) * (rank - int(rank))
+        return summary
+
+
 class Submission(models.Model):
     """Soumission d'un exercice par un étudiant."""
     
@@ -45,12 +125,41 @@ class Submission(models.Model):
         default='pending'
     )
     
+    # Priorité d'évaluation (la plus petite valeur passe en premier)
+    PRIORITY_INTERACTIVE = 0
+    PRIORITY_DEADLINE = 1
+    PRIORITY_NORMAL = 2
+    PRIORITY_BULK = 3
+    PRIORITY_CHOICES = (
+        (PRIORITY_INTERACTIVE, 'Évaluation individuelle'),
+        (PRIORITY_DEADLINE, 'Échéance proche'),
+        (PRIORITY_NORMAL, 'Normale'),
+        (PRIORITY_BULK, 'Réévaluation en lot'),
+    )
+    priority = models.PositiveSmallIntegerField(
+        choices=PRIORITY_CHOICES,
+        default=PRIORITY_NORMAL,
+        help_text="Ordre de traitement par le worker d'évaluation"
+    )
+    
     # Informations sur la tentative
     attempt_number = models.PositiveIntegerField(default=1)
     
     # Métadonnées temporelles
     submitted_at = models.DateTimeField(auto_now_add=True)
     processed_at = models.DateTimeField(blank=True, null=True)
+    queued_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="Date de mise en file d'attente pour l'évaluation"
+    )
+    claimed_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        help_text="Début du bail de réservation par un worker (renouvelé pendant l'évaluation)"
+    )
+    
+    objects = SubmissionQuerySet.as_manager()
     
     def _str_(self):
         return f"Soumission de {self.student.email} pour {self.exercise.title}"
@@ -58,10 +167,24 @@ class Submission(models.Model):
     class Meta:
         unique_together = ('exercise', 'student', 'attempt_number')
         ordering = ['-submitted_at']
+        indexes = [
+            # File d'attente du worker (voir ai_engine.scheduler)
+            models.Index(fields=['status', 'priority', 'submitted_at'], name='submission_queue_idx'),
+            # Listes par exercice et par étudiant (pagination par curseur, voir pagination.py)
+            models.Index(fields=['exercise', 'submitted_at', 'id'], name='submission_exercise_list_idx'),
+            models.Index(fields=['student', 'submitted_at', 'id'], name='submission_student_list_idx'),
+        ]
     
     @property
     def is_late(self):
-        """Vérifier si la soumission est en retard par rapport à la date limite."""
+        """
+        Vérifier si la soumission est en retard par rapport à la date limite.
+        
+        Utilise l'annotation de Submission.objects.with_lateness() si elle est
+        présente ; sinon, interroge l'attribution de l'exercice.
+        """
+        if 'is_late_flag' in self.__dict__:
+            return self.is_late_flag
         assignment = self.exercise.assignments.filter(assigned_to=self.student).first()
         if assignment and assignment.effective_deadline:
             return self.submitted_at > assignment.effective_deadline
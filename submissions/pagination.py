@@ -0,0 +1,129 @@
+import base64
+import json
+from django.db.models import Q
+from django.http import Http404
+from django.utils.dateparse import parse_datetime
+
+# Curseur spécial : dernière page de la liste
+LAST_PAGE_CURSOR = 'last'
+
+
+def encode_cursor(submission, direction):
+    """
+    Encoder la position d'une soumission dans la liste.
+
+    Args:
+        submission: Première ou dernière soumission de la page affichée
+        direction: 'next' (soumissions plus anciennes) ou 'prev' (plus récentes)
+    """
+    payload = json.dumps([submission.submitted_at.isoformat(), submission.pk, direction])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """
+    Décoder un curseur produit par encode_cursor.
+
+    Returns:
+        tuple: (submitted_at, id, direction)
+
+    Raises:
+        ValueError: Curseur invalide
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        submitted_at, pk, direction = json.loads(base64.urlsafe_b64decode(padded))
+        submitted_at = parse_datetime(submitted_at)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Curseur invalide: {token}") from e
+    if submitted_at is None or not isinstance(pk, int) or direction not in ('next', 'prev'):
+        raise ValueError(f"Curseur invalide: {token}")
+    return submitted_at, pk, direction
+
+
+class KeysetPage:
+    """Page d'une pagination par curseur : ni numéro de page, ni nombre total."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Pagination par curseur (submitted_at, id) pour les listes de soumissions.
+
+    Sans paramètre `cursor`, la pagination numérotée de ListView est
+    conservée (accès direct aux premières pages). Avec `cursor`, la page est
+    lue à partir de la position de la précédente, sans OFFSET ni COUNT : le
+    coût d'une page ne dépend pas de sa profondeur. Le queryset doit être
+    trié du plus récent au plus ancien (-submitted_at, -id).
+
+    Le contexte contient `keyset_pagination` (mode curseur) ; dans les deux
+    modes, page_obj porte next_cursor et previous_cursor.
+    """
+
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        token = self.request.GET.get(self.cursor_kwarg)
+        if not token:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            page.object_list = list(page.object_list)
+            page.next_cursor = encode_cursor(page.object_list[-1], 'next') if page.has_next() else None
+            page.previous_cursor = None
+            return paginator, page, page.object_list, is_paginated
+
+        if token == LAST_PAGE_CURSOR:
+            rows = list(queryset.order_by('submitted_at', 'id')[:page_size + 1])
+            has_next, has_previous = False, len(rows) > page_size
+            rows = rows[:page_size][::-1]
+        else:
+            try:
+                submitted_at, pk, direction = decode_cursor(token)
+            except ValueError:
+                raise Http404("Page invalide.")
+            if direction == 'next':
+                rows = list(
+                    queryset.filter(submitted_at__lte=submitted_at)
+                    .filter(Q(submitted_at__lt=submitted_at) | Q(id__lt=pk))
+                    .order_by('-submitted_at', '-id')[:page_size + 1]
+                )
+                has_next, has_previous = len(rows) > page_size, True
+                rows = rows[:page_size]
+            else:
+                rows = list(
+                    queryset.filter(submitted_at__gte=submitted_at)
+                    .filter(Q(submitted_at__gt=submitted_at) | Q(id__gt=pk))
+                    .order_by('submitted_at', 'id')[:page_size + 1]
+                )
+                has_next, has_previous = True, len(rows) > page_size
+                rows = rows[:page_size][::-1]
+
+        page = KeysetPage(
+            rows,
+            next_cursor=encode_cursor(rows[-1], 'next') if has_next and rows else None,
+            previous_cursor=encode_cursor(rows[0], 'prev') if has_previous and rows else None,
+        )
+        return None, page, rows, True
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['keyset_pagination'] = bool(self.request.GET.get(self.cursor_kwarg))
+        return context
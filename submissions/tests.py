@@ -1,3 +1,503 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tracemalloc
+from datetime import timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ai_engine import events
+from ai_engine.metrics import percentile
+from ai_engine.models import AIEvaluationJob, AIModel
+from exercises.models import Exercise, ExerciseAssignment, Topic
+from submissions.models import Submission, SubmissionQuerySet, Evaluation
+from submissions.pagination import LAST_PAGE_CURSOR, decode_cursor, encode_cursor
+
+User = get_user_model()
+
+
+class ExerciseSubmissionsStatisticsTests(TestCase):
+    """Les statistiques de la liste des soumissions d'un exercice sont calculées en base."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        self.student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        self.exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+        )
+        self.url = reverse('submissions:exercise_submissions', args=[self.exercise.id])
+        self.client.force_login(self.teacher)
+
+    def _create_submissions(self, count, evaluated=None, start=0):
+        """Créer des soumissions, dont les `evaluated` premières évaluées (note : rang % 21)."""
+        evaluated = count if evaluated is None else evaluated
+        submissions = Submission.objects.bulk_create(
+            Submission(
+                exercise=self.exercise,
+                student=self.student,
+                file='submissions/test.pdf',
+                attempt_number=start + index + 1,
+                status='completed' if index < evaluated else 'pending',
+            )
+            for index in range(count)
+        )
+        Evaluation.objects.bulk_create(
+            (
+                Evaluation(submission=submission, score=(start + index) % 21, percentage=0)
+                for index, submission in enumerate(submissions[:evaluated])
+            ),
+            batch_size=5000,
+        )
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_statistics(self):
+        self._create_submissions(10, evaluated=7)
+        response, _ = self._count_list_queries()
+
+        scores = sorted(index % 21 for index in range(7))
+        self.assertEqual(response.context['total_submissions'], 10)
+        self.assertEqual(response.context['completed_evaluations'], 7)
+        self.assertEqual(response.context['average_score'], round(sum(scores) / 7, 2))
+        self.assertEqual(response.context['min_score'], 0)
+        self.assertEqual(response.context['max_score'], 6)
+        self.assertEqual(
+            response.context['score_quartiles'],
+            [round(percentile(scores, percent), 2) for percent in (25, 50, 75)],
+        )
+
+    def test_without_evaluations(self):
+        self._create_submissions(3, evaluated=0)
+        response, _ = self._count_list_queries()
+
+        self.assertEqual(response.context['total_submissions'], 3)
+        self.assertEqual(response.context['completed_evaluations'], 0)
+        self.assertNotIn('average_score', response.context)
+
+    def test_percentiles_are_read_in_one_query(self):
+        self._create_submissions(9)
+        queryset = Submission.objects.filter(exercise=self.exercise)
+
+        with CaptureQueriesContext(connection) as queries:
+            summary = queryset.score_summary(percentiles=(0, 25, 50, 90, 100))
+
+        self.assertEqual(len(queries), 2)
+        scores = list(range(9))
+        self.assertEqual(
+            summary['percentiles'],
+            {percent: percentile(scores, percent) for percent in (0, 25, 50, 90, 100)},
+        )
+
+    def test_scores_deleted_after_aggregation(self):
+        self._create_submissions(8)
+        aggregate = SubmissionQuerySet.aggregate
+
+        def aggregate_then_delete(queryset, *args, **kwargs):
+            summary = aggregate(queryset, *args, **kwargs)
+            # Évaluations supprimées entre l'agrégation et la lecture des percentiles
+            Evaluation.objects.filter(score__gte=4).delete()
+            return summary
+
+        with mock.patch.object(SubmissionQuerySet, 'aggregate', aggregate_then_delete):
+            summary = Submission.objects.filter(exercise=self.exercise).score_summary()
+
+        self.assertEqual(summary['evaluated'], 8)
+        self.assertEqual(summary['percentiles'], {25: percentile(list(range(8)), 25)})
+
+    def test_query_count_does_not_grow_with_data(self):
+        self._create_submissions(5)
+        _, small_count = self._count_list_queries()
+
+        self._create_submissions(100, start=5)
+        _, large_count = self._count_list_queries()
+
+        self.assertEqual(small_count, large_count)
+
+    @skipUnless(os.environ.get('RUN_BENCHMARKS'), "Benchmark : lancer avec RUN_BENCHMARKS=1")
+    def test_memory_stays_flat_with_50k_submissions(self):
+        """Benchmark : le calcul ne charge ni soumissions ni évaluations en mémoire."""
+        queryset = Submission.objects.filter(exercise=self.exercise)
+
+        def measure():
+            tracemalloc.start()
+            try:
+                summary = queryset.score_summary()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            return summary, peak
+
+        self._create_submissions(500)
+        _, small_peak = measure()
+
+        self._create_submissions(49500, start=500)
+        summary, large_peak = measure()
+
+        self.assertEqual(summary['total'], 50000)
+        self.assertEqual(summary['evaluated'], 50000)
+        self.assertEqual(summary['max_score'], 20)
+        scores = sorted(index % 21 for index in range(50000))
+        self.assertAlmostEqual(summary['average_score'], sum(scores) / len(scores))
+        self.assertEqual(summary['percentiles'][50], percentile(scores, 50))
+
+        # 100 fois plus de lignes, même mémoire (à quelques Ko de bruit près)
+        self.assertLess(large_peak, small_peak + 64 * 1024)
+
+
+class EvaluateExerciseSubmissionsViewTests(TestCase):
+    """L'évaluation en lot depuis l'interface met les soumissions en file, sans les évaluer."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        self.exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+        )
+        for attempt in range(3):
+            Submission.objects.create(
+                exercise=self.exercise, student=student, file='submissions/test.pdf',
+                attempt_number=attempt + 1, status='completed',
+            )
+        self.client.force_login(self.teacher)
+
+    def test_post_only_enqueues(self):
+        response = self.client.post(reverse('submissions:evaluate_exercise_submissions', args=[self.exercise.id]))
+
+        self.assertRedirects(response, reverse('submissions:exercise_submissions', args=[self.exercise.id]))
+        submissions = Submission.objects.filter(exercise=self.exercise)
+        self.assertEqual(submissions.filter(status='pending', priority=Submission.PRIORITY_BULK).count(), 3)
+        self.assertFalse(submissions.filter(queued_at__isnull=True).exists())
+        self.assertFalse(submissions.filter(claimed_at__isnull=False).exists())
+
+
+class CheckEvaluationStatusViewTests(TestCase):
+    """Repli AJAX du flux SSE : statut, progression de la génération et redirection."""
+
+    def setUp(self):
+        self.student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        teacher = User.objects.create_user(email='prof@example.com', password='secret', user_type='teacher')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=teacher, topic=topic,
+        )
+        self.submission = Submission.objects.create(
+            exercise=exercise, student=self.student, file='submissions/test.pdf',
+            attempt_number=1, status='processing',
+        )
+        self.url = reverse('submissions:check_evaluation_status', args=[self.submission.id])
+        self.client.force_login(self.student)
+
+    def test_progress_of_the_running_job(self):
+        model = AIModel.objects.create(name='DeepSeek', model_id='deepseek-coder', default_max_tokens=1024)
+        AIEvaluationJob.objects.create(
+            submission=self.submission, model=model, status='failed', tokens_generated=3,
+        )
+        AIEvaluationJob.objects.create(
+            submission=self.submission, model=model, status='processing',
+            tokens_generated=120, time_to_first_token=0.4,
+        )
+
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(data['status'], 'processing')
+        self.assertFalse(data['has_evaluation'])
+        progress = data['progress']
+        self.assertEqual(progress['tokens_generated'], 120)
+        self.assertEqual(progress['max_tokens'], 1024)
+        self.assertEqual(progress['time_to_first_token'], 0.4)
+        self.assertGreaterEqual(progress['elapsed'], 0)
+        self.assertNotIn('redirect_url', data)
+
+    def test_completed_submission_redirects(self):
+        Submission.objects.filter(pk=self.submission.pk).update(status='completed')
+        Evaluation.objects.create(submission=self.submission, score=14, percentage=70)
+
+        data = self.client.get(self.url).json()
+
+        self.assertEqual(data['status'], 'completed')
+        self.assertTrue(data['has_evaluation'])
+        self.assertNotIn('progress', data)
+        self.assertEqual(data['redirect_url'], reverse('submissions:submission_detail', args=[self.submission.id]))
+
+    def test_other_student_is_refused(self):
+        other = User.objects.create_user(email='autre@example.com', password='secret')
+        self.client.force_login(other)
+
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+@override_settings(EVALUATION_EVENTS_HEARTBEAT=0.05, EVALUATION_EVENTS_MAX_DURATION=5)
+class EvaluationEventsViewTests(TestCase):
+    """Flux SSE du statut d'une évaluation : servi sous ASGI, 204 sous WSGI."""
+
+    def setUp(self):
+        self.student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        teacher = User.objects.create_user(email='prof@example.com', password='secret', user_type='teacher')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=teacher, topic=topic,
+        )
+        self.submission = Submission.objects.create(
+            exercise=exercise, student=self.student, file='submissions/test.pdf',
+            attempt_number=1, status='processing',
+        )
+        self.url = reverse('submissions:evaluation_events', args=[self.submission.id])
+        patcher = mock.patch('ai_engine.events._broker', events.InProcessBroker())
+        self.broker = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _parse(chunk):
+        """Décoder un bloc SSE en (type, données), ou None pour un commentaire ou une directive."""
+        fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n') if ': ' in line)
+        if 'event' not in fields:
+            return None
+        return fields['event'], json.loads(fields['data'])
+
+    def test_wsgi_falls_back_to_polling(self):
+        self.client.force_login(self.student)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 204)
+
+    async def test_stream_ends_with_terminal_status(self):
+        await self.async_client.aforce_login(self.student)
+
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        received = []
+        async for chunk in response.streaming_content:
+            event = self._parse(chunk)
+            if event is None:
+                continue
+            received.append(event)
+            if event == ('status', {'status': 'processing'}):
+                # Transition publiée par le worker pendant que la page attend
+                self.broker.publish(self.submission.id, events.progress_event(tokens_generated=5))
+                self.broker.publish(self.submission.id, events.status_event('completed'))
+
+        self.assertEqual(received, [
+            ('status', {'status': 'processing'}),
+            ('progress', {'tokens_generated': 5}),
+            ('status', {
+                'status': 'completed',
+                'redirect_url': reverse('submissions:submission_detail', args=[self.submission.id]),
+            }),
+        ])
+        self.assertEqual(self.broker.watched_ids(), [])
+
+    async def test_other_student_is_refused(self):
+        other = await User.objects.acreate(email='autre@example.com')
+        await self.async_client.aforce_login(other)
+
+        response = await self.async_client.get(self.url)
+
+        self.assertEqual(response.status_code, 403)
+
+
+class LatenessTests(TestCase):
+    """Retard calculé dans la requête : date limite de l'attribution, sinon de l'exercice."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_superuser(email='admin@example.com', password='secret')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        now = timezone.now()
+        self.exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+            deadline=now - timedelta(days=1),
+        )
+        self.open_exercise = Exercise.objects.create(
+            title='Sans échéance', slug='sans-echeance', description='Requêtes SQL', author=self.teacher,
+            topic=topic,
+        )
+        self.extended = User.objects.create_user(email='prolonge@example.com', password='secret')
+        ExerciseAssignment.objects.create(
+            exercise=self.exercise, assigned_to=self.extended, custom_deadline=now + timedelta(days=1),
+        )
+        self.assigned = User.objects.create_user(email='attribue@example.com', password='secret')
+        ExerciseAssignment.objects.create(exercise=self.exercise, assigned_to=self.assigned)
+        self.other = User.objects.create_user(email='autre@example.com', password='secret')
+        self.attempts = 0
+
+    def _submit(self, student, exercise=None, count=1):
+        submissions = []
+        for _ in range(count):
+            self.attempts += 1
+            submissions.append(Submission.objects.create(
+                exercise=exercise or self.exercise, student=student, file='submissions/test.pdf',
+                attempt_number=self.attempts,
+            ))
+        return submissions
+
+    def _lateness(self):
+        return {
+            submission.id: submission.is_late
+            for submission in Submission.objects.with_lateness()
+        }
+
+    def test_custom_deadline_overrides_exercise_deadline(self):
+        [extended] = self._submit(self.extended)
+        [assigned] = self._submit(self.assigned)
+        [other] = self._submit(self.other)
+
+        lateness = self._lateness()
+
+        self.assertFalse(lateness[extended.id])
+        # Attribution sans date personnalisée : date limite de l'exercice
+        self.assertTrue(lateness[assigned.id])
+        self.assertTrue(lateness[other.id])
+        # Même résultat que la propriété sans annotation
+        for submission in Submission.objects.all():
+            self.assertEqual(submission.is_late, lateness[submission.id])
+
+    def test_exercise_without_deadline_is_never_late(self):
+        [submission] = self._submit(self.other, self.open_exercise)
+
+        annotated = Submission.objects.with_lateness().get(pk=submission.pk)
+
+        self.assertIsNone(annotated.effective_deadline)
+        self.assertFalse(annotated.is_late)
+
+    def test_admin_filter(self):
+        [extended] = self._submit(self.extended)
+        [other] = self._submit(self.other)
+        [open_submission] = self._submit(self.other, self.open_exercise)
+        self.client.force_login(self.teacher)
+        url = reverse('admin:submissions_submission_changelist')
+
+        def listed(value):
+            response = self.client.get(url, {'is_late': value})
+            self.assertEqual(response.status_code, 200)
+            return {submission.id for submission in response.context['cl'].result_list}
+
+        self.assertEqual(listed('yes'), {other.id})
+        self.assertEqual(listed('no'), {extended.id, open_submission.id})
+
+    def test_admin_changelist_query_count_does_not_grow_with_rows(self):
+        self.client.force_login(self.teacher)
+        url = reverse('admin:submissions_submission_changelist')
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        self._submit(self.extended)
+        self._submit(self.other)
+        few = count_queries()
+        self._submit(self.extended, count=5)
+        self._submit(self.other, self.open_exercise, count=5)
+
+        self.assertEqual(count_queries(), few)
+
+
+class KeysetPaginationTests(TestCase):
+    """Pagination par curseur de la liste des soumissions d'un exercice (20 par page)."""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user(
+            email='prof@example.com', password='secret', user_type='teacher'
+        )
+        student = User.objects.create_user(email='etudiant@example.com', password='secret')
+        topic = Topic.objects.create(name='Catégorie', slug='categorie')
+        exercise = Exercise.objects.create(
+            title='Exercice', slug='exercice', description='Requêtes SQL', author=self.teacher, topic=topic,
+        )
+        submissions = Submission.objects.bulk_create(
+            Submission(exercise=exercise, student=student, file='submissions/test.pdf', attempt_number=index + 1)
+            for index in range(45)
+        )
+        # Trois soumissions par date : les limites de page tombent au milieu d'une égalité
+        base = timezone.now() - timedelta(days=1)
+        for index, submission in enumerate(submissions):
+            submission.submitted_at = base + timedelta(minutes=index // 3)
+        Submission.objects.bulk_update(submissions, ['submitted_at'])
+        self.expected_ids = [submission.id for submission in reversed(submissions)]
+        self.url = reverse('submissions:exercise_submissions', args=[exercise.id])
+        self.client.force_login(self.teacher)
+
+    def _page(self, cursor=None):
+        response = self.client.get(self.url, {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        page = response.context['page_obj']
+        return [submission.id for submission in page], page, response
+
+    def test_cursor_round_trip(self):
+        submission = Submission.objects.get(pk=self.expected_ids[0])
+        token = encode_cursor(submission, 'next')
+
+        self.assertNotIn('=', token)
+        self.assertEqual(decode_cursor(token), (submission.submitted_at, submission.pk, 'next'))
+
+    def test_invalid_cursors_are_rejected(self):
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for token in (
+            'pas-un-curseur',
+            encode(['pas une date', 1, 'next']),
+            encode([timezone.now().isoformat(), '1', 'next']),
+            encode([timezone.now().isoformat(), 1, 'ailleurs']),
+            encode({'id': 1}),
+        ):
+            with self.assertRaises(ValueError):
+                decode_cursor(token)
+            self.assertEqual(self.client.get(self.url, {'cursor': token}).status_code, 404)
+
+    def test_first_page_without_cursor(self):
+        ids, page, response = self._page()
+
+        self.assertEqual(ids, self.expected_ids[:20])
+        self.assertFalse(response.context['keyset_pagination'])
+        self.assertIsNotNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_next_and_previous_walk_all_submissions_once(self):
+        pages = []
+        ids, page, _ = self._page()
+        pages.append(ids)
+        while page.next_cursor:
+            ids, page, response = self._page(page.next_cursor)
+            self.assertTrue(response.context['keyset_pagination'])
+            self.assertTrue(page.has_previous())
+            pages.append(ids)
+
+        self.assertEqual([len(ids) for ids in pages], [20, 20, 5])
+        self.assertEqual(sum(pages, []), self.expected_ids)
+
+        # Retour en arrière depuis la dernière page : mêmes pages, dans l'ordre inverse
+        for expected in reversed(pages[:-1]):
+            ids, page, _ = self._page(page.previous_cursor)
+            self.assertEqual(ids, expected)
+        self.assertEqual(ids, self.expected_ids[:20])
+        self.assertFalse(page.has_previous())
+
+    def test_last_page_cursor(self):
+        ids, page, _ = self._page(LAST_PAGE_CURSOR)
+
+        self.assertEqual(ids, self.expected_ids[-20:])
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+        ids, _, _ = self._page(page.previous_cursor)
+        self.assertEqual(ids, self.expected_ids[5:25])
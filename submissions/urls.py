@@ -9,6 +9,7 @@ urlpatterns = [
     path('<int:pk>/', views.SubmissionDetailView.as_view(), name='submission_detail'),
     path('student/<int:student_id>/', views.StudentSubmissionsListView.as_view(), name='student_submissions'),
     path('exercise/<int:exercise_id>/all/', views.ExerciseSubmissionsListView.as_view(), name='exercise_submissions'),
+    path('exercise/<int:exercise_id>/evaluate/', views.evaluate_exercise_submissions_view, name='evaluate_exercise_submissions'),
     
     # Gestion des évaluations
     path('test-evaluation/<int:submission_id>/', views.test_evaluation, name='test_evaluation'),
@@ -20,4 +21,5 @@ urlpatterns = [
     
     # API pour vérification asynchrone
     path('<int:submission_id>/check-status/', views.check_evaluation_status_view, name='check_evaluation_status'),
+    path('<int:submission_id>/events/', views.evaluation_events_view, name='evaluation_events'),
 ]
\ No newline at end of file
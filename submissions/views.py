@@ -1,3 +1,6 @@
+import asyncio
+import json
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -8,13 +11,17 @@ import threading
 from django.utils import timezone
 import queue
 from django.db import transaction
-from django.http import HttpResponseRedirect, Http404, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseRedirect, Http404, JsonResponse, StreamingHttpResponse
 from django.core.exceptions import PermissionDenied
 
 from .models import Submission, Evaluation, FeedbackItem, FeedbackCategory
 from .forms import SubmissionForm, EvaluationReviewForm, FeedbackItemForm, NewFeedbackItemForm
+from .pagination import KeysetPaginationMixin
 from exercises.models import Exercise
-from ai_engine.evaluator import evaluate_submission
+from ai_engine.evaluator import evaluate_submission, enqueue_exercise_submissions
+from ai_engine.extraction import schedule_text_extraction
+from ai_engine import events
 from accounts.views import TeacherRequiredMixin
 
 
@@ -46,6 +53,9 @@ def submit_exercise_view(request, exercise_id):
             submission.status = 'completed'  # Modifié de 'pending' à 'completed'
             submission.save()
             
+            # Extraire le texte du PDF en arrière-plan
+            schedule_text_extraction(submission, 'file_content_text')
+            
             # Commenté : Démarrage de l'évaluation en arrière-plan
             '''
             def evaluate_async():
@@ -117,6 +127,9 @@ class SubmissionDetailView(LoginRequiredMixin, DetailView):
         # Vérifier si la soumission est en cours de traitement
         context['is_processing'] = submission.status == 'processing'
         
+        # Statut poussé par le serveur seulement sous ASGI (voir evaluation_events_view)
+        context['live_status_events'] = isinstance(self.request, ASGIRequest)
+        
         # Récupérer les autres soumissions du même étudiant pour cet exercice
         context['other_submissions'] = Submission.objects.filter(
             exercise=submission.exercise,
@@ -262,7 +275,7 @@ def delete_feedback_item_view(request, feedback_item_id):
     })
 
 
-class StudentSubmissionsListView(LoginRequiredMixin, ListView):
+class StudentSubmissionsListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Vue pour afficher la liste des soumissions d'un étudiant."""
     
     model = Submission
@@ -271,35 +284,34 @@ class StudentSubmissionsListView(LoginRequiredMixin, ListView):
     paginate_by = 10
     
     def get_queryset(self):
+        self.student = None
+        
         # Pour les étudiants, montrer leurs propres soumissions
         if self.request.user.is_student:
-            return Submission.objects.filter(
-                student=self.request.user
-            ).order_by('-submitted_at')
+            student = self.request.user
             
         # Pour les professeurs, si un ID étudiant est fourni
         elif self.request.user.is_teacher and 'student_id' in self.kwargs:
             from django.contrib.auth import get_user_model
             User = get_user_model()
             
-            student = get_object_or_404(User, pk=self.kwargs['student_id'], user_type='student')
-            return Submission.objects.filter(
-                student=student
-            ).order_by('-submitted_at')
+            student = self.student = get_object_or_404(User, pk=self.kwargs['student_id'], user_type='student')
             
         # Sinon, liste vide
-        return Submission.objects.none()
+        else:
+            return Submission.objects.none()
+        
+        # Exercice, thème et évaluation lus avec chaque ligne (affichés par le gabarit)
+        return Submission.objects.filter(
+            student=student
+        ).select_related('exercise__topic', 'evaluation').with_lateness().order_by('-submitted_at', '-id')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
         # Si c'est un professeur qui consulte les soumissions d'un étudiant
-        if self.request.user.is_teacher and 'student_id' in self.kwargs:
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            
-            student = get_object_or_404(User, pk=self.kwargs['student_id'], user_type='student')
-            context['student'] = student
+        if self.student is not None:
+            context['student'] = self.student
             context['viewing_as_teacher'] = True
         else:
             context['viewing_as_teacher'] = False
@@ -307,7 +319,7 @@ class StudentSubmissionsListView(LoginRequiredMixin, ListView):
         return context
 
 
-class ExerciseSubmissionsListView(LoginRequiredMixin, TeacherRequiredMixin, ListView):
+class ExerciseSubmissionsListView(LoginRequiredMixin, TeacherRequiredMixin, KeysetPaginationMixin, ListView):
     """Vue pour afficher toutes les soumissions pour un exercice (pour les professeurs)."""
     
     model = Submission
@@ -319,49 +331,70 @@ class ExerciseSubmissionsListView(LoginRequiredMixin, TeacherRequiredMixin, List
         self.exercise = get_object_or_404(Exercise, pk=self.kwargs['exercise_id'])
         
         # Vérifier que le professeur est l'auteur de l'exercice
-        if self.exercise.author != self.request.user:
+        if self.exercise.author_id != self.request.user.id:
             return Submission.objects.none()
-            
+        
+        # Étudiant et évaluation lus avec chaque ligne (note sur 20 : exercise)
         return Submission.objects.filter(
             exercise=self.exercise
-        ).order_by('-submitted_at')
+        ).select_related('student', 'exercise', 'evaluation').with_lateness().order_by('-submitted_at', '-id')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['exercise'] = self.exercise
         
-        # Statistiques - obtenir un nouveau queryset pour les calculs
-        # au lieu d'utiliser context['submissions'] qui est déjà slicé pour la pagination
-        all_submissions = Submission.objects.filter(exercise=self.exercise)
-        context['total_submissions'] = all_submissions.count()
-        context['completed_evaluations'] = all_submissions.filter(status='completed').count()
+        # Statistiques sur toutes les soumissions (et non la page affichée),
+        # calculées en base sans charger les soumissions
+        summary = Submission.objects.filter(exercise=self.exercise).score_summary()
+        context['total_submissions'] = summary['total']
+        context['completed_evaluations'] = summary['completed']
         
-        # Calculer la note moyenne - utiliser une requête annotée pour de meilleures performances
-        evaluated_submissions = all_submissions.filter(evaluation__isnull=False)
-        evaluated_count = evaluated_submissions.count()
-        
-        if evaluated_count > 0:
-            # Récupérer toutes les évaluations pour ce calcul
-            evaluations = [s.evaluation for s in evaluated_submissions.select_related('evaluation')]
-            
-            if evaluations:
-                # Calculer moyenne, max et min
-                scores = [e.score for e in evaluations]
-                context['average_score'] = round(sum(scores) / len(scores), 2)
-                context['max_score'] = max(scores)
-                context['min_score'] = min(scores)
+        if summary['evaluated']:
+            context['average_score'] = round(summary['average_score'], 2)
+            context['max_score'] = summary['max_score']
+            context['min_score'] = summary['min_score']
+            quartiles = [summary['percentiles'].get(percent) for percent in (25, 50, 75)]
+            if None not in quartiles:
+                context['score_quartiles'] = [round(quartile, 2) for quartile in quartiles]
         
         return context
 
 
+@login_required
+def evaluate_exercise_submissions_view(request, exercise_id):
+    """Vue pour mettre en file d'attente les soumissions non notées d'un exercice."""
+    
+    # Vérifier que l'utilisateur est un professeur
+    if not request.user.is_teacher:
+        raise PermissionDenied("Seuls les professeurs peuvent lancer une évaluation en lot.")
+    
+    exercise = get_object_or_404(Exercise, pk=exercise_id)
+    
+    # Vérifier que le professeur est l'auteur de l'exercice
+    if exercise.author != request.user:
+        raise PermissionDenied("Vous ne pouvez évaluer que les soumissions de vos propres exercices.")
+    
+    if request.method == 'POST':
+        # Mise en file seulement : le worker d'évaluation (run_evaluation_worker)
+        # les réserve au rythme que les backends peuvent absorber, avec un bail
+        queued = enqueue_exercise_submissions(exercise.id)
+        
+        if queued:
+            messages.success(request, f"{queued} soumission(s) mise(s) en file d'attente pour évaluation.")
+        else:
+            messages.info(request, "Aucune soumission à évaluer pour cet exercice.")
+    
+    return redirect('submissions:exercise_submissions', exercise_id=exercise.id)
+
+
 @login_required
 def check_evaluation_status_view(request, submission_id):
-    """Vue API pour vérifier le statut d'une évaluation (utilisée par AJAX)."""
+    """Vue API pour vérifier le statut d'une évaluation (repli AJAX de evaluation_events_view)."""
     
-    submission = get_object_or_404(Submission, pk=submission_id)
+    submission = get_object_or_404(Submission.objects.select_related('evaluation'), pk=submission_id)
     
     # Vérifier les permissions
-    if not (request.user.is_teacher or submission.student == request.user):
+    if not (request.user.is_teacher or submission.student_id == request.user.id):
         return JsonResponse({'error': 'Unauthorized'}, status=403)
     
     # Retourner le statut
@@ -370,6 +403,19 @@ def check_evaluation_status_view(request, submission_id):
         'has_evaluation': hasattr(submission, 'evaluation'),
     }
     
+    # Progression de la génération en cours (mode flux)
+    if submission.status == 'processing':
+        job = submission.ai_jobs.filter(status='processing').order_by('-created_at').values(
+            'tokens_generated', 'time_to_first_token', 'created_at', 'model__default_max_tokens'
+        ).first()
+        if job:
+            data['progress'] = {
+                'tokens_generated': job['tokens_generated'],
+                'max_tokens': job['model__default_max_tokens'],
+                'time_to_first_token': job['time_to_first_token'],
+                'elapsed': round((timezone.now() - job['created_at']).total_seconds(), 1),
+            }
+    
     # Si l'évaluation est complète, inclure l'URL pour rediriger
     if submission.status == 'completed' and hasattr(submission, 'evaluation'):
         data['redirect_url'] = reverse('submissions:submission_detail', kwargs={'pk': submission_id})
@@ -377,6 +423,77 @@ def check_evaluation_status_view(request, submission_id):
     return JsonResponse(data)
 
 
+async def evaluation_events_view(request, submission_id):
+    """
+    Flux Server-Sent Events du statut d'une évaluation.
+    
+    Remplace l'interrogation périodique de check_evaluation_status_view : la
+    page reçoit les changements de statut et la progression de la génération
+    au fil de l'eau. Un client en attente ne coûte qu'une file en mémoire ;
+    le flux se termine avec le statut final, ou après
+    EVALUATION_EVENTS_MAX_DURATION secondes (le navigateur se reconnecte).
+    Nécessite le serveur ASGI (dbeval.asgi) : sous WSGI, le flux serait lu
+    en entier avant d'être envoyé et bloquerait un worker. La vue répond
+    alors 204, ce qui arrête EventSource ; la page revient à
+    check_evaluation_status_view.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+    
+    student_id = await Submission.objects.filter(pk=submission_id).values_list('student_id', flat=True).afirst()
+    if student_id is None:
+        raise Http404("Soumission introuvable")
+    if not (user.is_teacher or student_id == user.id):
+        return JsonResponse({'error': 'Unauthorized'}, status=403)
+    
+    return StreamingHttpResponse(
+        _evaluation_event_stream(submission_id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _format_event(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+async def _evaluation_event_stream(submission_id):
+    """Générer les événements d'une soumission jusqu'à son statut final."""
+    heartbeat = getattr(settings, 'EVALUATION_EVENTS_HEARTBEAT', 15)
+    max_duration = getattr(settings, 'EVALUATION_EVENTS_MAX_DURATION', 300)
+    redirect_url = reverse('submissions:submission_detail', kwargs={'pk': submission_id})
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_duration
+    
+    # S'abonner avant de lire le statut : aucune transition ne peut être manquée
+    async with events.get_broker().subscribe(submission_id) as subscription:
+        status = await Submission.objects.filter(pk=submission_id).values_list('status', flat=True).afirst()
+        event = events.status_event(status)
+        yield "retry: 5000\n\n"
+        while True:
+            finished = event['type'] == 'status' and event['data']['status'] not in events.ACTIVE_STATUSES
+            if finished:
+                event = events.status_event(event['data']['status'])
+                event['data']['redirect_url'] = redirect_url
+            yield _format_event(event)
+            if finished:
+                return
+            
+            event = None
+            while event is None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    event = await subscription.get(timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    # Commentaire SSE : maintient la connexion ouverte à travers les proxys
+                    yield ": ping\n\n"
+
 
 def test_evaluation(request, submission_id):
     """Vue de diagnostic pour tester l'évaluation dans un thread séparé."""